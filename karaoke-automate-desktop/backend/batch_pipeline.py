@@ -0,0 +1,66 @@
+"""
+Stage-pipelined batch scheduler for Karaoke Automate
+Moves many songs through the processing stages so that different songs occupy different stages at once
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class StagePipeline:
+    """
+    Runs jobs (dicts) through an ordered list of (stage_name, stage_fn) pairs.
+
+    Every job walks the stages in order on its own thread, and each stage admits at most
+    limits[stage_name] jobs at a time (default 1). While song N holds the 'render' slot, song N+1
+    can hold 'separate', so the stages overlap like a pipeline instead of running song by song.
+    max_in_flight bounds how many songs have been started but not finished, which caps the
+    intermediate files and memory held at once.
+
+    A stage_fn receives the job dict and stores its outputs in it. If it raises, the job is marked
+    'failed' with the error and skips its remaining stages; other jobs are unaffected.
+    on_event(job, stage_name, status) is called with status 'started', 'done' or 'failed'.
+    """
+
+    def __init__(self, stages, limits=None, max_in_flight=None, on_event=None):
+        self.stages = list(stages)
+        self.limits = dict(limits or {})
+        self.max_in_flight = max_in_flight or len(self.stages) + 1
+        self.on_event = on_event
+        self._slots = {name: threading.BoundedSemaphore(max(1, self.limits.get(name, 1))) for name, _ in self.stages}
+
+    def _emit(self, job, stage_name, status):
+        if self.on_event:
+            try:
+                self.on_event(job, stage_name, status)
+            except Exception as e:
+                print(f"Warning: Batch event callback failed: {e}")
+
+    def _run_job(self, job):
+        job['status'] = 'running'
+        job.setdefault('stage_seconds', {})
+        for stage_name, stage_fn in self.stages:
+            with self._slots[stage_name]:
+                self._emit(job, stage_name, 'started')
+                start_time = time.time()
+                try:
+                    stage_fn(job)
+                except Exception as e:
+                    job['stage_seconds'][stage_name] = round(time.time() - start_time, 2)
+                    job['status'] = 'failed'
+                    job['error'] = f"{stage_name} failed: {e}"
+                    self._emit(job, stage_name, 'failed')
+                    return job
+                job['stage_seconds'][stage_name] = round(time.time() - start_time, 2)
+                self._emit(job, stage_name, 'done')
+        job['status'] = 'done'
+        return job
+
+    def run(self, jobs):
+        """Processes all jobs and returns them (in input order) once every job has finished or failed."""
+        jobs = list(jobs)
+        if not jobs:
+            return jobs
+        # Jobs are submitted in order, so earlier songs enter the pipeline (and each stage queue) first
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(jobs)), thread_name_prefix="batch") as executor:
+            return list(executor.map(self._run_job, jobs))
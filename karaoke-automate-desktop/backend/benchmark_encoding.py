@@ -0,0 +1,151 @@
+"""
+Encoding profile benchmark for Karaoke Automate
+Encodes synthetic songs of several lengths and word densities (or a given transcription) with today's plain
+VIDEO_OUTPUT_PRESET settings and with every ENCODING_PROFILES entry, then reports encode time, file size and
+SSIM against a lossless encode, and which profile select_encoding_profile picks for each song.
+Every encode is single-pass with the profile's keyframe interval, as in default renders; --cache-segments renders
+put a keyframe every SEGMENT_GOP_FRAMES instead (see select_encoding_profile), which these numbers do not cover
+
+Usage:
+    python benchmark_encoding.py [--durations 60,240] [--densities 1,2.5,5] [--output report.json]
+    python benchmark_encoding.py --transcription path/to/song_transcription.json
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import main
+from benchmark_suite import make_synthetic_transcript
+
+BASELINE_LABEL = "default" # Today's settings: VIDEO_OUTPUT_PRESET with x264's own rate control and keyframe interval
+
+def _child_cpu_seconds():
+    """CPU time of finished child processes (the ffmpeg encoder); Windows does not report it."""
+    if os.name == 'nt':
+        return None
+    times = os.times()
+    return times.children_user + times.children_system
+
+def measure_ssim(video_path, reference_path):
+    """Returns the mean SSIM (all planes) of a video against the reference encode of the same frames."""
+    result = subprocess.run([main.get_ffmpeg_binary(), "-i", video_path, "-i", reference_path,
+                             "-lavfi", "[0:v][1:v]ssim", "-f", "null", "-"],
+                            capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    match = re.findall(r"SSIM .*All:([0-9.]+)", result.stderr)
+    return float(match[-1]) if match else None
+
+def encode_video(output_path, total_frames, preset, ffmpeg_params):
+    """Renders the loaded transcript's frames into a video-only file; returns (wall seconds, encoder CPU seconds)."""
+    threads = max(1, int(os.cpu_count() * main.VIDEO_THREADS_RATIO))
+    main.reset_frame_state()
+    child_cpu_before = _child_cpu_seconds()
+    start_time = time.perf_counter()
+    main.write_frames_ffmpeg_pipe(output_path, 0, total_frames, threads, ffmpeg_params, preset=preset)
+    seconds = time.perf_counter() - start_time
+    child_cpu_after = _child_cpu_seconds()
+    return seconds, (child_cpu_after - child_cpu_before if child_cpu_before is not None else None)
+
+def run_song(label, json_path, audio_seconds, work_dir, quality):
+    """Encodes one transcript with every setting and returns its report."""
+    print(f"\n=== {label} ===")
+    with main._render_lock:
+        try:
+            main._load_render_state(json_path)
+            duration = main.get_video_duration(audio_seconds)
+            total_frames = int(duration * main.FPS)
+            num_words = main._global_sentences_for_frame.num_words if main._global_sentences_for_frame else 0
+            reference_path = os.path.join(work_dir, "reference.mkv")
+            if quality:
+                print("Encoding lossless reference...")
+                encode_video(reference_path, total_frames, "ultrafast", ["-pix_fmt", "yuv420p", "-qp", "0"])
+
+            results = {}
+            for profile_name in [None] + list(main.ENCODING_PROFILES):
+                setting = profile_name or BASELINE_LABEL
+                preset, encoding_params, keyint_frames = main.get_encoding_settings(profile_name)
+                ffmpeg_params = ["-pix_fmt", "yuv420p"] + encoding_params + (["-g", str(keyint_frames)] if keyint_frames else [])
+                output_path = os.path.join(work_dir, f"{setting}.mp4")
+                print(f"Encoding with {setting} ({preset} {' '.join(ffmpeg_params[2:])})...")
+                seconds, cpu_seconds = encode_video(output_path, total_frames, preset, ffmpeg_params)
+                size = os.path.getsize(output_path)
+                results[setting] = {
+                    "preset": preset,
+                    "seconds": round(seconds, 2),
+                    "encoder_cpu_seconds": round(cpu_seconds, 2) if cpu_seconds is not None else None,
+                    "size_mb": round(size / (1024 * 1024), 3),
+                    "kbps": round(size * 8 / duration / 1000, 1),
+                    "ssim": measure_ssim(output_path, reference_path) if quality else None
+                }
+                os.remove(output_path)
+            selected = main.resolve_encoding_profile('auto', duration)
+        finally:
+            main._clear_render_state()
+    if os.path.exists(reference_path):
+        os.remove(reference_path)
+
+    baseline = results[BASELINE_LABEL]
+    for setting, result in results.items():
+        if setting != BASELINE_LABEL:
+            time_key = "encoder_cpu_seconds" if baseline["encoder_cpu_seconds"] else "seconds"
+            result["time_change_percent"] = round(100 * (result[time_key] / baseline[time_key] - 1), 1)
+            result["size_change_percent"] = round(100 * (result["size_mb"] / baseline["size_mb"] - 1), 1)
+    return {
+        "song": label,
+        "video_seconds": round(duration, 2),
+        "words": num_words,
+        "words_per_second": round(num_words / duration, 2) if duration else 0.0,
+        "selected_profile": selected,
+        "results": results
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Compare the x264 encoding profiles against today's encode settings.")
+    parser.add_argument("--durations", default="60,240", help="Comma-separated lengths (seconds) of the synthetic songs")
+    parser.add_argument("--densities", default="1,2.5,5", help="Comma-separated word densities (words per second) of the synthetic songs")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic songs")
+    parser.add_argument("--transcription", help="Benchmark this transcription JSON instead of synthetic songs")
+    parser.add_argument("--no-quality", dest="quality", action="store_false", help="Skip the lossless reference and SSIM")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="karaoke-encode-bench-") as work_dir:
+        songs = []
+        if args.transcription:
+            if not os.path.isfile(args.transcription):
+                print(f"Error: Transcription file not found at '{args.transcription}'")
+                sys.exit(1)
+            # Without the audio, the video runs until just after the last word
+            songs.append(run_song(os.path.basename(args.transcription), args.transcription, 0, work_dir, args.quality))
+        else:
+            for duration in (float(value) for value in args.durations.split(",")):
+                for words_per_second in (float(value) for value in args.densities.split(",")):
+                    json_path = os.path.join(work_dir, f"song{main.TRANSCRIPTION_SUFFIX}")
+                    with open(json_path, 'w', encoding='utf-8') as f:
+                        json.dump(make_synthetic_transcript(duration, words_per_second, args.seed), f)
+                    songs.append(run_song(f"{duration:.0f}s at {words_per_second:g} words/s", json_path, duration, work_dir, args.quality))
+                    os.remove(json_path)
+
+    print("\n--- Encoding Profile Benchmark ---")
+    for song in songs:
+        print(f"\n{song['song']} ({song['words']} words, {song['video_seconds']:.0f}s): auto selects {song['selected_profile']}")
+        for setting, result in song['results'].items():
+            changes = ""
+            if setting != BASELINE_LABEL:
+                changes = f"  (time {result['time_change_percent']:+.1f}%, size {result['size_change_percent']:+.1f}%)"
+            cpu = f"{result['encoder_cpu_seconds']:.2f}s CPU" if result['encoder_cpu_seconds'] is not None else "CPU n/a"
+            ssim = f"SSIM {result['ssim']:.5f}" if result['ssim'] is not None else ""
+            print(f"{setting:>14}: {result['seconds']:.2f}s, {cpu}, {result['size_mb']:.3f} MB ({result['kbps']} kb/s) {ssim}{changes}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"songs": songs}, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,129 @@
+"""
+Quantization benchmark for Karaoke Automate
+Transcribes one vocal track with a float32 Whisper model and its int8-quantized variant on the CPU,
+then reports the speed-up and how far the int8 word timestamps drift from the float32 baseline
+
+Usage:
+    python benchmark_quantization.py path/to/vocals.wav --model medium [--output report.json]
+"""
+
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from main import (
+    WHISPER_MODEL_SIZE, WHISPER_INT8_SUFFIX, VAD_ENABLED,
+    parse_whisper_model_name, quantize_whisper_model, get_model_size_mb, transcribe_and_save
+)
+
+def load_words(transcription_json_path):
+    """Returns every word of a transcription JSON as a flat list of {'text', 'start', 'end'} dicts."""
+    with open(transcription_json_path, 'r', encoding='utf-8') as f:
+        sentences = json.load(f)
+    return [word for sentence in sentences for word in sentence['words']]
+
+def _normalize_word(text):
+    return re.sub(r"[^\w']", "", text.lower())
+
+def compare_word_timings(baseline_words, candidate_words):
+    """
+    Aligns two word lists by their (normalized) text and measures the timestamp drift of matched words.
+    Words the two transcriptions disagree on are left out of the drift figures and lower matched_percent.
+    """
+    matcher = difflib.SequenceMatcher(a=[_normalize_word(w['text']) for w in baseline_words],
+                                      b=[_normalize_word(w['text']) for w in candidate_words], autojunk=False)
+    start_drift, end_drift = [], []
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            baseline, candidate = baseline_words[block.a + offset], candidate_words[block.b + offset]
+            start_drift.append(abs(candidate['start'] - baseline['start']))
+            end_drift.append(abs(candidate['end'] - baseline['end']))
+
+    def summarize(drift):
+        if not drift:
+            return {"mean_ms": None, "p95_ms": None, "max_ms": None}
+        drift_ms = np.array(drift) * 1000
+        return {"mean_ms": round(float(drift_ms.mean()), 1), "p95_ms": round(float(np.percentile(drift_ms, 95)), 1),
+                "max_ms": round(float(drift_ms.max()), 1)}
+
+    return {
+        "baseline_words": len(baseline_words),
+        "candidate_words": len(candidate_words),
+        "matched_words": len(start_drift),
+        "matched_percent": round(100 * len(start_drift) / len(baseline_words), 1) if baseline_words else 0.0,
+        "start_drift": summarize(start_drift),
+        "end_drift": summarize(end_drift)
+    }
+
+def run_variant(vocal_path, model_size, quantized, output_dir, use_vad):
+    """Loads one model variant on the CPU, transcribes the track with it and returns timings and the words."""
+    import whisper
+    label = f"{model_size}{WHISPER_INT8_SUFFIX}" if quantized else model_size
+    print(f"\n=== {label} ===")
+    load_start = time.time()
+    model = whisper.load_model(model_size, device="cpu")
+    if quantized:
+        model = quantize_whisper_model(model)
+    load_seconds = time.time() - load_start
+
+    output_json_path = os.path.join(output_dir, f"{label}.json")
+    transcribe_start = time.time()
+    transcribe_and_save(vocal_path, output_json_path, label, model=model, use_vad=use_vad, workers=1)
+    transcribe_seconds = time.time() - transcribe_start
+    return {
+        "model": label,
+        "model_size_mb": round(get_model_size_mb(model), 1),
+        "load_seconds": round(load_seconds, 2),
+        "transcribe_seconds": round(transcribe_seconds, 2)
+    }, load_words(output_json_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark int8-quantized against float32 Whisper transcription on the CPU.")
+    parser.add_argument("vocal_path", help="Vocal stem (or any audio file) to transcribe")
+    parser.add_argument("--model", default=parse_whisper_model_name(WHISPER_MODEL_SIZE)[0], help="Base Whisper model size")
+    parser.add_argument("--no-vad", dest="vad", action="store_false", default=VAD_ENABLED, help="Transcribe the whole track")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.vocal_path):
+        print(f"Error: Audio file not found at '{args.vocal_path}'")
+        sys.exit(1)
+    model_size = parse_whisper_model_name(args.model)[0]
+
+    with tempfile.TemporaryDirectory(prefix="karaoke-quant-bench-") as output_dir:
+        baseline, baseline_words = run_variant(args.vocal_path, model_size, False, output_dir, args.vad)
+        candidate, candidate_words = run_variant(args.vocal_path, model_size, True, output_dir, args.vad)
+
+    report = {
+        "audio": os.path.abspath(args.vocal_path),
+        "float32": baseline,
+        "int8": candidate,
+        "speedup": round(baseline['transcribe_seconds'] / candidate['transcribe_seconds'], 2) if candidate['transcribe_seconds'] else None,
+        "word_timing": compare_word_timings(baseline_words, candidate_words)
+    }
+
+    timing = report['word_timing']
+    print("\n--- Quantization Benchmark ---")
+    for result in (baseline, candidate):
+        print(f"{result['model']:>14}: transcribe {result['transcribe_seconds']:.2f}s, load {result['load_seconds']:.2f}s, "
+              f"model {result['model_size_mb']:.0f} MB")
+    print(f"Speed-up: {report['speedup']}x")
+    print(f"Matched words: {timing['matched_words']}/{timing['baseline_words']} ({timing['matched_percent']}%)")
+    for key in ('start_drift', 'end_drift'):
+        drift = timing[key]
+        print(f"{key.replace('_', ' ').capitalize()}: mean {drift['mean_ms']} ms, p95 {drift['p95_ms']} ms, max {drift['max_ms']} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Benchmark suite for Karaoke Automate
+Generates a synthetic song (audio + transcript) of configurable length and word density, measures the
+renderer, encoder, enhancement, transcript loading and bridge latency, and checks golden frames so that
+renderer optimizations are proven not to change the output
+
+Usage:
+    python benchmark_suite.py --output results.json                      # Record results (e.g. as a baseline)
+    python benchmark_suite.py --baseline baseline.json --output new.json # Compare; exits 1 on a regression or changed frames
+    python benchmark_suite.py --only frames,load --duration 600 --words-per-second 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+import main
+from transcript_store import Transcript, binary_transcript_path, save_binary_transcript
+
+BENCHMARKS = ('frames', 'encode', 'enhance', 'load', 'bridge')
+GOLDEN_FRAME_COUNT = 120 # Frames (evenly spread over the synthetic song) compared pixel for pixel
+REGRESSION_TOLERANCE = 0.10 # Slowdown (fraction) beyond which a metric counts as a regression
+
+# (benchmark, metric, higher_is_better) compared against the baseline
+COMPARED_METRICS = (
+    ('frames', 'frames_per_second', True),
+    ('frames', 'frames_per_second_no_dedup', True),
+    ('encode', 'frames_per_second', True),
+    ('enhance', 'audio_seconds_per_second', True),
+    ('load', 'json_ms', False),
+    ('load', 'binary_ms', False),
+    ('bridge', 'startup_seconds', False),
+    ('bridge', 'ping_p50_ms', False)
+)
+
+SYLLABLES = ("la", "na", "ka", "ri", "so", "mi", "do", "re", "tu", "ve", "lo", "sha", "in", "on", "be", "yo", "wa", "star", "light", "heart")
+
+# --- Synthetic Song ---
+def make_synthetic_transcript(duration_seconds, words_per_second=2.5, seed=0):
+    """
+    Returns a deterministic transcript in the JSON structure, singing at about words_per_second with
+    3-10 word sentences, short pauses between sentences and an instrumental break every few sentences.
+    """
+    rng = random.Random(seed)
+    sentences = []
+    t = 1.0
+    while True:
+        num_words = rng.randint(3, 10)
+        words = []
+        for _ in range(num_words):
+            text = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+            if rng.random() < 0.1:
+                text = text.capitalize() + rng.choice((",", "!", "?"))
+            length = rng.uniform(0.6, 1.4) / words_per_second
+            words.append({'text': text, 'start': round(t, 3), 'end': round(t + length * 0.9, 3)})
+            t += length
+        if words[-1]['end'] > duration_seconds - 1:
+            break
+        sentences.append({'words': words, 'start_time': words[0]['start'], 'end_time': words[-1]['end'],
+                          'full_text': " ".join(w['text'] for w in words)})
+        t += rng.uniform(0.3, 1.0)
+        if len(sentences) % 8 == 0:
+            t += rng.uniform(4.0, 8.0) # Instrumental break
+    return sentences
+
+def make_synthetic_audio(path, duration_seconds, rate=44100, channels=2, seed=0):
+    """Writes a deterministic stereo test signal (chord with a slow tremolo plus background noise)."""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(duration_seconds * rate)) / rate
+    tone = sum(0.15 * np.sin(2 * np.pi * freq * t) for freq in (220.0, 277.2, 329.6)) * (0.6 + 0.4 * np.sin(2 * np.pi * 0.25 * t))
+    signal = np.stack([tone + 0.02 * rng.randn(len(t)) for _ in range(channels)], axis=1).astype(np.float32)
+    sf.write(path, signal, rate)
+    return path
+
+def write_song(work_dir, name, duration_seconds, words_per_second, seed):
+    """Writes a synthetic song (WAV, transcription JSON and its binary copy) and returns (audio_path, json_path)."""
+    audio_path = make_synthetic_audio(os.path.join(work_dir, f"{name}.wav"), duration_seconds, seed=seed)
+    json_path = os.path.join(work_dir, f"{name}{main.TRANSCRIPTION_SUFFIX}")
+    sentences = make_synthetic_transcript(duration_seconds, words_per_second, seed)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(sentences, f, indent=2, ensure_ascii=False)
+    save_binary_transcript(json_path, sentences)
+    return audio_path, json_path
+
+# --- Frame Rendering ---
+def _install_transcript(transcript):
+    """Points the frame renderer at a transcript with fresh caches."""
+    main.load_font()
+    main.line_sprite_cache.clear()
+    main._global_sentences_for_frame = transcript
+    main._global_timeline_index = None
+    main.reset_frame_state()
+
+def _uninstall_transcript():
+    main._global_sentences_for_frame = []
+    main._global_timeline_index = None
+    main.line_sprite_cache.clear()
+    main.reset_frame_state()
+
+def render_reference_frame(sentences, t):
+    """
+    Renders a frame the way the original renderer did: a new PIL image per frame, every visible word drawn
+    with draw.text and progressive highlights pasted from a cropped RGBA image, straight from the JSON
+    sentences (float64 times). The sprite, timeline-index and incremental renderers must give exactly these pixels.
+    """
+    font = main.load_font()
+    frame_pil = main.Image.new('RGB', main.VIDEO_SIZE, main.BACKGROUND_COLOR_PIL)
+    draw = main.ImageDraw.Draw(frame_pil)
+    if not sentences or not font:
+        return np.array(frame_pil)
+
+    first_incomplete_idx = next((i for i, sentence in enumerate(sentences) if t < sentence['end_time']), -1)
+    if first_incomplete_idx == -1:
+        first_incomplete_idx = max(0, len(sentences) - main.MAX_SENTENCES_ON_SCREEN)
+    sentences_to_render = sentences[first_incomplete_idx:first_incomplete_idx + main.MAX_SENTENCES_ON_SCREEN]
+
+    line_height = main.get_line_height(font)
+    current_y_baseline = max(main.MARGIN_Y // 2, (main.VIDEO_SIZE[1] - len(sentences_to_render) * line_height) // 2)
+    current_y_baseline -= font.getbbox('A', anchor='ls')[1]
+    for sentence in sentences_to_render:
+        word_widths = [main.get_word_size(word_info['text'], font)[0] for word_info in sentence['words']]
+        sentence_width = sum(word_widths) + main.WORD_SPACING * max(0, len(word_widths) - 1)
+        current_x = main.MARGIN_X // 2 if sentence_width >= main.VIDEO_SIZE[0] - main.MARGIN_X else (main.VIDEO_SIZE[0] - sentence_width) // 2
+        for word_info, word_width in zip(sentence['words'], word_widths):
+            word_text, word_start, word_end = word_info['text'], word_info['start'], word_info['end']
+            is_fully_highlighted = t >= word_end
+            highlight_progress = 0.0
+            if main.PROGRESSIVE_HIGHLIGHT:
+                if is_fully_highlighted:
+                    highlight_progress = 1.0
+                elif t > word_start and word_end - word_start > 0.01:
+                    highlight_progress = max(0.0, min(1.0, (t - word_start) / (word_end - word_start)))
+
+            draw.text((current_x, current_y_baseline), word_text, font=font, fill=main.TEXT_COLOR_NORMAL, anchor='ls')
+            if main.PROGRESSIVE_HIGHLIGHT and highlight_progress > 0:
+                highlight_width = int(word_width * highlight_progress)
+                bbox = font.getbbox(word_text, anchor='ls')
+                word_visual_height = bbox[3] - bbox[1]
+                if highlight_width > 0 and word_width > 0 and word_visual_height > 0:
+                    temp_img = main.Image.new('RGBA', (word_width, word_visual_height), (0, 0, 0, 0))
+                    main.ImageDraw.Draw(temp_img).text((0, -bbox[1]), word_text, font=font, fill=main.TEXT_COLOR_HIGHLIGHT, anchor='ls')
+                    highlight_img = temp_img.crop((0, 0, highlight_width, word_visual_height))
+                    frame_pil.paste(highlight_img, (current_x, current_y_baseline + bbox[1]), highlight_img)
+            elif not main.PROGRESSIVE_HIGHLIGHT and is_fully_highlighted:
+                draw.text((current_x, current_y_baseline), word_text, font=font, fill=main.TEXT_COLOR_HIGHLIGHT, anchor='ls')
+            current_x += word_width + main.WORD_SPACING
+        current_y_baseline += line_height
+    return np.array(frame_pil)
+
+def render_golden_frames(transcript, duration_seconds, count=GOLDEN_FRAME_COUNT):
+    """Returns (times, SHA-1 digests) of 'count' frames evenly spread over the song, rendered without frame reuse."""
+    total_frames = int(duration_seconds * main.FPS)
+    frame_indices = sorted(set(np.linspace(0, total_frames - 1, count).astype(int).tolist()))
+    _install_transcript(transcript)
+    dedup = main.DEDUPLICATE_FRAMES
+    main.DEDUPLICATE_FRAMES = False
+    try:
+        digests = [hashlib.sha1(main.make_karaoke_frame_sentence(idx / main.FPS).tobytes()).hexdigest() for idx in frame_indices]
+    finally:
+        main.DEDUPLICATE_FRAMES = dedup
+        _uninstall_transcript()
+    return [round(idx / main.FPS, 4) for idx in frame_indices], digests
+
+def bench_frames(transcript, duration_seconds, max_frames):
+    """Measures make_karaoke_frame_sentence over consecutive frames, with and without duplicate-frame reuse."""
+    num_frames = min(int(duration_seconds * main.FPS), max_frames)
+    result = {'frames': num_frames}
+    dedup = main.DEDUPLICATE_FRAMES
+    try:
+        for key, deduplicate in (('frames_per_second', True), ('frames_per_second_no_dedup', False)):
+            main.DEDUPLICATE_FRAMES = deduplicate
+            _install_transcript(transcript)
+            main.get_timeline_index() # Index building is measured by the load benchmark, not per frame
+            start_time = time.perf_counter()
+            for frame_index in range(num_frames):
+                main.make_karaoke_frame_sentence(frame_index / main.FPS)
+            result[key] = round(num_frames / (time.perf_counter() - start_time), 1)
+            if deduplicate:
+                result['frames_reused'] = main.frame_render_stats['reused']
+    finally:
+        main.DEDUPLICATE_FRAMES = dedup
+        _uninstall_transcript()
+    return result
+
+# --- Encoding and Enhancement ---
+def bench_encode(audio_path, json_path, work_dir, writer_backend):
+    """Renders and encodes the synthetic song into a video (frames/s includes encoding and audio muxing)."""
+    output_path = os.path.join(work_dir, "benchmark_encode.mp4")
+    start_time = time.perf_counter()
+    main.create_karaoke_video_from_json(audio_path, json_path, output_path, writer_backend=writer_backend)
+    seconds = time.perf_counter() - start_time
+    return {
+        'frames': main.render_stats['frames'],
+        'seconds': round(seconds, 3),
+        'frames_per_second': round(main.render_stats['frames'] / seconds, 1),
+        'output_mb': round(os.path.getsize(output_path) / (1024 * 1024), 2)
+    }
+
+def bench_enhance(audio_path, work_dir):
+    """Runs chunked noise reduction on the synthetic audio and reports seconds of audio processed per second."""
+    output_path = os.path.join(work_dir, "benchmark_enhanced.wav")
+    start_time = time.perf_counter()
+    main.enhance_instrumental_chunked(audio_path, output_path)
+    seconds = time.perf_counter() - start_time
+    return {
+        'seconds': round(seconds, 3),
+        'audio_seconds_per_second': round(main.get_audio_duration(audio_path) / seconds, 2),
+        'chunks': main.enhancement_stats.get('chunks'),
+        'workers': main.enhancement_stats.get('workers')
+    }
+
+# --- Transcript Loading ---
+def bench_load(json_path, repeats=20):
+    """Times loading the transcript from JSON and from its memory-mapped binary copy (best of 'repeats')."""
+    def best_ms(load):
+        timings = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            load()
+            timings.append(time.perf_counter() - start_time)
+        return round(1000 * min(timings), 3)
+
+    transcript = Transcript.from_json(json_path)
+    return {
+        'sentences': len(transcript),
+        'words': transcript.num_words,
+        'json_ms': best_ms(lambda: Transcript.from_json(json_path)),
+        'binary_ms': best_ms(lambda: Transcript.load(binary_transcript_path(json_path))),
+        'index_ms': best_ms(lambda: main.build_timeline_index(transcript, main.load_font()))
+    }
+
+# --- Bridge Round Trip ---
+def bench_bridge(pings=50):
+    """Starts the Python bridge, then measures its startup time and the round-trip latency of 'ping' requests."""
+    bridge_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_bridge.py")
+    start_time = time.perf_counter()
+    process = subprocess.Popen([sys.executable, bridge_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True, encoding='utf-8')
+
+    def request(request_id, request_type):
+        process.stdin.write(json.dumps({"id": request_id, "type": request_type}) + "\n")
+        process.stdin.flush()
+        for line in process.stdout:
+            # main.py prints plain progress lines on stdout; Electron ignores them the same way
+            if not line.startswith("{"):
+                continue
+            message = json.loads(line)
+            if message.get("type") == "response" and message.get("id") == request_id:
+                return message
+        raise RuntimeError("Bridge exited before responding")
+
+    try:
+        request("startup", "ping")
+        startup_seconds = time.perf_counter() - start_time
+        latencies = []
+        for idx in range(pings):
+            ping_start = time.perf_counter()
+            request(f"ping-{idx}", "ping")
+            latencies.append(1000 * (time.perf_counter() - ping_start))
+        request("stop", "stop")
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {
+        'startup_seconds': round(startup_seconds, 3),
+        'pings': pings,
+        'ping_p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'ping_p95_ms': round(float(np.percentile(latencies, 95)), 3)
+    }
+
+# --- Baseline Comparison ---
+def compare_results(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compares results against a baseline. Returns (metric comparisons, golden-frame mismatch times or None).
+    Golden frames are only compared when both runs rendered the same song with the same font.
+    """
+    comparisons = []
+    for benchmark, metric, higher_is_better in COMPARED_METRICS:
+        current = results['benchmarks'].get(benchmark, {}).get(metric)
+        previous = baseline.get('benchmarks', {}).get(benchmark, {}).get(metric)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        slowdown = -change if higher_is_better else change
+        comparisons.append({
+            'metric': f"{benchmark}.{metric}",
+            'baseline': previous,
+            'current': current,
+            'change_percent': round(100 * change, 1),
+            'regression': slowdown > tolerance
+        })
+
+    golden, baseline_golden = results.get('golden_frames'), baseline.get('golden_frames')
+    if not golden or not baseline_golden or golden['song'] != baseline_golden['song'] or golden['font'] != baseline_golden['font']:
+        return comparisons, None
+    mismatches = [t for t, digest, expected in zip(golden['times'], golden['digests'], baseline_golden['digests']) if digest != expected]
+    return comparisons, mismatches
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the karaoke pipeline on a synthetic song and check golden frames.")
+    parser.add_argument("--duration", type=float, default=180, help="Length of the synthetic song in seconds (frames, load, golden frames)")
+    parser.add_argument("--words-per-second", type=float, default=2.5, help="Word density of the synthetic transcript")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic song")
+    parser.add_argument("--max-frames", type=int, default=2400, help="Frames rendered by the frame benchmark")
+    parser.add_argument("--encode-seconds", type=float, default=20, help="Length of the song encoded by the encode benchmark")
+    parser.add_argument("--enhance-seconds", type=float, default=30, help="Length of the audio denoised by the enhance benchmark")
+    parser.add_argument("--writer", choices=['ffmpeg', 'moviepy'], default=main.VIDEO_WRITER_BACKEND, help="Video writer backend to encode with")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Allowed slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    song = {'duration': args.duration, 'words_per_second': args.words_per_second, 'seed': args.seed}
+    results = {
+        'song': song,
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'benchmarks': {}
+    }
+    sentences = make_synthetic_transcript(args.duration, args.words_per_second, args.seed)
+    transcript = Transcript.from_sentences(sentences)
+    font = main.load_font()
+    font_name = f"{os.path.basename(font.path)}:{font.size}" if font is not None and hasattr(font, 'path') else None
+    print(f"Synthetic song: {args.duration:.0f}s, {len(transcript)} sentences, {transcript.num_words} words")
+
+    with tempfile.TemporaryDirectory(prefix="karaoke-bench-") as work_dir:
+        if 'frames' in selected:
+            print("\n=== Frame rendering ===")
+            results['benchmarks']['frames'] = bench_frames(transcript, args.duration, args.max_frames)
+            times, digests = render_golden_frames(transcript, args.duration)
+            results['golden_frames'] = {'song': song, 'font': font_name, 'times': times, 'digests': digests}
+        if 'load' in selected:
+            print("\n=== Transcript loading ===")
+            json_path = os.path.join(work_dir, f"load{main.TRANSCRIPTION_SUFFIX}")
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(sentences, f, indent=2, ensure_ascii=False)
+            save_binary_transcript(json_path, sentences)
+            results['benchmarks']['load'] = bench_load(json_path)
+        if 'encode' in selected:
+            print("\n=== Video encoding ===")
+            audio_path, json_path = write_song(work_dir, "encode", args.encode_seconds, args.words_per_second, args.seed)
+            results['benchmarks']['encode'] = bench_encode(audio_path, json_path, work_dir, args.writer)
+        if 'enhance' in selected:
+            print("\n=== Instrumental enhancement ===")
+            try:
+                audio_path = make_synthetic_audio(os.path.join(work_dir, "enhance.wav"), args.enhance_seconds, seed=args.seed)
+                results['benchmarks']['enhance'] = bench_enhance(audio_path, work_dir)
+            except ImportError as e:
+                print(f"Skipping enhancement benchmark: {e}")
+        if 'bridge' in selected:
+            print("\n=== Bridge round trip ===")
+            results['benchmarks']['bridge'] = bench_bridge()
+
+    print("\n--- Benchmark Results ---")
+    for benchmark, values in results['benchmarks'].items():
+        print(f"{benchmark:>8}: " + ", ".join(f"{key}={value}" for key, value in values.items()))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    comparisons, mismatches = compare_results(results, baseline, args.tolerance)
+    print(f"\n--- Compared to {args.baseline} ---")
+    for comparison in comparisons:
+        flag = "  REGRESSION" if comparison['regression'] else ""
+        print(f"{comparison['metric']:>34}: {comparison['baseline']} -> {comparison['current']} ({comparison['change_percent']:+.1f}%){flag}")
+    if mismatches is None:
+        print("Golden frames: not compared (different song, font, or frames not benchmarked)")
+    elif mismatches:
+        print(f"Golden frames: {len(mismatches)} of {len(results['golden_frames']['times'])} frames differ (first at t={mismatches[0]}s)")
+    else:
+        print(f"Golden frames: all {len(results['golden_frames']['times'])} frames identical")
+    return 1 if mismatches or any(comparison['regression'] for comparison in comparisons) else 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
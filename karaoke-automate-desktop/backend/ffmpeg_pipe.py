@@ -0,0 +1,202 @@
+"""
+Direct FFmpeg rawvideo pipe writer for Karaoke Automate
+Streams rendered frames straight into an ffmpeg subprocess
+"""
+
+import queue
+import subprocess
+import threading
+
+import numpy as np
+
+def rgb_to_yuv420p(frame, out):
+    """
+    Converts an (H, W, 3) uint8 RGB frame into planar yuv420p, writing into the preallocated
+    uint8 buffer 'out' of size H*W*3/2 (Y plane, then U, then V). H and W must be even.
+    Uses the BT.601 limited-range fixed-point formulas, the same matrix ffmpeg applies to rgb24 input, and
+    averages each 2x2 block for chroma (swscale's 'area' filter; its default filter differs only at sharp color edges).
+    """
+    height, width = frame.shape[:2]
+    luma_size = height * width
+    chroma_size = luma_size // 4
+    red, green, blue = frame[..., 0], frame[..., 1], frame[..., 2]
+
+    # --- Luma: Y = ((66R + 129G + 25B + 128) >> 8) + 16, fits in uint16 ---
+    luma = np.multiply(red, 66, dtype=np.uint16)
+    luma += np.multiply(green, 129, dtype=np.uint16)
+    luma += np.multiply(blue, 25, dtype=np.uint16)
+    luma += 128
+    luma >>= 8
+    luma += 16
+    np.copyto(out[:luma_size].reshape(height, width), luma, casting='unsafe')
+
+    # --- Chroma from the sum of each 2x2 block (the /4 average is folded into the shift) ---
+    def block_sum(channel):
+        total = channel[0::2, 0::2].astype(np.int32)
+        total += channel[1::2, 0::2]
+        total += channel[0::2, 1::2]
+        total += channel[1::2, 1::2]
+        return total
+    red_sum, green_sum, blue_sum = block_sum(red), block_sum(green), block_sum(blue)
+    chroma_u = ((-38 * red_sum - 74 * green_sum + 112 * blue_sum + 512) >> 10) + 128
+    chroma_v = ((112 * red_sum - 94 * green_sum - 18 * blue_sum + 512) >> 10) + 128
+    np.copyto(out[luma_size:luma_size + chroma_size].reshape(height // 2, width // 2), np.clip(chroma_u, 0, 255), casting='unsafe')
+    np.copyto(out[luma_size + chroma_size:].reshape(height // 2, width // 2), np.clip(chroma_v, 0, 255), casting='unsafe')
+    return out
+
+
+class FFmpegPipeWriter:
+    """
+    Writes frames to an ffmpeg subprocess through its stdin.
+
+    The caller (producer) renders frames and calls write_frame(); a writer thread drains a bounded
+    queue into the pipe, so rendering and pipe writes overlap. With pixel_format='yuv420p', frames are
+    converted in NumPy into a pool of preallocated buffers, halving the pipe bandwidth compared to rgb24.
+    Frames passed to write_frame() must not be modified afterwards; passing the same array object again
+    (an unchanged frame) re-sends it without converting it again.
+    """
+
+    def __init__(self, output_path, size, fps, ffmpeg_binary="ffmpeg", pixel_format="rgb24",
+                 codec="libx264", preset="medium", threads=None, ffmpeg_params=None,
+                 audio_path=None, audio_codec="aac", queue_size=8):
+        if pixel_format not in ("rgb24", "yuv420p"):
+            raise ValueError(f"Unsupported pipe pixel format: {pixel_format}")
+        if pixel_format == "yuv420p" and (size[0] % 2 or size[1] % 2):
+            raise ValueError("yuv420p pipe output requires even frame dimensions")
+
+        self.output_path = output_path
+        self.size = size
+        self.pixel_format = pixel_format
+        self.frames_written = 0
+
+        command = [
+            ffmpeg_binary, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo",
+            "-s", f"{size[0]}x{size[1]}",
+            "-pix_fmt", pixel_format,
+            "-r", str(fps),
+            "-i", "-"
+        ]
+        if audio_path:
+            command += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:a", audio_codec]
+        else:
+            command += ["-an"]
+        command += ["-c:v", codec, "-preset", preset]
+        if threads:
+            command += ["-threads", str(threads)]
+        command += list(ffmpeg_params or []) + [output_path]
+        self.command = command
+
+        # --- Buffer Pool (yuv420p) ---
+        # Each buffer holds a reference count: one per queued write plus one while it is the latest frame
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._free_buffers = queue.Queue()
+        self._buffers = []
+        self._buffer_refs = []
+        self._refs_lock = threading.Lock()
+        self._last_frame = None
+        self._last_buffer_idx = None
+        if pixel_format == "yuv420p":
+            buffer_size = size[0] * size[1] * 3 // 2
+            # Enough buffers for a full queue, the one being written and the one being converted
+            for idx in range(queue_size + 2):
+                self._buffers.append(np.empty(buffer_size, dtype=np.uint8))
+                self._buffer_refs.append(0)
+                self._free_buffers.put(idx)
+
+        self._error = None
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # Drain stderr continuously so a chatty ffmpeg can never block on a full pipe
+        self._stderr_chunks = []
+        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_thread.start()
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer_thread.start()
+
+    def _read_stderr(self):
+        for chunk in iter(lambda: self._proc.stderr.read(4096), b""):
+            self._stderr_chunks.append(chunk)
+
+    def _release_buffer(self, idx):
+        with self._refs_lock:
+            self._buffer_refs[idx] -= 1
+            if self._buffer_refs[idx] == 0:
+                self._free_buffers.put(idx)
+
+    def _write_loop(self):
+        """Writer thread: moves queued frames into the ffmpeg pipe (pipe writes release the GIL)."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                if self._error is None:
+                    data = self._buffers[item] if isinstance(item, int) else item
+                    self._proc.stdin.write(memoryview(data).cast('B'))
+            except (BrokenPipeError, OSError) as e:
+                self._error = e
+            finally:
+                if isinstance(item, int):
+                    self._release_buffer(item)
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise IOError(f"ffmpeg pipe writer failed: {self._error}\n{self.stderr_output()}")
+
+    def stderr_output(self):
+        """Returns everything ffmpeg wrote to stderr so far."""
+        return b"".join(self._stderr_chunks).decode('utf-8', errors='ignore')
+
+    def write_frame(self, frame):
+        """Queues one (H, W, 3) uint8 RGB frame for writing; blocks while the queue is full."""
+        self._raise_if_failed()
+        if self.pixel_format == "rgb24":
+            self._queue.put(np.ascontiguousarray(frame))
+        elif frame is self._last_frame:
+            # Unchanged frame - send the already converted buffer again
+            with self._refs_lock:
+                self._buffer_refs[self._last_buffer_idx] += 1
+            self._queue.put(self._last_buffer_idx)
+        else:
+            idx = self._free_buffers.get()
+            rgb_to_yuv420p(frame, self._buffers[idx])
+            with self._refs_lock:
+                self._buffer_refs[idx] = 2 # Queued write + latest frame
+            if self._last_buffer_idx is not None:
+                self._release_buffer(self._last_buffer_idx)
+            self._last_frame = frame
+            self._last_buffer_idx = idx
+            self._queue.put(idx)
+        self.frames_written += 1
+
+    def close(self):
+        """Flushes queued frames, closes the pipe and waits for ffmpeg to finish."""
+        if self._proc is None:
+            return
+        self._queue.put(None)
+        self._writer_thread.join()
+        try:
+            self._proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        return_code = self._proc.wait()
+        self._stderr_thread.join()
+        self._proc = None
+        self._last_frame = None
+        if return_code != 0 or self._error is not None:
+            raise IOError(f"ffmpeg exited with code {return_code} while writing {self.output_path}:\n{self.stderr_output()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._proc is not None:
+            # Abort: stop ffmpeg instead of encoding a truncated stream to completion
+            self._proc.kill()
+            self._queue.put(None)
+            self._writer_thread.join()
+            self._proc.wait()
+            self._proc = None
+            return False
+        self.close()
+        return False
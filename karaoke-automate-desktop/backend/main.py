@@ -1,23 +1,32 @@
 import os
 import warnings
-import whisper
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import time
 import math
 import subprocess
-import torch
 import soundfile as sf
-import noisereduce as nr
 import json # For saving/loading transcription
 import gc   # For garbage collection
 import argparse # For command-line arguments
 import sys # To check arguments
 import re
-import yt_dlp
+import bisect
+import importlib
 import platform
-from moviepy.video.VideoClip import VideoClip
-from moviepy.audio.io.AudioFileClip import AudioFileClip
+import threading
+import tempfile
+import shutil
+import multiprocessing
+import concurrent.futures
+import contextlib
+from collections import OrderedDict
+from ffmpeg_pipe import FFmpegPipeWriter
+from stage_cache import StageCache, cache_key, file_digest
+from batch_pipeline import StagePipeline
+from voice_activity import detect_voiced_regions, VoicedAudio, split_regions_into_chunks
+from transcript_store import as_transcript, load_transcript, save_binary_transcript, is_transcript_edited, transcript_source_key
+from stage_metrics import JobMetrics, parse_profile_modes, summarize_frame_timings, PROFILE_MODES
 
 # Suppress TensorFlow INFO/DEBUG messages (1=INFO, 2=WARNING, 3=ERROR)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -84,53 +93,233 @@ MARGIN_X = 50 # Left/right margin for text block
 MARGIN_Y = 50 # Top/bottom margin for text block
 MAX_SENTENCES_ON_SCREEN = 8
 PROGRESSIVE_HIGHLIGHT = True # Highlight words character by character
+LINE_SPRITE_CACHE_SIZE = 64 # Max pre-rendered sentence lines kept in memory
+DEDUPLICATE_FRAMES = True # Reuse the previous frame buffer when nothing visible changed
+INCREMENTAL_FRAME_UPDATES = True # Redraw only word regions whose highlight changed; whole frame only when the visible sentences shift
+VARIABLE_FRAME_RATE = False # Drop duplicate frames in ffmpeg and write variable-frame-rate video
+VFR_MAX_STATIC_SECONDS = 2 # With VFR, still emit a frame at least this often during static stretches
 
 DEMUCS_MODEL = "htdemucs" # Demucs model for separation
+DEMUCS_IN_PROCESS = True # Run Demucs inside this process with a warm model (falls back to 'python -m demucs')
 RUN_SEPARATION = True # Set False to skip Demucs if stems exist
 RUN_ENHANCEMENT = False # Set True to run noise reduction on instrumental
 RUN_TRANSCRIPTION = True # Set False to skip Whisper if JSON exists
 
 ENHANCED_SUFFIX = "_enhanced"
 TRANSCRIPTION_SUFFIX = "_transcription.json"
+METRICS_SUFFIX = "_metrics.json" # Per-job stage metrics (wall/CPU time, peak RSS, real-time factor, counters)
+PROFILE_SUFFIX = "_profile" # Opt-in stage profiles are written as <base_name>_profile_<stage>.prof / _cpu.txt / _memory.txt
 WHISPER_MODEL_SIZE = "medium" # tiny, base, small, medium, large (affects VRAM/RAM usage and quality)
+WHISPER_INT8_SUFFIX = "-int8" # Append to a model size (e.g. 'medium-int8') for dynamic int8 quantization of its linear layers (CPU only)
+VAD_ENABLED = True # Transcribe only the voiced regions of the vocal stem (skips long instrumental stretches)
+VAD_MIN_SILENCE_SECONDS = 1.0 # Only silences at least this long are cut out before Whisper
+VAD_PADDING_SECONDS = 0.3 # Audio kept on each side of a voiced region
+TRANSCRIPTION_WORKERS = 1 # CPU only: transcribe chunks (split at silences) in this many processes, each with its own Whisper model
 ENHANCEMENT_CHUNK_SECONDS = 20 # Process audio enhancement in chunks (seconds)
+ENHANCEMENT_PROP_DECREASE = 0.75 # noisereduce proportion of noise to remove
+ENHANCEMENT_OVERLAP_SECONDS = 1 # Overlap on each side of a chunk boundary, crossfaded to hide chunk seams (0 = hard cuts)
+ENHANCEMENT_WORKERS = 2 # Processes denoising chunks/channels in parallel (None = one per CPU core, 1 = in this process); each holds a chunk in memory
+STAGE_CACHE_ENABLED = False # Reuse stems/transcriptions/enhanced audio from the content-addressed stage cache (opt-in: it stores copies on disk)
 VIDEO_OUTPUT_PRESET = 'medium' # FFMPEG preset ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow') - faster uses less CPU/Mem but lower quality/larger file
+ENCODING_PROFILE = 'auto' # x264 settings: a name in ENCODING_PROFILES, 'auto' (see select_encoding_profile) or None for the plain VIDEO_OUTPUT_PRESET encode
+# x264 settings for mostly static text on a black background: the stillimage tune, CRF rate control and long keyframe intervals
+ENCODING_PROFILES = {
+    'fast-archive': {'preset': 'veryfast', 'tune': 'stillimage', 'crf': 18, 'keyint_seconds': 10}, # Quick encode at high quality
+    'small-share': {'preset': 'slow', 'tune': 'stillimage', 'crf': 26, 'keyint_seconds': 30}, # Smallest files for uploading/sharing
+    'preview': {'preset': 'ultrafast', 'crf': 30, 'keyint_seconds': 10}, # Fastest encode, for previews
+}
+ENCODING_SHARE_MIN_WORDS_PER_SECOND = 2.0 # 'auto' picks small-share from this word density (sparser lyrics already encode small)
+ENCODING_SHARE_MAX_SECONDS = 600 # ... up to this video duration (longer videos use fast-archive to bound encode time)
+AUDIO_BITRATE = '128k' # AAC bitrate of the encoded instrumental, which is encoded once and stream-copied into every render
+PREVIEW_SCALE = 0.5 # Preview frame size relative to VIDEO_SIZE (the font, word spacing and margins scale with it)
+PREVIEW_FPS = 12 # Preview frame rate
+PREVIEW_ENCODING_PROFILE = 'preview' # Encoding profile for previews
+ASS_SUBTITLES = None # None = Python frame renderer; 'burn' = libass draws an ASS karaoke script in ffmpeg; 'soft' = ASS subtitle track in an .mkv
+ASS_SUFFIX = ".ass" # ASS karaoke scripts are written as <video name>.ass
+PREVIEW_SUFFIX = "_preview" # Previews are written as <video name>_preview.mp4
 VIDEO_THREADS_RATIO = 0.5 # Ratio of CPU cores to use for video encoding (e.g., 0.5 = half)
+VIDEO_WRITER_BACKEND = 'ffmpeg' # 'ffmpeg' = direct rawvideo pipe into ffmpeg, 'moviepy' = MoviePy write_videofile
+PIPE_PIXEL_FORMAT = 'rgb24' # Pipe frames as 'rgb24' or as 'yuv420p' converted in NumPy (half the pipe bandwidth)
+PIPE_QUEUE_SIZE = 8 # Frames buffered between the renderer and the ffmpeg pipe writer thread
+FRAME_CANVAS_COUNT = PIPE_QUEUE_SIZE + 2 # Frame buffers drawn into in turn; a returned frame stays valid until this many more are rendered
+RENDER_WORKERS = 1 # Worker processes rendering video segments in parallel (1 = single process)
+SEGMENT_GOP_FRAMES = FPS * 10 # Keyframe interval (and length) of cached segments, overriding the profile's; also for parallel renders without a profile
+SEGMENT_CACHE = False # Render full-quality videos as cached segments so re-renders after transcript edits redo only changed segments (needs the stage cache)
+SEGMENT_CACHE_VERSION = 1 # Part of every cached segment's key - bump when frame rendering changes
+BATCH_STAGE_LIMITS = {'download': 2, 'separate': 1, 'transcribe': 1, 'enhance': 1, 'render': 1} # Max songs in each stage at once in batch mode
+BATCH_AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.m4a', '.ogg', '.aac') # Files picked up when a batch input is a directory
 # --- End Configuration ---
 
 # --- Font Loading ---
-font_path = get_font_path()
-try:
-    if font_path:
-        font = ImageFont.truetype(font_path, FONT_SIZE)
-        print(f"Font loaded successfully.")
-    else:
-        raise IOError("No font path found")
-except (IOError, OSError):
-    print("Warning: Could not load TrueType font. Trying default PIL font.")
+# Loaded on first use by the renderer, so importing this module does not probe font paths
+font = None
+_font_loaded = False
+
+def load_font():
+    """Loads the karaoke font once per process and returns it (None if no font could be loaded)."""
+    global font, _font_loaded
+    if _font_loaded:
+        return font
+    font_path = get_font_path()
     try:
-        font = ImageFont.load_default()
-        print("Using default PIL font.")
-    except Exception as e:
-        print(f"CRITICAL: Could not load any font. Text rendering will fail. Error: {e}")
-        font = None # Ensure font is None if loading fails completely
+        if font_path:
+            font = ImageFont.truetype(font_path, FONT_SIZE)
+            print(f"Font loaded successfully.")
+        else:
+            raise IOError("No font path found")
+    except (IOError, OSError):
+        print("Warning: Could not load TrueType font. Trying default PIL font.")
+        try:
+            font = ImageFont.load_default()
+            print("Using default PIL font.")
+        except Exception as e:
+            print(f"CRITICAL: Could not load any font. Text rendering will fail. Error: {e}")
+            font = None # Ensure font is None if loading fails completely
+    _font_loaded = True
+    return font
+
+# --- Lazy Dependency Loading ---
+# Heavy dependencies are imported by the stage that needs them; warm_up() imports them ahead of time
+STAGE_MODULES = {
+    'download': ['yt_dlp'],
+    'separate': ['torch', 'demucs.apply', 'demucs.pretrained', 'demucs.audio'],
+    'transcribe': ['torch', 'whisper'],
+    'enhance': ['noisereduce'],
+    'render': ['moviepy.video.VideoClip', 'moviepy.audio.io.AudioFileClip', 'moviepy.video.io.ffmpeg_writer', 'moviepy.config'],
+}
+
+def get_ffmpeg_binary():
+    """Returns the ffmpeg executable MoviePy is configured with."""
+    from moviepy.config import FFMPEG_BINARY
+    return FFMPEG_BINARY
+
+def warm_up(stages=tuple(STAGE_MODULES)):
+    """
+    Imports the dependencies of the given stages (and loads the font for 'render') ahead of time.
+    Returns {stage: seconds}. Modules that fail to import are reported and left to fail in the stage itself.
+    """
+    timings = {}
+    for stage in stages:
+        start_time = time.time()
+        for module_name in STAGE_MODULES.get(stage, []):
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                print(f"Warning: Could not preload '{module_name}' for {stage}: {e}")
+        if stage == 'render':
+            load_font()
+        timings[stage] = round(time.time() - start_time, 2)
+    return timings
+
+# --- Demucs In-Process Engine ---
+# Loaded Demucs models, kept warm for the lifetime of this (worker) process
+_demucs_models = {}
+_demucs_lock = threading.Lock()
+
+def get_demucs_model(model_name):
+    """Returns the Demucs model 'model_name', loading it on first use in this process."""
+    with _demucs_lock:
+        if model_name not in _demucs_models:
+            from demucs.pretrained import get_model # Optional dependency, imported on first use
+            print(f"Loading Demucs model '{model_name}' (kept in memory for later jobs)...")
+            model = get_model(model_name)
+            model.cpu()
+            model.eval()
+            _demucs_models[model_name] = model
+        return _demucs_models[model_name]
+
+def unload_demucs_models():
+    """Drops all warm Demucs models. Returns the unloaded model names."""
+    with _demucs_lock:
+        unloaded = list(_demucs_models)
+        _demucs_models.clear()
+    if unloaded:
+        release_model_memory()
+    return unloaded
+
+def _load_audio_for_demucs(input_file, samplerate, channels):
+    """Loads audio as a (channels, samples) tensor at the model's rate, like the Demucs CLI."""
+    import torch
+    from demucs.audio import AudioFile, convert_audio
+    try:
+        data, file_rate = sf.read(input_file, dtype='float32', always_2d=True)
+        wav = torch.from_numpy(data.T.copy())
+        return convert_audio(wav, file_rate, samplerate, channels)
+    except Exception:
+        # Formats libsndfile cannot read are decoded with ffmpeg, as the CLI does
+        return AudioFile(input_file).read(streams=0, samplerate=samplerate, channels=channels)
+
+def get_stem_paths(input_file, output_dir, model_name=DEMUCS_MODEL):
+    """
+    Returns (vocal_path, instrumental_path) of a song's stems, laid out like the Demucs CLI's
+    --two-stems output: output_dir/model_name/track_name/{vocals,no_vocals}.wav
+    """
+    track_name = os.path.splitext(os.path.basename(input_file))[0]
+    stem_dir = os.path.join(output_dir, model_name, track_name)
+    return os.path.join(stem_dir, 'vocals.wav'), os.path.join(stem_dir, 'no_vocals.wav')
+
+def separate_vocals_in_process(input_file, output_dir, model_name=DEMUCS_MODEL):
+    """
+    Separates vocals with a Demucs model held in this process (no interpreter/model start-up per song).
+    Writes the same files as the CLI (see get_stem_paths).
+    """
+    import torch
+    from demucs.apply import apply_model
+    from demucs.audio import prevent_clip
+
+    vocal_path, instrumental_path = get_stem_paths(input_file, output_dir, model_name)
+    os.makedirs(os.path.dirname(vocal_path), exist_ok=True)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device} (in-process)")
+
+    model = get_demucs_model(model_name)
+    wav = _load_audio_for_demucs(input_file, model.samplerate, model.audio_channels)
+
+    # Same normalization and defaults as 'python -m demucs' (shifts=1, split, overlap=0.25)
+    ref = wav.mean(0)
+    wav -= ref.mean()
+    wav /= ref.std()
+    with _demucs_lock: # One separation at a time per warm model
+        with torch.no_grad():
+            sources = apply_model(model, wav[None], device=device, shifts=1, split=True, overlap=0.25, progress=False)[0]
+    sources *= ref.std()
+    sources += ref.mean()
+
+    # --two-stems vocals: vocals plus the sum of all other stems
+    vocals_idx = model.sources.index('vocals')
+    no_vocals = sum(source for idx, source in enumerate(sources) if idx != vocals_idx)
+    # Same clipping mode and 16-bit PCM as the CLI defaults, written with soundfile
+    for stem, stem_path in ((sources[vocals_idx], vocal_path), (no_vocals, instrumental_path)):
+        stem = prevent_clip(stem, mode='rescale')
+        sf.write(stem_path, stem.cpu().numpy().T, model.samplerate, subtype='PCM_16')
+    return vocal_path, instrumental_path
 
 # --- Demucs Function ---
-def separate_vocals(input_file, output_dir, model_name=DEMUCS_MODEL):
-    """Separates vocals using Demucs CLI."""
+def separate_vocals(input_file, output_dir, model_name=DEMUCS_MODEL, in_process=DEMUCS_IN_PROCESS):
+    """Separates vocals using an in-process Demucs model, falling back to the Demucs CLI."""
     print(f"\n--- Separating Vocals (Demucs: {model_name}) ---")
+    if in_process:
+        start_time = time.time()
+        try:
+            vocal_path, instrumental_path = separate_vocals_in_process(input_file, output_dir, model_name)
+            print(f"Demucs separation finished in {time.time() - start_time:.2f} seconds.")
+            print(f"Vocal track: {vocal_path}")
+            print(f"Instrumental track: {instrumental_path}")
+            return vocal_path, instrumental_path
+        except Exception as e:
+            print(f"Warning: In-process Demucs separation failed ({e}). Falling back to the Demucs CLI.")
     start_time = time.time()
     # Use the output_dir directly for demucs output base
     demucs_output_base_dir = output_dir
-    # The track name will be the input file basename without extension
-    track_name = os.path.splitext(os.path.basename(input_file))[0]
     # Demucs will create: output_dir/model_name/track_name/stem.wav
-    final_stem_dir = os.path.join(demucs_output_base_dir, model_name, track_name)
+    vocal_path, instrumental_path = get_stem_paths(input_file, output_dir, model_name)
+    final_stem_dir = os.path.dirname(vocal_path)
 
     print(f"Target output directory for stems: {final_stem_dir}")
     # Demucs creates the model_name subdir automatically, ensure base output_dir exists
     os.makedirs(demucs_output_base_dir, exist_ok=True)
 
+    import torch
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"Using device: {device}")
 
@@ -158,9 +347,6 @@ def separate_vocals(input_file, output_dir, model_name=DEMUCS_MODEL):
          print("Error: 'python -m demucs' command not found. Is Demucs installed and in your PATH?")
          raise
 
-    vocal_path = os.path.join(final_stem_dir, 'vocals.wav')
-    instrumental_path = os.path.join(final_stem_dir, 'no_vocals.wav')
-
     if not os.path.exists(vocal_path) or not os.path.exists(instrumental_path):
         print(f"Error: Expected output files not found in {final_stem_dir}")
         print("Please check Demucs logs above. Files expected:")
@@ -172,26 +358,188 @@ def separate_vocals(input_file, output_dir, model_name=DEMUCS_MODEL):
     print(f"Instrumental track: {instrumental_path}")
     return vocal_path, instrumental_path
 
+# --- Whisper Model Helpers ---
+def parse_whisper_model_name(model_size):
+    """Splits a model name like 'medium-int8' into ('medium', True); plain sizes return (size, False)."""
+    if model_size.endswith(WHISPER_INT8_SUFFIX):
+        return model_size[:-len(WHISPER_INT8_SUFFIX)], True
+    return model_size, False
+
+def quantize_whisper_model(model):
+    """
+    Applies dynamic int8 quantization to the linear layers of a CPU Whisper model (in place) and returns it.
+    Linear weights are stored as int8 and activations are quantized on the fly, which roughly halves the
+    model's memory and speeds up CPU inference; convolutions, embeddings and layer norms stay float32.
+    """
+    import torch
+    # Whisper's Linear subclass only adds a dtype cast, so plain nn.Linear is equivalent for a float32 CPU model,
+    # and it is the type quantize_dynamic knows how to swap
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                plain_linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain_linear.weight, plain_linear.bias = child.weight, child.bias
+                setattr(parent, name, plain_linear)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning) # torch.ao.quantization deprecation banner
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def load_whisper_model(model_size):
+    """
+    Loads a Whisper model onto the best available device.
+    Names ending in WHISPER_INT8_SUFFIX (e.g. 'medium-int8') load the base model on the CPU and quantize it.
+    """
+    import whisper
+    base_size, quantized = parse_whisper_model_name(model_size)
+    if not quantized:
+        return whisper.load_model(model_size)
+    return quantize_whisper_model(whisper.load_model(base_size, device="cpu"))
+
+def get_model_size_mb(model):
+    """Estimates the memory held by a torch model from its parameters, buffers and packed int8 weights."""
+    import torch
+    total_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+    total_bytes += sum(b.numel() * b.element_size() for b in model.buffers())
+    for module in model.modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear): # int8 weight + float32 bias
+            total_bytes += module.in_features * module.out_features + module.out_features * 4
+    return total_bytes / (1024 * 1024)
+
+def release_model_memory():
+    """Collects garbage and clears the CUDA cache after model references were dropped."""
+    gc.collect() # Explicitly trigger garbage collection
+    torch = sys.modules.get('torch') # No models can be resident if torch was never imported
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache() # Clear GPU memory if CUDA was used
+
+# --- Parallel Chunked Transcription ---
+# Whisper model of a transcription worker process, loaded once by the pool initializer
+_worker_whisper_model = None
+
+def _init_transcription_worker(model_size, torch_threads):
+    """Process pool initializer: splits the cores between workers and loads this worker's model."""
+    global _worker_whisper_model
+    import torch
+    torch.set_num_threads(torch_threads)
+    _worker_whisper_model = load_whisper_model(model_size)
+
+def _transcribe_chunk(samples):
+    """Transcribes one chunk's samples and returns its segments (times relative to the chunk)."""
+    return _worker_whisper_model.transcribe(samples, word_timestamps=True, fp16=False)['segments']
+
+def transcribe_chunks_parallel(chunks, model_size):
+    """
+    Transcribes VoicedAudio chunks in one worker process per chunk and returns all segments,
+    in order, with timestamps moved back to the original timeline.
+    """
+    torch_threads = max(1, (os.cpu_count() or 1) // len(chunks))
+    chunk_segments = [None] * len(chunks)
+    # Spawn keeps workers independent of bridge threads and behaves the same on every platform
+    mp_context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(chunks), mp_context=mp_context,
+                                                initializer=_init_transcription_worker,
+                                                initargs=(model_size, torch_threads)) as executor:
+        futures = {executor.submit(_transcribe_chunk, chunk.samples): idx for idx, chunk in enumerate(chunks)}
+        for completed, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            idx = futures[future]
+            chunk_segments[idx] = future.result()
+            print(f"  Chunk {idx + 1}/{len(chunks)} transcribed ({completed}/{len(chunks)} complete)")
+    return merge_chunk_segments(chunk_segments, chunks)
+
+def merge_chunk_segments(chunk_segments, chunks):
+    """
+    Joins the per-chunk segment lists (times relative to each chunk) into one list on the original timeline,
+    in chunk order. Segments Whisper reports past the end of a chunk's audio would all collapse onto the
+    chunk's last instant and repeat text next to the following chunk, so they are dropped.
+    """
+    merged = []
+    for segments, chunk in zip(chunk_segments, chunks):
+        chunk_seconds = len(chunk.samples) / chunk.rate
+        inside = [segment for segment in segments if segment.get('start', 0.0) < chunk_seconds]
+        merged.extend(remap_transcription_times({'segments': inside}, chunk)['segments'])
+    return merged
+
 # --- Transcription Function ---
-def transcribe_and_save(vocal_path, output_json_path, model_size=WHISPER_MODEL_SIZE):
+# How much audio the last transcription skipped thanks to the voice-activity index, and what it produced
+transcription_stats = {}
+
+def remap_transcription_times(result, voiced_audio):
+    """Moves segment and word timestamps from the voiced-only signal back to the original timeline."""
+    for segment in result.get('segments', []):
+        for key in ('start', 'end'):
+            if isinstance(segment.get(key), (int, float)):
+                segment[key] = voiced_audio.to_original(segment[key])
+        for word_info in segment.get('words') or []:
+            for key in ('start', 'end'):
+                if isinstance(word_info.get(key), (int, float)):
+                    word_info[key] = voiced_audio.to_original(word_info[key])
+    return result
+
+def transcribe_and_save(vocal_path, output_json_path, model_size=WHISPER_MODEL_SIZE, model=None, use_vad=VAD_ENABLED,
+                        workers=TRANSCRIPTION_WORKERS, source_key=None):
     """
     Transcribes vocals using Whisper, saves results to JSON, and releases model.
+    source_key (see transcribe_cached) is recorded in the JSON's binary copy.
+    If a preloaded 'model' is passed (e.g. from a model pool), it is used and kept loaded.
+    With use_vad, only the voiced regions of the stem are transcribed and timestamps are mapped back.
+    With workers > 1 (CPU only), the stem is split at silences into chunks that are transcribed in
+    parallel worker processes, each loading its own model; 'model' is not used then.
     Returns the path to the JSON file.
     """
     print(f"\n--- Transcribing Vocals & Saving Timestamps (Whisper: {model_size}) ---")
     print(f"Input vocal file: {vocal_path}")
     print(f"Output JSON: {output_json_path}")
     start_time = time.time()
-    fp16_enabled = torch.cuda.is_available() # Use FP16 if CUDA is available
+    import torch
+    # Use FP16 if CUDA is available (int8 models always run on the CPU in float32)
+    fp16_enabled = torch.cuda.is_available() and not parse_whisper_model_name(model_size)[1]
+    # Several processes sharing one GPU are slower than one model using all of it
+    num_workers = 1 if fp16_enabled else max(1, workers or 1)
+    owns_model = model is None # Only release models loaded by this call
 
-    model = None # Ensure model variable exists for finally block
     try:
-        print(f"Loading Whisper model '{model_size}' (fp16={fp16_enabled})...")
-        model = whisper.load_model(model_size)
-        print("Model loaded.")
-
-        print("Starting transcription...")
-        result = model.transcribe(vocal_path, word_timestamps=True, fp16=fp16_enabled)
+        transcription_stats.clear()
+        voiced_audio = None
+        chunks = []
+        if use_vad or num_workers > 1:
+            import whisper
+            from whisper.audio import SAMPLE_RATE
+            audio = whisper.load_audio(vocal_path) # 16 kHz mono float32, as Whisper decodes it
+            regions = detect_voiced_regions(audio, SAMPLE_RATE, min_silence_seconds=VAD_MIN_SILENCE_SECONDS,
+                                            padding_seconds=VAD_PADDING_SECONDS)
+            if use_vad:
+                voiced_audio = VoicedAudio(audio, SAMPLE_RATE, regions)
+                transcription_stats.update(voiced_audio.stats())
+                print(f"Voice activity: transcribing {transcription_stats['transcribed_seconds']}s of "
+                      f"{transcription_stats['audio_seconds']}s in {transcription_stats['voiced_regions']} regions "
+                      f"({transcription_stats['skipped_percent']}% skipped)")
+            if num_workers > 1:
+                # Without VAD, each chunk keeps its silences and the chunks together cover the whole track
+                chunks = [VoicedAudio(audio, SAMPLE_RATE, chunk_regions)
+                          for chunk_regions in split_regions_into_chunks(regions, num_workers, None if use_vad else len(audio))]
+            del audio
+
+        if len(chunks) > 1:
+            owns_model = False
+            print(f"Starting transcription of {len(chunks)} chunks in {len(chunks)} worker processes...")
+            transcription_stats['chunks'] = len(chunks)
+            result = {'segments': transcribe_chunks_parallel(chunks, model_size)}
+        else:
+            if owns_model:
+                print(f"Loading Whisper model '{model_size}' (fp16={fp16_enabled})...")
+                model = load_whisper_model(model_size)
+                print("Model loaded.")
+            else:
+                print(f"Using preloaded Whisper model '{model_size}' (fp16={fp16_enabled}).")
+
+            print("Starting transcription...")
+            if voiced_audio is None:
+                result = model.transcribe(vocal_path, word_timestamps=True, fp16=fp16_enabled)
+            elif len(voiced_audio.samples):
+                result = remap_transcription_times(model.transcribe(voiced_audio.samples, word_timestamps=True, fp16=fp16_enabled), voiced_audio)
+            else:
+                print("No voiced regions found in the vocal track. Skipping Whisper.")
+                result = {'segments': []}
         print(f"Transcription finished in {time.time() - start_time:.2f} seconds.")
 
     except Exception as e:
@@ -201,15 +549,11 @@ def transcribe_and_save(vocal_path, output_json_path, model_size=WHISPER_MODEL_S
         raise # Re-raise the exception to stop the process
     finally:
         # --- CRITICAL MEMORY RELEASE ---
-        if model is not None:
+        if owns_model and model is not None:
             print("Releasing Whisper model from memory...")
-            del model # Remove reference to the model object
-            if fp16_enabled:
-                print("Clearing CUDA cache...")
-                torch.cuda.empty_cache() # Clear GPU memory if CUDA was used
+            model = None # Remove reference to the model object
+            release_model_memory()
             print("Model released.")
-        gc.collect() # Explicitly trigger garbage collection
-        print("Garbage collection triggered.")
         # --- END MEMORY RELEASE ---
 
     # --- Process and Structure Results ---
@@ -242,6 +586,7 @@ def transcribe_and_save(vocal_path, output_json_path, model_size=WHISPER_MODEL_S
         # Ensure sentences are sorted by start time, just in case segments weren't ordered
         sentences.sort(key=lambda x: x['start_time'])
         print(f"Structured into {len(sentences)} sentences.")
+        transcription_stats.update(sentences=len(sentences), words=sum(len(s['words']) for s in sentences))
     else:
         print("Warning: No segments or words found in transcription result. JSON will be empty.")
 
@@ -250,6 +595,8 @@ def transcribe_and_save(vocal_path, output_json_path, model_size=WHISPER_MODEL_S
         print(f"Saving transcription data to {output_json_path}...")
         with open(output_json_path, 'w', encoding='utf-8') as f:
             json.dump(sentences, f, indent=2, ensure_ascii=False) # Use indent for readability
+        # Compact columnar copy next to the JSON, memory-mapped by the renderer
+        save_binary_transcript(output_json_path, sentences, source_key)
         print("Transcription data saved.")
         if not os.path.exists(output_json_path):
              raise RuntimeError("JSON file was not created.")
@@ -260,19 +607,84 @@ def transcribe_and_save(vocal_path, output_json_path, model_size=WHISPER_MODEL_S
         raise # Stop if saving fails
 
 # --- Audio Enhancement Function (Chunked Processing) ---
-def enhance_instrumental_chunked(input_audio_path, output_audio_path, chunk_seconds=ENHANCEMENT_CHUNK_SECONDS):
+def split_into_windows(num_frames, chunk_frames, overlap_frames):
+    """
+    Splits [0, num_frames) into chunks of chunk_frames, each widened by overlap_frames on both sides
+    (clipped to the file). Neighbouring windows share 2*overlap_frames samples around each chunk boundary.
+    Returns a list of (start, end) pairs.
     """
-    Enhances instrumental using noisereduce, processing in chunks for memory efficiency.
+    windows = []
+    for chunk_start in range(0, num_frames, chunk_frames):
+        windows.append((max(0, chunk_start - overlap_frames), min(num_frames, chunk_start + chunk_frames + overlap_frames)))
+    return windows
+
+def get_shared_frames(windows, window_idx):
+    """Returns the number of samples window 'window_idx' shares with the window before it (0 for the first and past the last)."""
+    if window_idx <= 0 or window_idx >= len(windows):
+        return 0
+    return windows[window_idx - 1][1] - windows[window_idx][0]
+
+def get_window_weights(windows, window_idx):
+    """
+    Returns the crossfade weights of one window from split_into_windows (with overlap_frames <= chunk_frames // 2,
+    so only neighbouring windows overlap): linear fades over the shared regions, 1 elsewhere. At every sample,
+    the weights of the windows covering it sum to 1.
+    """
+    start, end = windows[window_idx]
+    weights = np.ones(end - start, dtype=np.float32)
+    fade_in, fade_out = get_shared_frames(windows, window_idx), get_shared_frames(windows, window_idx + 1)
+    if fade_in:
+        weights[:fade_in] *= (np.arange(fade_in, dtype=np.float32) + 0.5) / fade_in
+    if fade_out:
+        weights[len(weights) - fade_out:] *= 1 - (np.arange(fade_out, dtype=np.float32) + 0.5) / fade_out
+    return weights
+
+def overlap_add_window(windows, window_idx, block, carry):
+    """
+    Crossfades the processed samples of window 'window_idx' ((samples,) or (samples, channels)) onto the output,
+    windows in order. Returns (final, carry): the samples no later window contributes to, and the weighted
+    region shared with the next window, to be passed back in with it (None for the first window).
+    """
+    weights = get_window_weights(windows, window_idx)
+    block = block * (weights if block.ndim == 1 else weights[:, None])
+    if carry is not None:
+        block[:len(carry)] += carry
+    final_len = len(block) - get_shared_frames(windows, window_idx + 1)
+    return block[:final_len], (block[final_len:].copy() if final_len < len(block) else None)
+
+def _reduce_noise_window(input_audio_path, start_frame, end_frame, channel, rate):
+    """Worker task: reads one window of one channel (None = mono) and returns it noise-reduced as float32."""
+    import noisereduce as nr
+    with sf.SoundFile(input_audio_path, 'r') as infile:
+        infile.seek(start_frame)
+        data = infile.read(frames=end_frame - start_frame, dtype='float32', always_2d=True)
+    samples = data[:, 0 if channel is None else channel]
+    reduced = nr.reduce_noise(y=samples, sr=rate, prop_decrease=ENHANCEMENT_PROP_DECREASE)
+    return np.asarray(reduced[:len(samples)], dtype=np.float32)
+
+# Chunking of the last enhancement (chunks, channels, tasks, workers)
+enhancement_stats = {}
+
+def enhance_instrumental_chunked(input_audio_path, output_audio_path, chunk_seconds=ENHANCEMENT_CHUNK_SECONDS,
+                                 overlap_seconds=ENHANCEMENT_OVERLAP_SECONDS, workers=ENHANCEMENT_WORKERS):
+    """
+    Enhances instrumental using noisereduce, processing overlapping chunks (and each channel) in parallel.
+    Windows overlap by overlap_seconds on each side of every chunk boundary and are crossfaded back
+    together, so per-chunk noise statistics do not cause audible seams.
+    Finished audio is streamed into the output file window by window, so memory use depends on the
+    chunk size and worker count, not on the length of the track.
     """
     print(f"\n--- Enhancing Instrumental Track (Chunked) ---")
     print(f"Input: {input_audio_path}")
     print(f"Output: {output_audio_path}")
-    print(f"Chunk size: {chunk_seconds} seconds")
+    print(f"Chunk size: {chunk_seconds} seconds, overlap: {overlap_seconds} seconds")
     start_time_enh = time.time()
 
-    processed_data_full = None # Initialize outside try
+    outfile = None # Initialize outside try
 
     try:
+        import noisereduce # Fail early (with the install hint below) if it is missing
+
         # Get audio info without loading data
         info = sf.info(input_audio_path)
         rate = info.samplerate
@@ -291,75 +703,71 @@ def enhance_instrumental_chunked(input_audio_path, output_audio_path, chunk_seco
         if chunk_size_frames <= 0:
             print("Warning: Chunk size is zero or negative, processing entire file at once.")
             chunk_size_frames = num_frames
+        # Crossfades of neighbouring boundaries must not overlap within one chunk
+        overlap_frames = min(max(0, int(overlap_seconds * rate)), chunk_size_frames // 2)
 
-        # Allocate output array (use float32 for processing, convert back later if needed)
-        # Determine shape based on channels AFTER checking channel count
-        processed_data_shape = (num_frames, num_channels) if num_channels > 1 else (num_frames,)
-        processed_data_full = np.zeros(processed_data_shape, dtype=np.float32)
+        windows = split_into_windows(num_frames, chunk_size_frames, overlap_frames)
+        channels = [0, 1] if num_channels == 2 else [None]
+        tasks = [(window_idx, channel) for window_idx in range(len(windows)) for channel in channels]
+        num_workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+        print(f"Processing {len(windows)} chunks x {len(channels)} channel(s) on {num_workers} worker process(es)...")
+        enhancement_stats.clear()
+        enhancement_stats.update(chunks=len(windows), channels=len(channels), tasks=len(tasks), workers=num_workers)
 
-        total_chunks = math.ceil(num_frames / chunk_size_frames)
-        print(f"Processing in {total_chunks} chunks...")
-
-        # --- Process Chunks ---
-        with sf.SoundFile(input_audio_path, 'r') as infile:
-            for i in range(total_chunks):
-                start_frame = i * chunk_size_frames
-                frames_to_read = min(chunk_size_frames, num_frames - start_frame)
-                print(f"Processing chunk {i+1}/{total_chunks} (Frames {start_frame} to {start_frame + frames_to_read})...")
-
-                # Load only the current chunk
-                chunk_start_time = time.time()
-                data_chunk = None # Ensure defined for finally
-                reduced_chunk = None
-
-                try:
-                    infile.seek(start_frame)
-                    # Read as float32 for noisereduce
-                    data_chunk = infile.read(frames=frames_to_read, dtype='float32', always_2d=(num_channels > 1))
-
-                    if data_chunk.shape[0] == 0: # Skip empty chunks (shouldn't happen with correct logic)
-                        print(f"  Skipping empty chunk {i+1}.")
-                        continue
-
-                    # --- Apply Noise Reduction ---
-                    if num_channels == 2:
-                        # Process channels separately to potentially save memory vs processing interleaved
-                        print(f"  Processing L/R channels separately for chunk {i+1}...")
-                        reduced_chunk_L = nr.reduce_noise(y=data_chunk[:, 0], sr=rate, prop_decrease=0.75)
-                        reduced_chunk_R = nr.reduce_noise(y=data_chunk[:, 1], sr=rate, prop_decrease=0.75)
-                        # Combine back, ensuring length matches original chunk
-                        current_chunk_len = data_chunk.shape[0]
-                        reduced_chunk = np.column_stack((reduced_chunk_L[:current_chunk_len], reduced_chunk_R[:current_chunk_len]))
-                    else: # Mono
-                        reduced_chunk = nr.reduce_noise(y=data_chunk, sr=rate, prop_decrease=0.75)
-                        # Ensure length matches original chunk
-                        current_chunk_len = len(data_chunk)
-                        reduced_chunk = reduced_chunk[:current_chunk_len]
-
-                    # --- Place processed chunk into the full output array ---
-                    end_frame = start_frame + reduced_chunk.shape[0] # Actual end frame based on reduced chunk size
-                    if num_channels > 1:
-                         processed_data_full[start_frame:end_frame, :] = reduced_chunk
-                    else:
-                         processed_data_full[start_frame:end_frame] = reduced_chunk
-
-                    print(f"  Chunk {i+1} processed in {time.time() - chunk_start_time:.2f}s")
-
-                finally:
-                    # Explicitly delete potentially large chunk data
-                    del data_chunk
-                    del reduced_chunk
-                    if num_channels == 2 and 'reduced_chunk_L' in locals():
-                        del reduced_chunk_L
-                        del reduced_chunk_R
-                    gc.collect() # Collect garbage after each chunk
-
-        # --- Save the final combined audio ---
-        print(f"\nAll chunks processed. Saving final enhanced file to {output_audio_path}...")
         # Try to save with the original subtype if known, otherwise let soundfile choose default for float32
         save_subtype = dtype if dtype and 'float' not in dtype.lower() else None # Use original unless it was float
-        sf.write(output_audio_path, processed_data_full, rate, subtype=save_subtype)
+        outfile = sf.SoundFile(output_audio_path, 'w', samplerate=rate, channels=num_channels, subtype=save_subtype)
+
+        window_parts = {} # window_idx -> {channel: reduced samples} until every channel of the window is done
+        next_window = 0 # Next window to be written
+        carry = None # Crossfade region shared with the next window (weighted, not final yet)
+
+        def write_ready_windows():
+            """Overlap-adds finished windows in order and writes every sample no later window contributes to."""
+            nonlocal next_window, carry
+            while len(window_parts.get(next_window, ())) == len(channels):
+                parts = window_parts.pop(next_window)
+                block = np.stack([parts[channel] for channel in channels], axis=1) if num_channels > 1 else parts[None]
+                final, carry = overlap_add_window(windows, next_window, block, carry)
+                outfile.write(final)
+                next_window += 1
+
+        def add_result(window_idx, channel, reduced):
+            window_parts.setdefault(window_idx, {})[channel] = reduced
+            write_ready_windows()
 
+        # --- Process Chunks ---
+        if num_workers == 1:
+            for completed, (window_idx, channel) in enumerate(tasks, 1):
+                chunk_start_time = time.time()
+                add_result(window_idx, channel, _reduce_noise_window(input_audio_path, *windows[window_idx], channel, rate))
+                print(f"  Chunk {completed}/{len(tasks)} processed in {time.time() - chunk_start_time:.2f}s")
+        else:
+            # Spawn keeps workers independent of bridge threads and behaves the same on every platform
+            mp_context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context) as executor:
+                # Tasks are submitted in order, and only for windows at most windows_ahead past the next one to be
+                # written, so the windows held in memory (running, or finished behind a slower earlier one) stay bounded
+                windows_ahead = 2 * math.ceil(num_workers / len(channels))
+                task_iter = iter(tasks)
+                task = next(task_iter, None)
+                in_flight = {}
+                completed = 0
+                while True:
+                    while task is not None and task[0] < next_window + windows_ahead:
+                        window_idx, channel = task
+                        in_flight[executor.submit(_reduce_noise_window, input_audio_path, *windows[window_idx], channel, rate)] = task
+                        task = next(task_iter, None)
+                    if not in_flight:
+                        break
+                    done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        add_result(*in_flight.pop(future), future.result())
+                        completed += 1
+                        print(f"  Chunk {completed}/{len(tasks)} processed")
+
+        outfile.close()
+        outfile = None
         print(f"Chunked enhancement finished in {time.time() - start_time_enh:.2f} seconds.")
         if not os.path.exists(output_audio_path):
             raise RuntimeError("Enhanced file was not created after chunk processing.")
@@ -379,9 +787,11 @@ def enhance_instrumental_chunked(input_audio_path, output_audio_path, chunk_seco
         print("Warning: Enhancement failed. Continuing with the original instrumental track.")
         return input_audio_path # Return original on failure
     finally:
-        # Clean up the potentially large full array
-        if processed_data_full is not None:
-            del processed_data_full
+        if outfile is not None:
+            # Failed part-way - do not leave a truncated file behind
+            outfile.close()
+            if os.path.exists(output_audio_path):
+                os.remove(output_audio_path)
         gc.collect()
         print("Enhancement final cleanup performed.")
 
@@ -426,188 +836,801 @@ def get_line_height(font_obj):
     # Apply spacing multiplier
     return int(height * LINE_SPACING)
 
-def get_sentence_render_width(sentence_words, font_obj):
-    """Calculates the total rendered width of a sentence, including word spacing, with caching."""
-    if not font_obj or not sentence_words: return 0 # Basic fallback or empty sentence
-    # Create a tuple of words as part of the cache key
-    sentence_key = tuple(w['text'] for w in sentence_words)
-    cache_key = (sentence_key, font_obj.path, font_obj.size)
+def get_sentence_render_width(word_texts, font_obj):
+    """Calculates the total rendered width of a sentence (a tuple of word texts), including word spacing, with caching."""
+    if not font_obj or not word_texts: return 0 # Basic fallback or empty sentence
+    cache_key = (word_texts, font_obj.path, font_obj.size)
     if cache_key in sentence_width_cache:
         return sentence_width_cache[cache_key]
 
     width = 0
-    for i, word_info in enumerate(sentence_words):
-        word_width, _ = get_word_size(word_info['text'], font_obj) # Use cached size
+    for i, word_text in enumerate(word_texts):
+        word_width, _ = get_word_size(word_text, font_obj) # Use cached size
         width += word_width
-        if i < len(sentence_words) - 1:
+        if i < len(word_texts) - 1:
             width += WORD_SPACING # Add spacing between words
 
     sentence_width_cache[cache_key] = width
     return width
 
-# --- Karaoke Frame Generation ---
-# Global variable to hold sentences - avoids passing large data structures repeatedly
-_global_sentences_for_frame = []
-
-def make_karaoke_frame_sentence(t):
-    """Generates a single video frame at time 't' with word highlighting."""
-    global font # Access the globally loaded font
-
-    # Create a blank frame
-    frame_pil = Image.new('RGB', VIDEO_SIZE, BACKGROUND_COLOR_PIL)
-    draw = ImageDraw.Draw(frame_pil)
-
-    # If no sentences or font loaded, return blank frame
-    if not _global_sentences_for_frame or not font:
-        return np.array(frame_pil)
-
-    # --- Determine which sentences to display ---
-    # Find the index of the first sentence that hasn't finished yet
-    first_incomplete_idx = -1
-    for i, sentence in enumerate(_global_sentences_for_frame):
-        if t < sentence['end_time']:
-            first_incomplete_idx = i
-            break
-
-    # If all sentences are finished, show the last few
-    if first_incomplete_idx == -1:
-        first_incomplete_idx = max(0, len(_global_sentences_for_frame) - MAX_SENTENCES_ON_SCREEN)
-
-    # Determine the slice of sentences to render based on the current one
-    start_render_idx = first_incomplete_idx
-    end_render_idx = min(len(_global_sentences_for_frame), start_render_idx + MAX_SENTENCES_ON_SCREEN)
-    sentences_to_render = _global_sentences_for_frame[start_render_idx:end_render_idx]
+# --- Line Sprite Rendering ---
+# Each sentence line is rasterized once into a "normal" and a "highlighted" bitmap.
+# Frames are then assembled by NumPy slicing instead of per-frame FreeType calls.
+line_sprite_cache = OrderedDict()
 
-    if not sentences_to_render: return np.array(frame_pil) # Should not happen if logic is correct
+def _build_line_sprite(word_texts, font_obj, line_x):
+    """
+    Renders a sentence line into normal/highlighted sprites relative to its baseline.
+    Uses exactly the same draw/paste operations as the per-word renderer so frames stay pixel-identical.
+    """
+    # --- Word Layout and Vertical Extent of the Line ---
+    word_layout = [] # (x, width, ls_bbox) per word
+    current_x = line_x
+    band_top, band_bottom = 0, 1
+    for word_text in word_texts:
+        word_width, _ = get_word_size(word_text, font_obj)
+        try:
+            bbox_ls = font_obj.getbbox(word_text, anchor='ls')
+        except Exception:
+            bbox_ls = None
+        if bbox_ls:
+            band_top = min(band_top, bbox_ls[1])
+            band_bottom = max(band_bottom, bbox_ls[3])
+        word_layout.append((current_x, word_width, bbox_ls))
+        current_x += word_width + WORD_SPACING
+    try:
+        ascent, descent = font_obj.getmetrics()
+        band_top = min(band_top, -ascent)
+        band_bottom = max(band_bottom, descent)
+    except AttributeError:
+        pass
+
+    # Sprites span the full frame width so horizontal clipping matches drawing into the frame
+    band_height = band_bottom - band_top
+    baseline_y = -band_top
+    normal_img = Image.new('RGB', (VIDEO_SIZE[0], band_height), BACKGROUND_COLOR_PIL)
+    normal_draw = ImageDraw.Draw(normal_img)
+    highlight_img = Image.new('RGB', (VIDEO_SIZE[0], band_height), BACKGROUND_COLOR_PIL)
+    highlight_draw = ImageDraw.Draw(highlight_img)
+
+    word_rects = [] # (x, top, width, height, progressive) in sprite coordinates
+    for word_text, (word_x, word_width, bbox_ls) in zip(word_texts, word_layout):
+        normal_draw.text((word_x, baseline_y), word_text, font=font_obj, fill=TEXT_COLOR_NORMAL, anchor='ls')
+        highlight_draw.text((word_x, baseline_y), word_text, font=font_obj, fill=TEXT_COLOR_NORMAL, anchor='ls')
+
+        progressive = False
+        rect_top, rect_height = 0, band_height
+        if PROGRESSIVE_HIGHLIGHT:
+            try:
+                if bbox_ls is None:
+                    raise ValueError("bounding box unavailable")
+                word_visual_height = bbox_ls[3] - bbox_ls[1]
+                word_visual_top_offset = bbox_ls[1]
+                rect_top, rect_height = baseline_y + word_visual_top_offset, max(0, word_visual_height)
+                if word_width > 0 and word_visual_height > 0:
+                    # Same temporary RGBA image the progressive renderer pastes, drawn once at full width
+                    temp_img = Image.new('RGBA', (word_width, word_visual_height), (0, 0, 0, 0))
+                    temp_draw = ImageDraw.Draw(temp_img)
+                    temp_draw.text((0, -word_visual_top_offset), word_text, font=font_obj, fill=TEXT_COLOR_HIGHLIGHT, anchor='ls')
+                    highlight_img.paste(temp_img, (word_x, rect_top), temp_img)
+                    del temp_img, temp_draw
+                progressive = True
+            except Exception as e_render:
+                # Fallback: full highlight once the word has ended
+                print(f"Warning: Progressive render failed for '{word_text}'. {e_render}. Falling back.")
+                rect_top, rect_height = 0, band_height
+        if not progressive:
+            highlight_draw.text((word_x, baseline_y), word_text, font=font_obj, fill=TEXT_COLOR_HIGHLIGHT, anchor='ls')
+            # Whole-word highlight covers the full ink extent, which can reach past the advance width
+            ink_left, ink_right = (min(0, bbox_ls[0]), max(word_width, bbox_ls[2])) if bbox_ls else (0, word_width)
+            word_rects.append((word_x + ink_left, 0, ink_right - ink_left, band_height, False))
+        else:
+            word_rects.append((word_x, rect_top, word_width, rect_height, True))
 
-    # --- Calculate Layout ---
-    line_height = get_line_height(font)
-    total_render_height = len(sentences_to_render) * line_height
+    sprite = {
+        'normal': np.array(normal_img),
+        'highlight': np.array(highlight_img),
+        'top': band_top, # Offset from baseline to the first sprite row (negative)
+        'words': word_rects
+    }
+    del normal_draw, highlight_draw, normal_img, highlight_img
+    return sprite
+
+def get_line_sprite(word_texts, font_obj, line_x):
+    """Gets the cached normal/highlighted sprites for a sentence line (a tuple of word texts), rendering them on first use."""
+    cache_key = (word_texts, line_x, font_obj.path, font_obj.size)
+    sprite = line_sprite_cache.get(cache_key)
+    if sprite is not None:
+        line_sprite_cache.move_to_end(cache_key)
+        return sprite
+
+    sprite = _build_line_sprite(word_texts, font_obj, line_x)
+    line_sprite_cache[cache_key] = sprite
+    # Bound memory for long recordings - only the visible window is needed at any time
+    while len(line_sprite_cache) > LINE_SPRITE_CACHE_SIZE:
+        line_sprite_cache.popitem(last=False)
+    return sprite
+
+# --- Timeline Index ---
+def get_first_line_baseline(num_lines, font_obj):
+    """Calculates the baseline of the first line for a vertically centered block of 'num_lines' lines."""
+    line_height = get_line_height(font_obj)
+    total_render_height = num_lines * line_height
     # Center the block vertically, ensuring it stays within margins
     start_y_baseline = max(MARGIN_Y // 2, (VIDEO_SIZE[1] - total_render_height) // 2)
     # Adjust slightly so the first line's text top is roughly at the calculated start position
     try:
         rep_char = 'A' # Use a representative char for ascent calculation
-        bbox_rep = font.getbbox(rep_char, anchor='ls') # Baseline-left anchor
+        bbox_rep = font_obj.getbbox(rep_char, anchor='ls') # Baseline-left anchor
         text_top_offset_from_baseline = bbox_rep[1] # Usually negative (ascent)
         start_y_baseline -= text_top_offset_from_baseline # Shift baseline down so top aligns better
     except Exception:
-        start_y_baseline += int(font.size * 0.1) # Small estimated adjustment if bbox fails
+        start_y_baseline += int(font_obj.size * 0.1) # Small estimated adjustment if bbox fails
+    return start_y_baseline
 
+def get_line_x(word_texts, font_obj):
+    """Calculates the left x position of a sentence line (centered, or left-aligned if too wide)."""
+    sentence_width = get_sentence_render_width(word_texts, font_obj)
+    if sentence_width >= VIDEO_SIZE[0] - MARGIN_X:
+        return MARGIN_X // 2 # Align left with margin
+    return (VIDEO_SIZE[0] - sentence_width) // 2 # Center align
 
-    current_y_baseline = start_y_baseline
+def build_timeline_index(sentences, font_obj):
+    """
+    Precomputes everything the frame function needs that does not depend on 't':
+    sorted change points for the visible window and per-sentence/per-word layout.
+    'sentences' is a Transcript (or the JSON list of sentence dicts, converted here).
+    """
+    transcript = as_transcript(sentences)
+    # Running max of sentence end times - the first sentence with t < end_time is the
+    # first index where this non-decreasing sequence exceeds t, found by binary search
+    end_time_running_max = np.maximum.accumulate(transcript.sentence_end).tolist() if len(transcript) else []
+
+    lines = []
+    for sentence_idx in range(len(transcript)):
+        word_texts = transcript.sentence_texts(sentence_idx)
+        first_word, last_word = transcript.word_range(sentence_idx)
+        starts = transcript.word_start[first_word:last_word].tolist()
+        ends = transcript.word_end[first_word:last_word].tolist()
+        lines.append({
+            'texts': word_texts, # Also the sprite/width cache key, built once per line
+            'line_x': get_line_x(word_texts, font_obj),
+            'word_starts': starts,
+            'word_ends': ends,
+            # Word-level binary search is only valid when word times are ordered
+            'ordered': all(a <= b for a, b in zip(starts, starts[1:])) and all(a <= b for a, b in zip(ends, ends[1:]))
+        })
+
+    return {
+        'sentences': sentences,
+        'end_time_running_max': end_time_running_max,
+        'lines': lines,
+        'line_height': get_line_height(font_obj),
+        # First-line baseline for every possible number of visible lines
+        'first_baselines': [get_first_line_baseline(n, font_obj) for n in range(MAX_SENTENCES_ON_SCREEN + 1)]
+    }
 
-    # --- Render Each Sentence ---
-    for sentence in sentences_to_render:
-        sentence_width = get_sentence_render_width(sentence['words'], font)
-        # Center horizontally or align left if too wide
-        if sentence_width >= VIDEO_SIZE[0] - MARGIN_X:
-            current_x = MARGIN_X // 2 # Align left with margin
+def get_visible_window(index, t):
+    """Returns the (start, end) sentence index range shown at time 't'."""
+    num_sentences = len(index['lines'])
+    # Find the index of the first sentence that hasn't finished yet
+    first_incomplete_idx = bisect.bisect_right(index['end_time_running_max'], t)
+    # If all sentences are finished, show the last few
+    if first_incomplete_idx == num_sentences:
+        first_incomplete_idx = max(0, num_sentences - MAX_SENTENCES_ON_SCREEN)
+    return first_incomplete_idx, min(num_sentences, first_incomplete_idx + MAX_SENTENCES_ON_SCREEN)
+
+def get_highlight_progress(t, word_start, word_end):
+    """Returns the highlighted fraction (0.0-1.0) of a word at time 't'."""
+    if t >= word_end:
+        return 1.0
+    if PROGRESSIVE_HIGHLIGHT and t > word_start:
+        word_duration = word_end - word_start
+        if word_duration > 0.01: # Avoid division by zero/instability
+            return max(0.0, min(1.0, (t - word_start) / word_duration))
+    return 0.0 # Remains 0.0 until t >= word_end for very short words
+
+def get_active_word_range(line, t):
+    """
+    Returns (num_completed, num_started): words before 'num_completed' are fully highlighted,
+    words from 'num_completed' up to 'num_started' are in progress, the rest are not highlighted.
+    """
+    if line['ordered']:
+        num_completed = bisect.bisect_right(line['word_ends'], t)
+        num_started = max(num_completed, bisect.bisect_left(line['word_starts'], t))
+        return num_completed, num_started
+    # Unordered word times - everything may be in any state, check each word
+    return 0, len(line['texts'])
+
+def get_line_highlight_widths(line, sprite, t):
+    """Returns ((word_idx, highlight_width), ...) for every word of a line with visible highlight at time 't'."""
+    # Only words that have started can be highlighted; find them by binary search
+    num_completed, num_started = get_active_word_range(line, t)
+    highlight_widths = []
+    for word_idx in range(num_started):
+        _, _, word_width, _, progressive = sprite['words'][word_idx]
+        if word_idx < num_completed:
+            highlight_progress = 1.0
         else:
-            current_x = (VIDEO_SIZE[0] - sentence_width) // 2 # Center align
-
-        # --- Render Words in the Sentence ---
-        for word_info in sentence['words']:
-            word_text = word_info['text']
-            word_start = word_info['start']
-            word_end = word_info['end']
-            word_width, word_height = get_word_size(word_text, font) # Use cached size
-
-            # --- Determine Highlight State ---
-            is_fully_highlighted = t >= word_end
-            highlight_progress = 0.0
-            if PROGRESSIVE_HIGHLIGHT:
-                if is_fully_highlighted:
-                    highlight_progress = 1.0
-                elif t > word_start:
-                    word_duration = word_end - word_start
-                    if word_duration > 0.01: # Avoid division by zero/instability
-                        highlight_progress = max(0.0, min(1.0, (t - word_start) / word_duration))
-                    # else: highlight_progress remains 0.0 until t >= word_end
-
-            # --- Draw Word ---
-            try:
-                # Draw base word (normal color) - using baseline anchor ('ls' = left-baseline)
-                draw.text((current_x, current_y_baseline), word_text, font=font, fill=TEXT_COLOR_NORMAL, anchor='ls')
-
-                # Draw highlighted part (if any)
-                if PROGRESSIVE_HIGHLIGHT and highlight_progress > 0:
-                    highlight_width = int(word_width * highlight_progress)
-                    if highlight_width > 0:
-                        # Use bounding box to accurately determine position and height for pasting
-                        try:
-                             bbox = font.getbbox(word_text, anchor='ls') # Relative to (current_x, current_y_baseline)
-                             word_visual_height = bbox[3] - bbox[1]
-                             word_visual_top_offset = bbox[1] # Offset from baseline UP to visual top (negative)
-
-                             if word_width > 0 and word_visual_height > 0:
-                                # Create a temporary RGBA image for the highlighted text
-                                temp_img = Image.new('RGBA', (word_width, word_visual_height), (0, 0, 0, 0))
-                                temp_draw = ImageDraw.Draw(temp_img)
-                                # Draw highlighted text onto temp image, aligning baseline
-                                temp_draw.text((0, -word_visual_top_offset), word_text, font=font, fill=TEXT_COLOR_HIGHLIGHT, anchor='ls')
-
-                                # Crop the portion to highlight
-                                highlight_img = temp_img.crop((0, 0, highlight_width, word_visual_height))
-
-                                # Paste the cropped highlight onto the main frame
-                                paste_x = current_x
-                                paste_y = current_y_baseline + word_visual_top_offset # Calculate visual top edge
-                                frame_pil.paste(highlight_img, (paste_x, paste_y), highlight_img) # Use alpha mask
-
-                                # Explicitly delete temp PIL objects
-                                del temp_img, temp_draw, highlight_img
-
-                        except Exception as e_render:
-                           # Fallback: If complex progressive rendering fails, draw full highlight if needed
-                           print(f"Warning: Progressive render failed for '{word_text}'. {e_render}. Falling back.")
-                           if is_fully_highlighted: # Only draw full if time exceeds end
-                               draw.text((current_x, current_y_baseline), word_text, font=font, fill=TEXT_COLOR_HIGHLIGHT, anchor='ls')
-
-                elif not PROGRESSIVE_HIGHLIGHT and is_fully_highlighted:
-                    # Non-progressive: highlight whole word at once when t passes word_end
-                    draw.text((current_x, current_y_baseline), word_text, font=font, fill=TEXT_COLOR_HIGHLIGHT, anchor='ls')
-
-            except Exception as e_draw:
-                 print(f"Error drawing text '{word_text}' at ({current_x}, {current_y_baseline}): {e_draw}")
-
-            # Move x position for the next word
-            current_x += word_width + WORD_SPACING
-
-        # Move y position for the next line's baseline
-        current_y_baseline += line_height
+            highlight_progress = get_highlight_progress(t, line['word_starts'][word_idx], line['word_ends'][word_idx])
+
+        if progressive:
+            highlight_width = int(word_width * highlight_progress)
+        elif highlight_progress >= 1.0:
+            highlight_width = word_width
+        else:
+            highlight_width = 0
+        if highlight_width > 0:
+            highlight_widths.append((word_idx, highlight_width))
+    return tuple(highlight_widths)
+
+# --- Karaoke Frame Generation ---
+# Global variable to hold sentences - avoids passing large data structures repeatedly
+_global_sentences_for_frame = []
+_global_timeline_index = None
+# Last rendered frame and the visual state it shows, reused while the state is unchanged
+_last_frame_state = None
+_last_frame = None
+# Ring of FRAME_CANVAS_COUNT [canvas, frame_state] slots, updated in place in turn. Frames are handed out
+# as read-only views of a canvas, so the writer's queue can hold earlier frames while the next ones are drawn
+_frame_canvases = []
+_next_canvas = 0
+frame_render_stats = {'rendered': 0, 'reused': 0, 'redrawn': 0}
+# Per-frame render durations (seconds) while frame profiling is on; None leaves render loops untimed
+frame_timings = None
+
+def get_timeline_index():
+    """Returns the timeline index for the current sentences, (re)building it if they changed."""
+    global _global_timeline_index, _last_frame_state, _last_frame, _frame_canvases
+    if _global_timeline_index is None or _global_timeline_index['sentences'] is not _global_sentences_for_frame:
+        _global_timeline_index = build_timeline_index(_global_sentences_for_frame, load_font())
+        _last_frame_state = None
+        _last_frame = None
+        _frame_canvases = []
+    return _global_timeline_index
+
+def reset_frame_state():
+    """Forgets the last rendered frame and resets render statistics (call before each new video)."""
+    global _last_frame_state, _last_frame, _frame_canvases, _next_canvas
+    _last_frame_state = None
+    _last_frame = None
+    _frame_canvases = []
+    _next_canvas = 0
+    frame_render_stats['rendered'] = 0
+    frame_render_stats['reused'] = 0
+    frame_render_stats['redrawn'] = 0
+
+def _copy_highlights(canvas, sprite, sprite_y, highlight_widths, y0, y1, x0=0, x1=None):
+    """Copies the highlighted columns of each word of a line into canvas, clipped to rows [y0, y1) and columns [x0, x1) (default: the canvas width)."""
+    highlight = sprite['highlight']
+    if x1 is None:
+        x1 = canvas.shape[1]
+    for word_idx, highlight_width in highlight_widths:
+        word_x, rect_top, _, rect_height, _ = sprite['words'][word_idx]
+        rect_y0 = max(y0, sprite_y + rect_top)
+        rect_y1 = min(y1, sprite_y + rect_top + rect_height)
+        rect_x0 = max(x0, word_x)
+        rect_x1 = min(x1, word_x + highlight_width)
+        if rect_y1 > rect_y0 and rect_x1 > rect_x0:
+            canvas[rect_y0:rect_y1, rect_x0:rect_x1] = highlight[rect_y0 - sprite_y:rect_y1 - sprite_y, rect_x0:rect_x1]
+
+def _draw_frame(canvas, line_layout):
+    """Redraws the whole canvas: background, then each line's normal sprite and highlighted words."""
+    canvas[:] = BACKGROUND_COLOR_PIL
+    for sprite, sprite_y, band_y0, band_y1, _, highlight_widths in line_layout:
+        if band_y1 > band_y0:
+            canvas[band_y0:band_y1] = sprite['normal'][band_y0 - sprite_y:band_y1 - sprite_y]
+        _copy_highlights(canvas, sprite, sprite_y, highlight_widths, band_y0, band_y1)
+
+def _update_frame(canvas, line_layout, previous_widths):
+    """
+    Updates a canvas showing the same lines with 'previous_widths' highlighted: only the rectangles of words
+    whose highlight width changed are restored from the normal sprite and re-highlighted, giving the same
+    pixels as _draw_frame.
+    """
+    for (sprite, sprite_y, band_y0, band_y1, visible_y1, highlight_widths), old_widths in zip(line_layout, previous_widths):
+        if highlight_widths == old_widths:
+            continue
+        old_by_word = dict(old_widths)
+        new_by_word = dict(highlight_widths)
+        for word_idx in old_by_word.keys() | new_by_word.keys():
+            old_width = old_by_word.get(word_idx, 0)
+            new_width = new_by_word.get(word_idx, 0)
+            if old_width == new_width:
+                continue
+            word_x, rect_top, _, rect_height, _ = sprite['words'][word_idx]
+            # Rows of this line that later lines do not paint over
+            y0 = max(band_y0, sprite_y + rect_top)
+            y1 = min(visible_y1, sprite_y + rect_top + rect_height)
+            x0 = max(0, word_x)
+            x1 = min(VIDEO_SIZE[0], word_x + max(old_width, new_width))
+            if y1 <= y0 or x1 <= x0:
+                continue
+            canvas[y0:y1, x0:x1] = sprite['normal'][y0 - sprite_y:y1 - sprite_y, x0:x1]
+            # Re-apply every highlight overlapping the region, in drawing order
+            _copy_highlights(canvas, sprite, sprite_y, highlight_widths, y0, y1, x0, x1)
+
+def make_karaoke_frame_sentence(t):
+    """
+    Generates a single video frame at time 't' with word highlighting.
+    Returned frames are read-only and stay valid until FRAME_CANVAS_COUNT more frames are rendered (copy them
+    to keep them longer); an unchanged frame is returned again as the same array.
+    """
+    global font, _last_frame_state, _last_frame, _next_canvas # Access the globally loaded font
+    if not _font_loaded:
+        load_font()
 
+    # If no sentences or font loaded, return blank frame
+    if not _global_sentences_for_frame or not font:
+        frame_state = ()
+        lines_to_render = []
+    else:
+        # --- Determine which sentences to display ---
+        index = get_timeline_index()
+        start_render_idx, end_render_idx = get_visible_window(index, t)
+        lines_to_render = index['lines'][start_render_idx:end_render_idx]
+
+        # --- Resolve Highlight State ---
+        line_states = []
+        for line in lines_to_render:
+            sprite = get_line_sprite(line['texts'], font, line['line_x'])
+            line_states.append((sprite, get_line_highlight_widths(line, sprite, t)))
+        frame_state = (start_render_idx, end_render_idx, tuple(widths for _, widths in line_states))
+
+    # --- Reuse the Previous Frame if Nothing Visible Changed ---
+    if DEDUPLICATE_FRAMES and _last_frame is not None and frame_state == _last_frame_state:
+        frame_render_stats['reused'] += 1
+        return _last_frame
+
+    # --- Layout: Each Line's Sprite Position and Rows in the Frame ---
+    line_layout = [] # (sprite, sprite_y, band_y0, band_y1, visible_y1, highlight_widths) per line
+    if lines_to_render:
+        line_height = index['line_height']
+        current_y_baseline = index['first_baselines'][len(lines_to_render)]
+        for sprite, highlight_widths in line_states:
+            sprite_y = current_y_baseline + sprite['top'] # Frame row of the first sprite row
+            band_y0 = max(0, sprite_y)
+            band_y1 = min(VIDEO_SIZE[1], sprite_y + sprite['normal'].shape[0])
+            line_layout.append([sprite, sprite_y, band_y0, band_y1, band_y1, highlight_widths])
+            # Move y position for the next line's baseline
+            current_y_baseline += line_height
+        # Later lines are drawn over earlier ones, so an earlier line only owns the rows above them
+        visible_limit = VIDEO_SIZE[1]
+        for layout in reversed(line_layout):
+            layout[4] = min(layout[3], visible_limit)
+            visible_limit = min(visible_limit, layout[2])
+
+    # --- Draw into the Next Canvas: Dirty Word Rectangles if It Shows the Same Lines, Else the Whole Frame ---
+    if not _frame_canvases:
+        _frame_canvases.extend([None, None] for _ in range(FRAME_CANVAS_COUNT))
+    previous_slot = _frame_canvases[_next_canvas - 1]
+    slot = _frame_canvases[_next_canvas]
+    _next_canvas = (_next_canvas + 1) % FRAME_CANVAS_COUNT
+    canvas, canvas_state = slot
+    if canvas is None:
+        canvas = np.empty((VIDEO_SIZE[1], VIDEO_SIZE[0], 3), dtype=np.uint8)
+    if INCREMENTAL_FRAME_UPDATES and frame_state and canvas_state and frame_state[:2] == canvas_state[:2]:
+        _update_frame(canvas, line_layout, canvas_state[2])
+    elif (INCREMENTAL_FRAME_UPDATES and frame_state and previous_slot[1] and previous_slot is not slot
+            and frame_state[:2] == previous_slot[1][:2]):
+        # The lines changed since this canvas was drawn, but not since the latest frame - start from that one
+        np.copyto(canvas, previous_slot[0])
+        _update_frame(canvas, line_layout, previous_slot[1][2])
+    else:
+        _draw_frame(canvas, line_layout)
+        frame_render_stats['redrawn'] += 1
+    slot[:] = [canvas, frame_state]
+    frame_np = canvas.view()
+    frame_np.flags.writeable = False # Later frames are drawn into this canvas again
+
+    frame_render_stats['rendered'] += 1
+    _last_frame_state = frame_state
+    _last_frame = frame_np
     # Return frame as numpy array for MoviePy
-    frame_np = np.array(frame_pil)
-    # Clean up frame-specific PIL objects
-    del draw
-    del frame_pil
-    # gc.collect() # Optional: Force GC per frame if memory is extremely tight, but likely slows down rendering significantly
     return frame_np
 
+def get_frame_function():
+    """
+    Returns the frame function for a render loop: make_karaoke_frame_sentence itself, or a wrapper that
+    records each call's duration in frame_timings while frame profiling is on.
+    """
+    if frame_timings is None:
+        return make_karaoke_frame_sentence
+    timings = frame_timings
+    def timed_frame_function(t):
+        start = time.perf_counter()
+        frame = make_karaoke_frame_sentence(t)
+        timings.append(time.perf_counter() - start)
+        return frame
+    return timed_frame_function
+
+
+# --- Encoding Profiles ---
+def select_encoding_profile(words_per_second, duration):
+    """
+    Picks an ENCODING_PROFILES entry from the transcript's word density and the video duration: dense lyrics
+    change more of the frame and gain most from small-share's slower preset and higher CRF, unless the video
+    is long enough that its encode time matters more; sparse lyrics encode small anyway and get fast-archive.
+    The profile's keyint_seconds applies to single-pass and parallel (render_workers) renders; cached-segment
+    renders (cache_segments) always put keyframes every SEGMENT_GOP_FRAMES, so small-share's 30 s interval
+    becomes 10 s there and its files grow accordingly.
+    """
+    if words_per_second >= ENCODING_SHARE_MIN_WORDS_PER_SECOND and duration <= ENCODING_SHARE_MAX_SECONDS:
+        return 'small-share'
+    return 'fast-archive'
 
-# --- Video Creation Function ---
-def create_karaoke_video_from_json(audio_track_path, transcription_json_path, output_path):
-    """Creates the karaoke video using audio and the pre-processed transcription JSON."""
-    print(f"\n--- Creating Sentence Karaoke Video ---")
-    print(f"Using audio: {audio_track_path}")
-    print(f"Loading transcription from: {transcription_json_path}")
-    print(f"Output video: {output_path}")
-    start_time = time.time()
+def resolve_encoding_profile(encoding_profile, duration, num_words=None):
+    """
+    Returns the profile name a render uses: encoding_profile itself, or for 'auto' the one selected for
+    num_words words (default: the loaded transcript's) in 'duration' seconds.
+    """
+    if encoding_profile != 'auto':
+        if encoding_profile is not None and encoding_profile not in ENCODING_PROFILES:
+            raise ValueError(f"Unknown encoding profile '{encoding_profile}' (expected 'auto', None or one of {', '.join(ENCODING_PROFILES)})")
+        return encoding_profile
+    if num_words is None:
+        num_words = _global_sentences_for_frame.num_words if _global_sentences_for_frame else 0
+    return select_encoding_profile(num_words / duration if duration else 0.0, duration)
+
+def get_encoding_settings(profile_name, fps=FPS):
+    """
+    Returns (preset, ffmpeg_params, keyint_frames) of an encoding profile; None gives the plain
+    VIDEO_OUTPUT_PRESET encode with x264's own keyframe interval (keyint_frames None). keyint_frames is
+    left out of ffmpeg_params because cached-segment renders replace it with SEGMENT_GOP_FRAMES.
+    """
+    if profile_name is None:
+        return VIDEO_OUTPUT_PRESET, [], None
+    profile = ENCODING_PROFILES[profile_name]
+    params = ["-crf", str(profile['crf'])]
+    if profile.get('tune'):
+        params = ["-tune", profile['tune']] + params
+    return profile['preset'], params, int(round(profile['keyint_seconds'] * fps))
+
+
+# --- Direct FFmpeg Pipe Writing ---
+def get_vfr_params(num_frames, fps=FPS):
+    """
+    Returns the ffmpeg options that drop duplicate frames from a stream of 'num_frames' frames (variable frame rate).
+    mpdecimate also drops the unchanged frames at the very end, which would end the video stream early (and shift
+    every later segment when joining), so a copy of the last frame is put back at the last frame's time.
+    """
+    # Drop only exact duplicates (hi/lo/frac=0), keeping at least one frame every few seconds
+    max_dropped = int(fps * VFR_MAX_STATIC_SECONDS)
+    decimate = f"mpdecimate=hi=0:lo=0:frac=0:max={max_dropped}"
+    # The clone lands on the input's end time and is moved back one frame; if the last frame was kept, it is dropped as a duplicate timestamp
+    keep_end = f"tpad=stop=1:stop_mode=clone,setpts='min(PTS,{num_frames - 1}/({fps}*TB))'"
+    return ["-vf", f"{decimate},{keep_end}", "-fps_mode", "vfr"]
+
+def write_frames_ffmpeg_pipe(output_path, start_frame, end_frame, threads, ffmpeg_params, audio_path=None, fps=FPS, preset=VIDEO_OUTPUT_PRESET,
+                             report_progress=False, variable_frame_rate=False):
+    """
+    Renders frames [start_frame, end_frame) at 'fps' straight into an ffmpeg subprocess, optionally muxing audio
+    (and dropping duplicate frames with variable_frame_rate).
+    """
+    total_frames = end_frame - start_frame
+    if variable_frame_rate:
+        ffmpeg_params = ffmpeg_params + get_vfr_params(total_frames, fps)
+    progress_step = max(1, total_frames // 10)
+    with FFmpegPipeWriter(output_path, VIDEO_SIZE, fps,
+                          ffmpeg_binary=get_ffmpeg_binary(),
+                          pixel_format=PIPE_PIXEL_FORMAT,
+                          codec='libx264',
+                          preset=preset,
+                          threads=threads,
+                          ffmpeg_params=ffmpeg_params,
+                          audio_path=audio_path,
+                          queue_size=PIPE_QUEUE_SIZE) as writer:
+        frame_function = get_frame_function()
+        for frame_index in range(start_frame, end_frame):
+            # Same time computation as MoviePy's iter_frames so output matches the MoviePy backend
+            writer.write_frame(frame_function(frame_index / fps))
+            written = frame_index - start_frame + 1
+            if report_progress and (written % progress_step == 0 or written == total_frames):
+                print(f"  Wrote {written}/{total_frames} frames ({100 * written // total_frames}%)")
+
+
+# --- Parallel Segmented Rendering ---
+def _init_segment_worker(sentences):
+    """Process pool initializer: installs the sentences and timeline index once per worker."""
+    global _global_sentences_for_frame, _global_timeline_index
+    _global_sentences_for_frame = sentences
+    load_font()
+    _global_timeline_index = build_timeline_index(sentences, font) if (sentences and font) else None
+    reset_frame_state()
+
+def _render_video_segment(segment_path, start_frame, end_frame, threads, ffmpeg_params, writer_backend, profile_frames=False,
+                          preset=VIDEO_OUTPUT_PRESET, variable_frame_rate=False):
+    """
+    Renders and encodes frames [start_frame, end_frame) into a video-only segment file. Returns the
+    segment's frame stats, plus its per-frame 'timings' with profile_frames.
+    """
+    global frame_timings
+    reset_frame_state()
+    frame_timings = [] if profile_frames else None
+    if writer_backend == 'ffmpeg':
+        write_frames_ffmpeg_pipe(segment_path, start_frame, end_frame, threads, ffmpeg_params, preset=preset,
+                                 variable_frame_rate=variable_frame_rate)
+    else:
+        from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+        if variable_frame_rate:
+            ffmpeg_params = ffmpeg_params + get_vfr_params(end_frame - start_frame)
+        with FFMPEG_VideoWriter(segment_path, VIDEO_SIZE, FPS,
+                                codec='libx264',
+                                preset=preset,
+                                threads=threads,
+                                ffmpeg_params=ffmpeg_params) as writer:
+            frame_function = get_frame_function()
+            for frame_index in range(start_frame, end_frame):
+                # Same time computation as MoviePy's iter_frames so segments match a single-pass render
+                writer.write_frame(frame_function(frame_index / FPS))
+    stats = dict(frame_render_stats)
+    if profile_frames:
+        stats['timings'] = frame_timings
+        frame_timings = None
+    return stats
+
+def split_into_segments(total_frames, num_segments, gop_frames=SEGMENT_GOP_FRAMES):
+    """Splits [0, total_frames) into up to 'num_segments' ranges whose boundaries fall on keyframe (GOP) boundaries."""
+    frames_per_segment = max(1, math.ceil(total_frames / num_segments))
+    frames_per_segment = math.ceil(frames_per_segment / gop_frames) * gop_frames
+    return [(start, min(start + frames_per_segment, total_frames)) for start in range(0, total_frames, frames_per_segment)]
+
+def _run_ffmpeg(command, description):
+    """Runs an ffmpeg command, printing its stderr and raising RuntimeError if it fails."""
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    except subprocess.CalledProcessError as e:
+        print(f"Error {description} (Return Code: {e.returncode}):")
+        print(f"Stderr:\n{e.stderr}")
+        raise RuntimeError(f"ffmpeg failed while {description}.") from e
+
+def concat_segments(segment_paths, output_path, durations=None):
+    """
+    Joins video segments with ffmpeg's concat demuxer (no re-encode). 'durations' gives each segment's
+    length in seconds; without it each segment starts where the previous file's container duration ends,
+    which variable-frame-rate segments (with dropped frames and B-frames) report too short.
+    """
+    list_path = os.path.join(os.path.dirname(segment_paths[0]), "segments.txt")
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for i, segment_path in enumerate(segment_paths):
+            escaped_path = os.path.abspath(segment_path).replace("'", "'\\''")
+            f.write(f"file '{escaped_path}'\n")
+            if durations:
+                f.write(f"duration {durations[i]!r}\n")
+
+    command = [
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-map", "0:v:0", "-c:v", "copy",
+        output_path
+    ]
+    _run_ffmpeg(command, "joining segments")
+
+def _render_segments(segment_paths, segments, num_workers, ffmpeg_params, writer_backend, preset=VIDEO_OUTPUT_PRESET,
+                     variable_frame_rate=False):
+    """
+    Renders video-only segment files for (start_frame, end_frame) ranges: in worker processes when
+    num_workers > 1, else in this process. Adds their frame stats to frame_render_stats (and their
+    per-frame timings to frame_timings while frame profiling is on).
+    """
+    global frame_timings
+    num_workers = max(1, min(num_workers, len(segments)))
+    # Share the encoder threads between the worker processes
+    threads = max(1, int(os.cpu_count() * VIDEO_THREADS_RATIO) // num_workers)
+    collected_timings = frame_timings
+    stats_before = dict(frame_render_stats)
+    totals = {'rendered': 0, 'reused': 0, 'redrawn': 0}
+    def add_stats(worker_stats):
+        for name in totals:
+            totals[name] += worker_stats[name]
+        if collected_timings is not None:
+            collected_timings.extend(worker_stats['timings'])
+
+    if num_workers == 1:
+        for i, (segment_path, (start, end)) in enumerate(zip(segment_paths, segments), 1):
+            add_stats(_render_video_segment(segment_path, start, end, threads, ffmpeg_params, writer_backend, collected_timings is not None,
+                                            preset, variable_frame_rate))
+            print(f"  Segment {i}/{len(segments)} done")
+    else:
+        # Spawn keeps workers independent of bridge threads and behaves the same on every platform
+        mp_context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context,
+                                                    initializer=_init_segment_worker,
+                                                    initargs=(_global_sentences_for_frame,)) as executor:
+            futures = {
+                executor.submit(_render_video_segment, segment_path, start, end, threads, ffmpeg_params, writer_backend,
+                                collected_timings is not None, preset, variable_frame_rate): i
+                for i, (segment_path, (start, end)) in enumerate(zip(segment_paths, segments))
+            }
+            for completed, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                add_stats(future.result())
+                print(f"  Segment {futures[future] + 1}/{len(segments)} done ({completed}/{len(segments)} complete)")
+
+    # Rendering in this process resets the renderer's stats and timings per segment
+    frame_timings = collected_timings
+    for name, count in totals.items():
+        frame_render_stats[name] = stats_before[name] + count
+
+def render_video_segments_parallel(duration, output_path, num_workers, ffmpeg_params, writer_backend=VIDEO_WRITER_BACKEND,
+                                   preset=VIDEO_OUTPUT_PRESET, variable_frame_rate=False, gop_frames=SEGMENT_GOP_FRAMES):
+    """
+    Renders the video (without audio) in keyframe-aligned time segments, each encoded by its own worker
+    process, then joins them without re-encoding. Keyframes are every gop_frames frames (the encoding
+    profile's interval), and segment boundaries fall on them. While frame profiling is on, the workers'
+    per-frame timings are collected into frame_timings.
+    """
+    total_frames = int(duration * FPS)
+    segments = split_into_segments(total_frames, num_workers, gop_frames)
+    num_workers = min(num_workers, len(segments))
+    # Keyframes on the same global grid as the segment boundaries
+    segment_params = ffmpeg_params + ["-g", str(gop_frames)]
+    print(f"Rendering {total_frames} frames in {len(segments)} segments on {num_workers} worker processes...")
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(prefix=".segments_", dir=output_dir) as segment_dir:
+        segment_paths = [os.path.join(segment_dir, f"segment_{i:04d}.mp4") for i in range(len(segments))]
+        _render_segments(segment_paths, segments, num_workers, segment_params, writer_backend, preset, variable_frame_rate)
+        print("Joining segments...")
+        concat_segments(segment_paths, output_path, [(end - start) / FPS for start, end in segments])
+
+
+# --- Cached Segment Rendering ---
+def get_render_config(ffmpeg_params, writer_backend, preset=VIDEO_OUTPUT_PRESET, variable_frame_rate=False):
+    """Returns everything besides the transcript that determines the encoded frames, for segment cache keys."""
+    return {
+        'version': SEGMENT_CACHE_VERSION,
+        'video_size': VIDEO_SIZE, 'fps': FPS, 'gop_frames': SEGMENT_GOP_FRAMES,
+        'font': [font.path, font.size] if font else None,
+        'colors': [BACKGROUND_COLOR_PIL, TEXT_COLOR_NORMAL, TEXT_COLOR_HIGHLIGHT],
+        'layout': [LINE_SPACING, WORD_SPACING, MARGIN_X, MARGIN_Y, MAX_SENTENCES_ON_SCREEN, PROGRESSIVE_HIGHLIGHT],
+        'encoder': [preset, PIPE_PIXEL_FORMAT, writer_backend, list(ffmpeg_params), variable_frame_rate]
+    }
 
-    global _global_sentences_for_frame, word_size_cache, sentence_width_cache, font
+def segment_cache_key(index, start_frame, end_frame, render_config):
+    """
+    Returns the cache key of frames [start_frame, end_frame): the render config plus what those frames
+    can show - the times inside the segment at which the visible sentence window changes, and the text
+    and word timings of every sentence in each window. Edits elsewhere in the transcript leave it unchanged.
+    """
+    windows = []
+    if index is not None and index['lines']:
+        first_time, last_time = start_frame / FPS, (end_frame - 1) / FPS
+        running_max = index['end_time_running_max']
+        # The window moves on when t passes a sentence end time (running max), see get_visible_window
+        switch_times = sorted(set(running_max[bisect.bisect_right(running_max, first_time):bisect.bisect_right(running_max, last_time)]))
+        for switch_time in [first_time] + switch_times:
+            window_start, window_end = get_visible_window(index, switch_time)
+            lines = [(line['texts'], line['word_starts'], line['word_ends']) for line in index['lines'][window_start:window_end]]
+            windows.append((switch_time if switch_time != first_time else None, lines))
+    return cache_key('segment', start_frame, end_frame, windows=windows, **render_config)
+
+def get_segment_plan(duration, ffmpeg_params, writer_backend=VIDEO_WRITER_BACKEND, preset=VIDEO_OUTPUT_PRESET, variable_frame_rate=False):
+    """
+    Returns (segments, segment_params, keys) of a cached-segment render: fixed SEGMENT_GOP_FRAMES-long frame
+    ranges, the encoder options with keyframes on the segment grid, and each segment's cache key.
+    """
+    total_frames = int(duration * FPS)
+    segments = [(start, min(start + SEGMENT_GOP_FRAMES, total_frames)) for start in range(0, total_frames, SEGMENT_GOP_FRAMES)]
+    segment_params = ffmpeg_params + ["-g", str(SEGMENT_GOP_FRAMES)]
+    render_config = get_render_config(segment_params, writer_backend, preset, variable_frame_rate)
+    keys = [segment_cache_key(_global_timeline_index, start, end, render_config) for start, end in segments]
+    return segments, segment_params, keys
+
+def render_video_segments_cached(duration, output_path, stage_cache, num_workers, ffmpeg_params, writer_backend=VIDEO_WRITER_BACKEND,
+                                 preset=VIDEO_OUTPUT_PRESET, variable_frame_rate=False):
+    """
+    Renders the video as fixed SEGMENT_GOP_FRAMES-long, keyframe-aligned segments, each stored in the stage
+    cache under a key of the sentences it shows and the render config. Segments already in the cache (e.g.
+    all but the ones around a corrected word) are restored instead of rendered; the rest are rendered
+    (in parallel with num_workers > 1). The segments are then joined without re-encoding into a video-only file.
+    Returns (number of segments, number restored from the cache).
+    """
+    segments, segment_params, keys = get_segment_plan(duration, ffmpeg_params, writer_backend, preset, variable_frame_rate)
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(prefix=".segments_", dir=output_dir) as segment_dir:
+        segment_paths = [os.path.join(segment_dir, f"segment_{i:04d}.mp4") for i in range(len(segments))]
+        missing = [i for i, (key, segment_path) in enumerate(zip(keys, segment_paths))
+                   if not stage_cache.restore('segment', key, {'segment.mp4': segment_path})]
+        print(f"Rendering {len(missing)} of {len(segments)} segments ({len(segments) - len(missing)} unchanged segments reused)...")
+        if missing:
+            _render_segments([segment_paths[i] for i in missing], [segments[i] for i in missing], num_workers, segment_params,
+                             writer_backend, preset, variable_frame_rate)
+            for i in missing:
+                stage_cache.store('segment', keys[i], {'segment.mp4': segment_paths[i]}, evict=False)
+            stage_cache.evict() # Once for the whole render, not per segment
+        print("Joining segments...")
+        concat_segments(segment_paths, output_path, [(end - start) / FPS for start, end in segments])
+    return len(segments), len(segments) - len(missing)
+
+def has_cached_segments(duration, stage_cache, ffmpeg_params, writer_backend=VIDEO_WRITER_BACKEND, preset=VIDEO_OUTPUT_PRESET,
+                        variable_frame_rate=False):
+    """Returns True if the stage cache holds any segment of this render, i.e. an earlier render of the song cached its segments."""
+    _, _, keys = get_segment_plan(duration, ffmpeg_params, writer_backend, preset, variable_frame_rate)
+    return any(stage_cache.contains('segment', key) for key in keys)
+
+
+# --- Audio Encoding and Muxing ---
+def audio_cache_key(audio_track_path, bitrate=AUDIO_BITRATE):
+    """Key of an instrumental's AAC encode: the audio file's content and the AAC settings (not the video settings)."""
+    return cache_key('audio', file_digest(audio_track_path), codec='aac', bitrate=bitrate)
+
+def encode_audio_aac(audio_track_path, output_path, bitrate=AUDIO_BITRATE):
+    """Encodes an audio file to AAC in an .m4a file."""
+    _run_ffmpeg([
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-i", audio_track_path,
+        "-map", "0:a:0", "-vn", "-c:a", "aac", "-b:a", bitrate,
+        output_path
+    ], "encoding audio")
+
+def encode_audio_cached(audio_track_path, output_path, stage_cache=None):
+    """
+    encode_audio_aac() through the stage cache, so each instrumental is encoded once and later renders
+    (at any video settings) reuse it. Returns True if the encode was restored from the cache.
+    """
+    key = audio_cache_key(audio_track_path) if stage_cache else None
+    if stage_cache and stage_cache.restore('audio', key, {'audio.m4a': output_path}):
+        return True
+    encode_audio_aac(audio_track_path, output_path)
+    if stage_cache:
+        stage_cache.store('audio', key, {'audio.m4a': output_path})
+    return False
+
+def start_audio_encode(audio_track_path, output_path, stage_cache=None):
+    """
+    Starts encode_audio_cached() in a background thread, so the AAC encode runs alongside frame rendering
+    (ffmpeg does the work, outside the GIL). Returns a concurrent.futures.Future of its result.
+    """
+    # Import MoviePy's config here: importing it on the encode thread races the renderer's MoviePy imports
+    get_ffmpeg_binary()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-encode")
+    future = executor.submit(encode_audio_cached, audio_track_path, output_path, stage_cache)
+    executor.shutdown(wait=False) # The worker thread exits after the encode
+    return future
+
+def mux_video_audio(video_path, audio_path, output_path, subtitle_path=None, font_path=None):
+    """
+    Combines a video-only file and an encoded audio file into output_path without re-encoding either,
+    optionally adding a subtitle track (and attaching the font it uses, for Matroska outputs).
+    """
+    command = [get_ffmpeg_binary(), "-y", "-loglevel", "error", "-i", video_path, "-i", audio_path]
+    if subtitle_path:
+        command += ["-i", subtitle_path]
+    command += ["-map", "0:v:0", "-map", "1:a:0"]
+    if subtitle_path:
+        command += ["-map", "2:s:0", "-disposition:s:0", "default"]
+    if font_path:
+        command += ["-attach", font_path, "-metadata:s:t", "mimetype=application/x-truetype-font"]
+    _run_ffmpeg(command + ["-c", "copy", output_path], "muxing audio")
+
+
+# --- Video Creation Function ---
+# Frame counts of the last video (frames, frames_rendered, frames_reused, ...), kept after its cleanup
+render_stats = {}
+# Frame counts and timing of the last preview (frames, video_seconds, size, fps, seconds)
+preview_stats = {}
+# Held while the frame renderer's module-level state belongs to a render (including a full render
+# continuing in the background after its preview), so renders never overlap
+_render_lock = threading.Lock()
+
+def _load_render_state(transcription_json_path):
+    """Loads the transcript into the frame renderer and prepares its text sizes and timeline index."""
+    global _global_sentences_for_frame, _global_timeline_index, word_size_cache, sentence_width_cache, font
     word_size_cache = {} # Reset caches for new video
     sentence_width_cache = {}
+    line_sprite_cache.clear()
     _global_sentences_for_frame = [] # Clear previous sentences
+    _global_timeline_index = None
+    reset_frame_state()
+    load_font()
 
-    # --- Load Sentences from JSON ---
+    # --- Load Sentences (binary transcript if up to date, else JSON) ---
     try:
-        with open(transcription_json_path, 'r', encoding='utf-8') as f:
-            loaded_sentences = json.load(f)
-        if not isinstance(loaded_sentences, list):
-             raise ValueError("Transcription JSON root must be a list of sentence objects.")
-        _global_sentences_for_frame = loaded_sentences # Set the global variable for make_karaoke_frame_sentence
-        print(f"Loaded {len(_global_sentences_for_frame)} sentences from JSON.")
+        transcript = load_transcript(transcription_json_path)
+        _global_sentences_for_frame = transcript # Set the global variable for make_karaoke_frame_sentence
+        source = "memory-mapped transcript" if transcript.path else "JSON"
+        print(f"Loaded {len(transcript)} sentences ({transcript.num_words} words, {len(transcript.strings)} unique) from {source}.")
         if not _global_sentences_for_frame:
             print("Warning: Transcription file contained no sentences. Video will have audio but no text.")
             # Decide whether to stop or create an empty video
@@ -623,53 +1646,139 @@ def create_karaoke_video_from_json(audio_track_path, transcription_json_path, ou
         print(f"Error loading or processing transcription JSON: {e}")
         raise
 
+    # Pre-calculate text rendering sizes if font is available
+    if font and _global_sentences_for_frame:
+        print("Pre-calculating text rendering sizes (this may take a moment)...")
+        # The transcript's string table holds each unique word once
+        for text in _global_sentences_for_frame.strings: get_word_size(text, font)
+        print(f"Calculated sizes for {len(_global_sentences_for_frame.strings)} unique words.")
+        # Sentence widths are calculated while building the index (for each line's x position)
+        _global_timeline_index = build_timeline_index(_global_sentences_for_frame, font)
+        print(f"Built timeline index for {len(_global_timeline_index['lines'])} sentences.")
+    elif not font:
+        print("Skipping text size pre-calculation as font failed to load.")
+
+def _clear_render_state():
+    """Releases the frame renderer's transcript, index and caches after a render."""
+    global _global_sentences_for_frame, _global_timeline_index, word_size_cache, sentence_width_cache, frame_timings
+    if hasattr(_global_sentences_for_frame, 'close'):
+        _global_sentences_for_frame.close() # Unmap the binary transcript so it can be rewritten
+    _global_sentences_for_frame = []
+    _global_timeline_index = None
+    word_size_cache = {}
+    sentence_width_cache = {}
+    line_sprite_cache.clear()
+    reset_frame_state()
+    frame_timings = None
+    gc.collect() # Final garbage collect for this stage
+
+def get_video_duration(audio_duration):
+    """Returns the video duration for the loaded transcript: the audio duration, extended past the last word if needed."""
+    if _global_sentences_for_frame:
+        last_word_end_time = float(_global_sentences_for_frame.sentence_end[-1])
+        # Add a small buffer (e.g., 1.5 seconds) after the last word ends
+        return max(audio_duration, last_word_end_time + 1.5)
+    return audio_duration
+
+def get_audio_track_duration(audio_track_path):
+    """Returns an audio file's duration: from soundfile, or MoviePy's ffmpeg reader for formats soundfile cannot read (e.g. AAC)."""
+    duration = get_audio_duration(audio_track_path)
+    if duration is None:
+        from moviepy.audio.io.AudioFileClip import AudioFileClip
+        audio = AudioFileClip(audio_track_path)
+        duration = audio.duration
+        audio.close()
+    return duration
+
+def _render_loaded_video(audio_track_path, output_path, variable_frame_rate, render_workers, writer_backend, profile_frames, stage_cache=None,
+                         encoding_profile=ENCODING_PROFILE, cache_segments=SEGMENT_CACHE):
+    """Renders and encodes the full-quality video from the loaded render state (see create_karaoke_video_from_json)."""
+    global frame_timings
+    start_time = time.time()
+    reset_frame_state()
+    render_stats.clear()
+    frame_timings = [] if profile_frames else None
+
     # --- Prepare Video Generation ---
-    audio = None
     video_clip = None
+    audio_future = None
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    work_dir = tempfile.mkdtemp(prefix=".render_", dir=output_dir)
     try:
-        print("Loading audio...")
-        audio = AudioFileClip(audio_track_path)
+        print("Reading audio duration...")
         # Determine duration: use audio duration or extend slightly past the last word
-        duration = audio.duration
-        if _global_sentences_for_frame:
-             last_word_end_time = _global_sentences_for_frame[-1]['end_time']
-             # Add a small buffer (e.g., 1.5 seconds) after the last word ends
-             duration = max(audio.duration, last_word_end_time + 1.5)
-
-        print(f"Audio loaded. Effective Video Duration: {duration:.2f} seconds.")
-
-        # Pre-calculate text rendering sizes if font is available
-        if font and _global_sentences_for_frame:
-            print("Pre-calculating text rendering sizes (this may take a moment)...")
-            unique_words = set(w['text'] for s in _global_sentences_for_frame for w in s['words'])
-            for text in unique_words: get_word_size(text, font)
-            print(f"Calculated sizes for {len(unique_words)} unique words.")
-            # Pre-calculate full sentence widths as well
-            for sentence in _global_sentences_for_frame: get_sentence_render_width(sentence['words'], font)
-            print(f"Calculated widths for {len(_global_sentences_for_frame)} sentences.")
-        elif not font:
-            print("Skipping text size pre-calculation as font failed to load.")
-
-        # --- Generate Video ---
+        duration = get_video_duration(get_audio_track_duration(audio_track_path))
+        print(f"Effective Video Duration: {duration:.2f} seconds.")
+
+        # --- Encode Audio (in the background, once per instrumental with a stage cache) ---
+        encoded_audio_path = os.path.join(work_dir, "audio.m4a")
+        audio_future = start_audio_encode(audio_track_path, encoded_audio_path, stage_cache)
+
+        # --- Generate Video (without audio) ---
         print("Generating video frames dynamically...")
+        video_path = os.path.join(work_dir, "video.mp4")
         # Calculate number of threads based on CPU cores and ratio
         num_threads = max(1, int(os.cpu_count() * VIDEO_THREADS_RATIO))
-        print(f"Using {num_threads} threads and '{VIDEO_OUTPUT_PRESET}' preset for video writing.")
-
-        # Create the video clip using the frame generation function
-        # In MoviePy 2.x, use VideoClip with frame_function parameter
-        video_clip = VideoClip(frame_function=make_karaoke_frame_sentence, duration=duration)
-        video_clip = video_clip.with_fps(FPS).with_audio(audio)
-
-        print(f"Writing video file to {output_path}...")
-        video_clip.write_videofile(output_path,
-                                   codec='libx264',       # Common, good quality/compression
-                                   audio_codec='aac',     # Common audio codec
-                                   threads=num_threads,   # Control CPU usage
-                                   preset=VIDEO_OUTPUT_PRESET, # Speed vs compression trade-off
-                                   logger='bar',          # Show progress bar
-                                   ffmpeg_params=["-pix_fmt", "yuv420p"]) # Ensures compatibility
-
+        profile_name = resolve_encoding_profile(encoding_profile, duration)
+        preset, encoding_params, keyint_frames = get_encoding_settings(profile_name)
+        print(f"Using {num_threads} threads and '{preset}' preset ({profile_name or 'no'} encoding profile) for video writing.")
+        ffmpeg_params = ["-pix_fmt", "yuv420p"] + encoding_params # Ensures compatibility
+        if variable_frame_rate:
+            print("Writing variable-frame-rate video (duplicate frames dropped).")
+
+        segment_counts = None
+        single_pass_params = ffmpeg_params + (["-g", str(keyint_frames)] if keyint_frames else [])
+        # Cached segments only when asked for or when an earlier render of this song left segments to reuse
+        if stage_cache and (cache_segments or has_cached_segments(duration, stage_cache, ffmpeg_params, writer_backend, preset,
+                                                                  variable_frame_rate)):
+            # Cached segments are a fixed SEGMENT_GOP_FRAMES long, which overrides the profile's keyframe interval
+            keyint_frames = SEGMENT_GOP_FRAMES
+            segment_counts = render_video_segments_cached(duration, video_path, stage_cache, render_workers, ffmpeg_params, writer_backend,
+                                                          preset, variable_frame_rate)
+        elif render_workers > 1:
+            # Parallel segments are cut on the profile's keyframe grid (x264's own interval has no fixed grid)
+            keyint_frames = keyint_frames or SEGMENT_GOP_FRAMES
+            render_video_segments_parallel(duration, video_path, render_workers, ffmpeg_params, writer_backend, preset, variable_frame_rate,
+                                           keyint_frames)
+        elif writer_backend == 'ffmpeg':
+            print(f"Writing video stream (direct ffmpeg pipe, {PIPE_PIXEL_FORMAT})...")
+            write_frames_ffmpeg_pipe(video_path, 0, int(duration * FPS), num_threads, single_pass_params, preset=preset, report_progress=True,
+                                     variable_frame_rate=variable_frame_rate)
+        else:
+            from moviepy.video.VideoClip import VideoClip
+            # Create the video clip using the frame generation function
+            # In MoviePy 2.x, use VideoClip with frame_function parameter
+            video_clip = VideoClip(frame_function=get_frame_function(), duration=duration)
+            video_clip = video_clip.with_fps(FPS)
+            if variable_frame_rate:
+                single_pass_params = single_pass_params + get_vfr_params(int(duration * FPS))
+
+            print("Writing video stream...")
+            video_clip.write_videofile(video_path,
+                                       codec='libx264',       # Common, good quality/compression
+                                       audio=False,           # Muxed from the separately encoded AAC below
+                                       threads=num_threads,   # Control CPU usage
+                                       preset=preset,         # Speed vs compression trade-off
+                                       logger='bar',          # Show progress bar
+                                       ffmpeg_params=single_pass_params)
+
+        # --- Mux Video and Audio (stream copy) ---
+        audio_cached = audio_future.result()
+        print(f"Muxing {'cached ' if audio_cached else ''}AAC audio into {output_path}...")
+        mux_video_audio(video_path, encoded_audio_path, output_path)
+
+        total_frames = frame_render_stats['rendered'] + frame_render_stats['reused']
+        print(f"Rendered {frame_render_stats['rendered']} frames, reused {frame_render_stats['reused']} unchanged frames (of {total_frames}).")
+        render_stats.update(frames=total_frames, frames_rendered=frame_render_stats['rendered'], frames_reused=frame_render_stats['reused'],
+                            frames_redrawn=frame_render_stats['redrawn'], video_seconds=round(duration, 2), render_workers=render_workers, writer=writer_backend,
+                            audio_cached=audio_cached, encoding_profile=profile_name, keyint_frames=keyint_frames)
+        if segment_counts:
+            render_stats.update(segments=segment_counts[0], segments_cached=segment_counts[1])
+        if profile_frames:
+            render_stats['frame_timing'] = summarize_frame_timings(frame_timings)
+            timing = render_stats['frame_timing']
+            if timing['frames']:
+                print(f"Frame render time: p50 {timing['p50_ms']} ms, p90 {timing['p90_ms']} ms, p99 {timing['p99_ms']} ms, max {timing['max_ms']} ms.")
         print(f"\nVideo creation finished in {time.time() - start_time:.2f} seconds.")
 
     except Exception as e:
@@ -680,19 +1789,443 @@ def create_karaoke_video_from_json(audio_track_path, transcription_json_path, ou
     finally:
         # --- Clean up ---
         print("Cleaning up video resources...")
-        if audio:
-             try: audio.close()
-             except Exception: pass # Ignore potential errors on close
         if video_clip:
              try: video_clip.close()
              except Exception: pass # Ignore potential errors on close
+        if audio_future:
+            concurrent.futures.wait([audio_future]) # The encode writes into work_dir
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def create_karaoke_video_from_json(audio_track_path, transcription_json_path, output_path, variable_frame_rate=VARIABLE_FRAME_RATE,
+                                   render_workers=RENDER_WORKERS, writer_backend=VIDEO_WRITER_BACKEND, profile_frames=False,
+                                   stage_cache=None, encoding_profile=ENCODING_PROFILE, cache_segments=SEGMENT_CACHE):
+    """
+    Creates the karaoke video using audio and the pre-processed transcription JSON
+    (its up-to-date binary copy is memory-mapped instead when present, see transcript_store).
+    With variable_frame_rate, duplicate frames are dropped by ffmpeg so static stretches are not encoded.
+    With render_workers > 1, time segments are rendered and encoded in parallel worker processes.
+    writer_backend selects the direct ffmpeg pipe ('ffmpeg') or MoviePy ('moviepy') to write frames.
+    With profile_frames, every frame's render time is sampled and render_stats gets a 'frame_timing'
+    summary (percentiles and a histogram).
+    With a stage_cache and cache_segments, the video is rendered as cached segments, so after a transcript edit
+    only the segments showing changed sentences are rendered again (see render_video_segments_cached); a later
+    render of the same song reuses those segments even without cache_segments. Otherwise the video is encoded
+    in a single pass (or by render_workers processes) and nothing but the audio is cached.
+    The video is encoded without audio while the audio track is encoded to AAC in a background thread
+    (once per audio file with a stage_cache); the two are then muxed without re-encoding.
+    encoding_profile names the x264 settings (see ENCODING_PROFILES and select_encoding_profile).
+    """
+    print(f"\n--- Creating Sentence Karaoke Video ---")
+    print(f"Using audio: {audio_track_path}")
+    print(f"Loading transcription from: {transcription_json_path}")
+    print(f"Output video: {output_path}")
+
+    with _render_lock:
+        try:
+            _load_render_state(transcription_json_path)
+            _render_loaded_video(audio_track_path, output_path, variable_frame_rate, render_workers, writer_backend, profile_frames,
+                                 stage_cache, encoding_profile, cache_segments)
+        finally:
+            # Clear global data and caches
+            _clear_render_state()
+            print("Video cleanup complete.")
+
+def get_preview_size(scale=PREVIEW_SCALE):
+    """Returns the preview frame size: VIDEO_SIZE scaled, rounded down to even dimensions for yuv420p."""
+    return tuple(max(2, int(dimension * scale) // 2 * 2) for dimension in VIDEO_SIZE)
+
+@contextlib.contextmanager
+def scaled_render_layout(scale=PREVIEW_SCALE):
+    """
+    Switches the loaded render state to frames of get_preview_size(scale): the font size, word spacing and
+    margins are scaled along with the frame, and the timeline index is rebuilt for them, so small frames are
+    drawn directly instead of drawn at full size and scaled down. Yields the frame size; the full-size layout,
+    index and frame state are restored afterwards. Call with _render_lock held.
+    """
+    global VIDEO_SIZE, WORD_SPACING, MARGIN_X, MARGIN_Y, font, _global_timeline_index
+    saved = (VIDEO_SIZE, WORD_SPACING, MARGIN_X, MARGIN_Y, font, _global_timeline_index)
+    try:
+        VIDEO_SIZE = get_preview_size(scale)
+        WORD_SPACING, MARGIN_X, MARGIN_Y = (max(1, round(value * scale)) for value in (WORD_SPACING, MARGIN_X, MARGIN_Y))
+        if font is not None and hasattr(font, 'font_variant'): # PIL's bitmap default font cannot be resized
+            font = font.font_variant(size=max(1, round(font.size * scale)))
+        reset_frame_state()
+        _global_timeline_index = build_timeline_index(_global_sentences_for_frame, font) if (_global_sentences_for_frame and font) else None
+        yield VIDEO_SIZE
+    finally:
+        VIDEO_SIZE, WORD_SPACING, MARGIN_X, MARGIN_Y, font, _global_timeline_index = saved
+        reset_frame_state()
+
+def _render_loaded_preview(audio_track_path, preview_path, stage_cache=None):
+    """
+    Renders a low-resolution, low-fps, ultrafast-encoded preview from the loaded render state, drawing its
+    frames at the preview size (see scaled_render_layout). The audio is encoded alongside, through the
+    stage cache, so a full render that follows reuses the encode.
+    """
+    start_time = time.time()
+    preview_stats.clear()
+    duration = get_video_duration(get_audio_track_duration(audio_track_path))
+    preset, encoding_params, keyint_frames = get_encoding_settings(PREVIEW_ENCODING_PROFILE, PREVIEW_FPS)
+    ffmpeg_params = ["-pix_fmt", "yuv420p"] + encoding_params
+    if keyint_frames:
+        ffmpeg_params += ["-g", str(keyint_frames)]
+    num_threads = max(1, int(os.cpu_count() * VIDEO_THREADS_RATIO))
+    work_dir = tempfile.mkdtemp(prefix=".preview_", dir=os.path.dirname(os.path.abspath(preview_path)))
+    encoded_audio_path = os.path.join(work_dir, "audio.m4a")
+    audio_future = start_audio_encode(audio_track_path, encoded_audio_path, stage_cache)
+    try:
+        video_path = os.path.join(work_dir, "video.mp4")
+        with scaled_render_layout(PREVIEW_SCALE) as preview_size:
+            print(f"Writing {preview_size[0]}x{preview_size[1]} preview at {PREVIEW_FPS} fps to {preview_path}...")
+            write_frames_ffmpeg_pipe(video_path, 0, int(duration * PREVIEW_FPS), num_threads, ffmpeg_params,
+                                     fps=PREVIEW_FPS, preset=preset, report_progress=True)
+            frames = frame_render_stats['rendered'] + frame_render_stats['reused']
+        audio_future.result()
+        mux_video_audio(video_path, encoded_audio_path, preview_path)
+    finally:
+        concurrent.futures.wait([audio_future]) # The encode writes into work_dir
+        shutil.rmtree(work_dir, ignore_errors=True)
+    seconds = time.time() - start_time
+    preview_stats.update(frames=frames, video_seconds=round(duration, 2),
+                         size=list(preview_size), fps=PREVIEW_FPS, seconds=round(seconds, 3))
+    print(f"Preview finished in {seconds:.2f} seconds.")
+
+def create_karaoke_preview(audio_track_path, transcription_json_path, preview_path, full_output_path=None,
+                           variable_frame_rate=VARIABLE_FRAME_RATE, render_workers=RENDER_WORKERS,
+                           writer_backend=VIDEO_WRITER_BACKEND, profile_frames=False, stage_cache=None,
+                           encoding_profile=ENCODING_PROFILE, cache_segments=SEGMENT_CACHE):
+    """
+    Renders a quick preview (PREVIEW_SCALE of the frame size, PREVIEW_FPS, PREVIEW_ENCODING_PROFILE encode) with the
+    same layout as the full video, to check lyrics and timing. preview_stats describes it afterwards.
+
+    With full_output_path, the full-quality render then continues in a background thread from the already
+    loaded transcript, index and sprites (options as in create_karaoke_video_from_json), and a
+    concurrent.futures.Future is returned that resolves to full_output_path (render_stats describes it).
+    Without it, returns None. Other renders wait until the background render has finished.
+    """
+    print(f"\n--- Creating Karaoke Preview ---")
+    print(f"Using audio: {audio_track_path}")
+    print(f"Loading transcription from: {transcription_json_path}")
+    print(f"Preview video: {preview_path}")
+    _render_lock.acquire()
+    try:
+        _load_render_state(transcription_json_path)
+        _render_loaded_preview(audio_track_path, preview_path, stage_cache)
+    except BaseException:
+        _clear_render_state()
+        _render_lock.release()
+        raise
+    if not full_output_path:
+        _clear_render_state()
+        _render_lock.release()
+        return None
+
+    def continue_full_render():
+        try:
+            print(f"\n--- Continuing with Full-Quality Video: {full_output_path} ---")
+            _render_loaded_video(audio_track_path, full_output_path, variable_frame_rate, render_workers, writer_backend, profile_frames,
+                                 stage_cache, encoding_profile, cache_segments)
+            return full_output_path
+        finally:
+            _clear_render_state()
+            _render_lock.release()
+            print("Video cleanup complete.")
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="full-render")
+    try:
+        future = executor.submit(continue_full_render)
+    except BaseException:
+        _clear_render_state()
+        _render_lock.release()
+        raise
+    executor.shutdown(wait=False) # The worker thread finishes the render, then exits
+    return future
+
+# --- ASS Karaoke Subtitles ---
+# The transcript's word timings map onto ASS karaoke tags, so ffmpeg/libass can draw the same pages
+# and highlights as make_karaoke_frame_sentence without a Python per-frame loop
+ASS_METRICS_FONT_SIZE = 1000 # Font size at which the font's ascent/descent are read for the ASS font size (rounding stays small)
+
+def _ass_color(rgb):
+    """Returns an RGB tuple as an ASS colour (&HAABBGGRR, opaque)."""
+    return f"&H00{rgb[2]:02X}{rgb[1]:02X}{rgb[0]:02X}"
+
+def _ass_time(centiseconds):
+    """Formats a time in centiseconds as an ASS timestamp (H:MM:SS.cc)."""
+    hours, centiseconds = divmod(max(0, centiseconds), 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    return f"{hours}:{minutes:02d}:{centiseconds // 100:02d}.{centiseconds % 100:02d}"
+
+def _ass_escape(text):
+    """Keeps lyrics from being read as ASS override blocks or escapes (\n, \h, {...})."""
+    # A word joiner after each backslash breaks escapes; libass reads \{ and \} as literal braces
+    return text.replace("\\", "\\\u2060").replace("{", "\\{").replace("}", "\\}")
+
+def get_ass_font_metrics(font_obj):
+    """
+    Returns (ASS font size, ascent in pixels) matching a PIL font: PIL sizes fonts by the em, libass by
+    ascent + descent, so the ASS size is the PIL font's ascent + descent.
+    """
+    reference = ImageFont.truetype(font_obj.path, ASS_METRICS_FONT_SIZE)
+    ascent, descent = reference.getmetrics()
+    scale = font_obj.size / ASS_METRICS_FONT_SIZE
+    return round((ascent + descent) * scale, 2), ascent * scale
+
+def _ass_karaoke_text(line, start_cs, font_obj):
+    """
+    Returns a line's ASS text for an event starting at start_cs: per word a \kf sweep from its start to its
+    end time (PROGRESSIVE_HIGHLIGHT) or a \k switch at its end, as get_highlight_progress highlights it,
+    and between words a zero-length syllable holding a space scaled to the renderer's word gap.
+    """
+    space_width = font_obj.getlength(" ")
+    parts = []
+    cursor = start_cs # Karaoke time reached by the syllables so far
+    word_x = line['line_x']
+    for word_idx, text in enumerate(line['texts']):
+        word_start = int(round(line['word_starts'][word_idx] * 100))
+        word_end = int(round(line['word_ends'][word_idx] * 100))
+        if PROGRESSIVE_HIGHLIGHT and line['word_ends'][word_idx] - line['word_starts'][word_idx] > 0.01:
+            sweep_start = max(word_start, cursor)
+            if sweep_start > cursor:
+                parts.append(f"{{\\k{sweep_start - cursor}}}")
+            parts.append(f"{{\\kf{max(0, word_end - sweep_start)}}}{_ass_escape(text)}")
+            cursor = max(word_end, sweep_start)
+        else:
+            highlight_time = max(word_end, cursor)
+            if highlight_time > cursor:
+                parts.append(f"{{\\k{highlight_time - cursor}}}")
+            parts.append(f"{{\\k0}}{_ass_escape(text)}")
+            cursor = highlight_time
+        if word_idx < len(line['texts']) - 1:
+            # The renderer advances by the word's ink width plus WORD_SPACING, libass by the glyph advances
+            next_x = word_x + get_word_size(text, font_obj)[0] + WORD_SPACING
+            gap = next_x - word_x - font_obj.getlength(text)
+            parts.append(f"{{\\k0\\fscx{max(0.0, 100 * gap / space_width):.1f}}} {{\\fscx100}}")
+            word_x = next_x
+    return "".join(parts)
+
+def build_ass_subtitles(index, duration, font_obj):
+    """
+    Returns an ASS karaoke script of the timeline index with the renderer's layout: one event per visible
+    sentence for every stretch of time between visible window changes (get_visible_window), placed at
+    the line's x and baseline, in FONT_SIZE text with TEXT_COLOR_NORMAL words turning TEXT_COLOR_HIGHLIGHT.
+    """
+    font_size, ascent = get_ass_font_metrics(font_obj)
+    font_name = font_obj.getname()[0]
+    header = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {VIDEO_SIZE[0]}",
+        f"PlayResY: {VIDEO_SIZE[1]}",
+        "WrapStyle: 2", # Lines never wrap, as in the renderer
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, "
+        "StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        # Karaoke fills syllables from the secondary (not yet sung) to the primary colour
+        f"Style: Karaoke,{font_name},{font_size},{_ass_color(TEXT_COLOR_HIGHLIGHT)},{_ass_color(TEXT_COLOR_NORMAL)},"
+        f"{_ass_color(BACKGROUND_COLOR_PIL)},{_ass_color(BACKGROUND_COLOR_PIL)},0,0,0,0,100,100,0,0,1,0,0,7,0,0,0,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    ]
+    events = []
+    if index is not None and index['lines']:
+        # The window only changes where t passes a sentence end time (running max), see get_visible_window
+        switch_times = sorted(set(t for t in index['end_time_running_max'] if 0 < t < duration))
+        stretches = [] # (start_cs, end_cs, window)
+        for start_time, end_time in zip([0.0] + switch_times, switch_times + [duration]):
+            window = get_visible_window(index, start_time)
+            start_cs, end_cs = int(round(start_time * 100)), int(round(end_time * 100))
+            if stretches and stretches[-1][2] == window:
+                stretches[-1] = (stretches[-1][0], end_cs, window)
+            elif end_cs > start_cs:
+                stretches.append((start_cs, end_cs, window))
+        for start_cs, end_cs, (window_start, window_end) in stretches:
+            baseline = index['first_baselines'][window_end - window_start]
+            for line in index['lines'][window_start:window_end]:
+                # \an7 puts the top of the font's ascent at the \pos y
+                position = f"\\an7\\pos({line['line_x']},{baseline - ascent:.1f})"
+                events.append(f"Dialogue: 0,{_ass_time(start_cs)},{_ass_time(end_cs)},Karaoke,,0,0,0,,"
+                              f"{{{position}}}{_ass_karaoke_text(line, start_cs, font_obj)}")
+                baseline += index['line_height']
+    return "\n".join(header + events) + "\n"
+
+def write_ass_subtitles(transcription_json_path, ass_path, audio_duration=0.0):
+    """
+    Writes the ASS karaoke script of a transcription JSON (see build_ass_subtitles), lasting audio_duration
+    or until just after the last word. Returns (video duration it covers, number of words).
+    """
+    with _render_lock:
+        try:
+            _load_render_state(transcription_json_path)
+            if not font or not getattr(font, 'path', None):
+                raise RuntimeError("ASS subtitles need a TrueType font file (none was found, see get_font_path).")
+            duration = get_video_duration(audio_duration)
+            num_words = _global_sentences_for_frame.num_words if _global_sentences_for_frame else 0
+            with open(ass_path, 'w', encoding='utf-8') as f:
+                f.write(build_ass_subtitles(_global_timeline_index, duration, font))
+        finally:
+            _clear_render_state()
+    print(f"ASS karaoke subtitles written to {ass_path}.")
+    return duration, num_words
+
+def create_karaoke_video_ass(audio_track_path, transcription_json_path, output_path, mode='burn', stage_cache=None,
+                             encoding_profile=ENCODING_PROFILE):
+    """
+    Creates the karaoke video without the Python frame renderer: the transcription is written as an ASS
+    karaoke script next to the video (<video name>.ass) and one ffmpeg invocation draws it with libass
+    over a generated background ('burn'), or encodes only the background and adds the script as a soft
+    subtitle track ('soft', which needs Matroska - an .mp4 output_path becomes .mkv, with the font attached).
+    The audio is the cached AAC encode muxed in as in create_karaoke_video_from_json. Returns the output path.
+    """
+    if mode not in ('burn', 'soft'):
+        raise ValueError(f"Unknown ASS subtitle mode '{mode}' (expected 'burn' or 'soft')")
+    if mode == 'soft' and not output_path.lower().endswith('.mkv'):
+        output_path = f"{os.path.splitext(output_path)[0]}.mkv"
+    print(f"\n--- Creating ASS Karaoke Video ({mode}) ---")
+    print(f"Using audio: {audio_track_path}")
+    print(f"Loading transcription from: {transcription_json_path}")
+    print(f"Output video: {output_path}")
+    start_time = time.time()
+    render_stats.clear()
+
+    ass_path = f"{os.path.splitext(output_path)[0]}{ASS_SUFFIX}"
+    duration, num_words = write_ass_subtitles(transcription_json_path, ass_path, get_audio_track_duration(audio_track_path))
+    total_frames = int(duration * FPS)
+    font_path = font.path
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    work_dir = tempfile.mkdtemp(prefix=".render_", dir=output_dir)
+    encoded_audio_path = os.path.join(work_dir, "audio.m4a")
+    audio_future = start_audio_encode(audio_track_path, encoded_audio_path, stage_cache)
+    try:
+        # ffmpeg runs in work_dir with relative file names, so no paths need filtergraph escaping
+        shutil.copy(ass_path, os.path.join(work_dir, "subtitles.ass"))
+        os.makedirs(os.path.join(work_dir, "fonts"))
+        shutil.copy(font_path, os.path.join(work_dir, "fonts"))
+        num_threads = max(1, int(os.cpu_count() * VIDEO_THREADS_RATIO))
+        profile_name = resolve_encoding_profile(encoding_profile, duration, num_words)
+        preset, encoding_params, keyint_frames = get_encoding_settings(profile_name)
+        background = "0x{:02X}{:02X}{:02X}".format(*BACKGROUND_COLOR_PIL)
+        command = [
+            get_ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"color=c={background}:s={VIDEO_SIZE[0]}x{VIDEO_SIZE[1]}:r={FPS}",
+            "-frames:v", str(total_frames)
+        ]
+        if mode == 'burn':
+            command += ["-vf", "ass=subtitles.ass:fontsdir=fonts"]
+        command += ["-c:v", "libx264", "-preset", preset, "-threads", str(num_threads), "-pix_fmt", "yuv420p"] + encoding_params
+        if keyint_frames:
+            command += ["-g", str(keyint_frames)]
+        command.append("video.mp4")
+        print(f"Encoding {total_frames} frames with ffmpeg{' and libass' if mode == 'burn' else ''} ('{preset}' preset, {profile_name or 'no'} encoding profile)...")
+        try:
+            subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore', cwd=work_dir)
+        except subprocess.CalledProcessError as e:
+            print(f"Error rendering ASS video (Return Code: {e.returncode}):")
+            print(f"Stderr:\n{e.stderr}")
+            raise RuntimeError("ffmpeg failed while rendering the ASS video.") from e
+
+        audio_cached = audio_future.result()
+        print(f"Muxing {'cached ' if audio_cached else ''}AAC audio{' and subtitles' if mode == 'soft' else ''} into {output_path}...")
+        if mode == 'soft':
+            mux_video_audio(os.path.join(work_dir, "video.mp4"), encoded_audio_path, output_path, subtitle_path=ass_path, font_path=font_path)
+        else:
+            mux_video_audio(os.path.join(work_dir, "video.mp4"), encoded_audio_path, output_path)
+    finally:
+        concurrent.futures.wait([audio_future]) # The encode writes into work_dir
+        shutil.rmtree(work_dir, ignore_errors=True)
 
-        # Clear global data and caches
-        _global_sentences_for_frame = []
-        word_size_cache = {}
-        sentence_width_cache = {}
-        gc.collect() # Final garbage collect for this stage
-        print("Video cleanup complete.")
+    render_stats.update(frames=total_frames, frames_rendered=0, frames_reused=0, frames_redrawn=0, video_seconds=round(duration, 2),
+                        render_workers=1, writer=f"ass-{mode}", audio_cached=audio_cached, encoding_profile=profile_name)
+    print(f"\nVideo creation finished in {time.time() - start_time:.2f} seconds.")
+    return output_path
+
+def get_audio_duration(audio_path):
+    """Returns the duration of an audio file in seconds, or None if soundfile cannot read it."""
+    try:
+        return sf.info(audio_path).duration
+    except Exception:
+        return None
+
+# --- Stage Cache Keys ---
+# stems: input audio + Demucs model; transcription: stems + Whisper size; enhanced: stems + enhancement settings
+def stems_cache_key(input_file, model_name=DEMUCS_MODEL):
+    return cache_key('stems', file_digest(input_file), model=model_name)
+
+def stems_files_cache_key(vocal_path, instrumental_path):
+    """Key for stems that were not produced through the cache (e.g. pre-separated files)."""
+    return cache_key('stems-files', file_digest(vocal_path), file_digest(instrumental_path))
+
+def transcription_cache_key(stems_key, model_size=WHISPER_MODEL_SIZE, workers=TRANSCRIPTION_WORKERS):
+    vad = (VAD_MIN_SILENCE_SECONDS, VAD_PADDING_SECONDS) if VAD_ENABLED else None
+    # Chunked transcription loses context across chunk boundaries, so its output is cached separately
+    chunks = workers if workers and workers > 1 else None
+    return cache_key('transcription', stems_key, whisper=model_size, vad=vad, chunks=chunks)
+
+def enhancement_cache_key(stems_key, chunk_seconds=ENHANCEMENT_CHUNK_SECONDS, overlap_seconds=ENHANCEMENT_OVERLAP_SECONDS):
+    return cache_key('enhanced', stems_key, chunk_seconds=chunk_seconds, overlap_seconds=overlap_seconds,
+                     prop_decrease=ENHANCEMENT_PROP_DECREASE)
+
+# --- Cached Stage Runners ---
+def separate_vocals_cached(input_file, output_dir, stage_cache=None, model_name=DEMUCS_MODEL):
+    """separate_vocals() through the stage cache. Returns (vocal_path, instrumental_path, stems_key)."""
+    vocal_path, instrumental_path = get_stem_paths(input_file, output_dir, model_name)
+    stems_key = stems_cache_key(input_file, model_name) if stage_cache else None
+    if stage_cache and stage_cache.restore('stems', stems_key, {'vocals.wav': vocal_path, 'no_vocals.wav': instrumental_path}):
+        return vocal_path, instrumental_path, stems_key
+
+    vocal_path, instrumental_path = separate_vocals(input_file, output_dir, model_name)
+    if stage_cache:
+        stage_cache.store('stems', stems_key, {'vocals.wav': vocal_path, 'no_vocals.wav': instrumental_path})
+    return vocal_path, instrumental_path, stems_key
+
+def transcribe_cached(vocal_path, output_json_path, stems_key, stage_cache=None, model_size=WHISPER_MODEL_SIZE, model=None,
+                      workers=TRANSCRIPTION_WORKERS):
+    """
+    transcribe_and_save() through the stage cache. Returns the path to the JSON file.
+    A hand-edited JSON at output_json_path (its content differs from what was transcribed) is kept as is,
+    so corrections survive re-runs - unless it was transcribed from other stems or Whisper settings, which
+    the transcription key recorded in its binary copy tells.
+    """
+    # Without a stems key (no stage cache), the vocal stem's content identifies the source
+    if not stems_key and os.path.exists(vocal_path):
+        stems_key = cache_key('vocals', file_digest(vocal_path))
+    transcription_key = transcription_cache_key(stems_key, model_size, workers) if stems_key else None
+    if is_transcript_edited(output_json_path):
+        edited_key = transcript_source_key(output_json_path)
+        if edited_key is None or transcription_key is None or edited_key == transcription_key:
+            print(f"Keeping hand-edited transcription {output_json_path} (delete it to transcribe again).")
+            transcription_stats.clear()
+            transcription_stats['edited'] = True
+            return output_json_path
+        print(f"Transcribing again: {output_json_path} was edited, but for other stems or Whisper settings.")
+    if stage_cache and stage_cache.restore('transcription', transcription_key, {'transcription.json': output_json_path}):
+        transcription_stats.clear()
+        transcription_stats['cached'] = True
+        save_binary_transcript(output_json_path, source_key=transcription_key) # The cache holds only the JSON
+        return output_json_path
+
+    returned_path = transcribe_and_save(vocal_path, output_json_path, model_size, model=model, workers=workers,
+                                        source_key=transcription_key)
+    if stage_cache and os.path.exists(returned_path):
+        stage_cache.store('transcription', transcription_key, {'transcription.json': returned_path})
+    return returned_path
+
+def enhance_cached(instrumental_path, enhanced_path, stems_key, stage_cache=None):
+    """enhance_instrumental_chunked() through the stage cache. Returns the enhanced path, or the input path on failure."""
+    enhancement_key = enhancement_cache_key(stems_key) if stage_cache else None
+    if stage_cache and stage_cache.restore('enhanced', enhancement_key, {'enhanced.wav': enhanced_path}):
+        enhancement_stats.clear()
+        enhancement_stats['cached'] = True
+        return enhanced_path
+
+    returned_path = enhance_instrumental_chunked(instrumental_path, enhanced_path)
+    if stage_cache and returned_path == enhanced_path and os.path.exists(returned_path):
+        stage_cache.store('enhanced', enhancement_key, {'enhanced.wav': returned_path})
+    return returned_path
 
 # --- Main Execution Logic ---
 # --- YouTube Download Support ---
@@ -715,6 +2248,7 @@ def download_audio_from_youtube(url, download_dir):
         'quiet': True,
         'no_warnings': True,
     }
+    import yt_dlp
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         info = ydl.extract_info(url, download=True)
         video_id = info.get('id')
@@ -724,14 +2258,187 @@ def download_audio_from_youtube(url, download_dir):
     print(f"Downloaded audio to: {audio_file}")
     return audio_file, video_id
 
+# --- Batch Processing ---
+def collect_batch_inputs(batch_path):
+    """
+    Returns the songs of a batch: the audio files in a directory, or the entries of a list file
+    (one path or YouTube URL per line; blank lines and '#' comments are skipped).
+    """
+    if os.path.isdir(batch_path):
+        return sorted(os.path.join(batch_path, name) for name in os.listdir(batch_path)
+                      if name.lower().endswith(BATCH_AUDIO_EXTENSIONS))
+
+    list_dir = os.path.dirname(os.path.abspath(batch_path))
+    inputs = []
+    with open(batch_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = line.strip()
+            if not entry or entry.startswith('#'):
+                continue
+            # Relative paths in a list file are relative to the list file itself
+            if not is_youtube_url(entry) and not os.path.isabs(entry):
+                entry = os.path.join(list_dir, entry)
+            inputs.append(entry)
+    return inputs
+
+def make_batch_stages(output_dir=None, stage_cache=None, model_size=WHISPER_MODEL_SIZE, checkout_whisper_model=None,
+                      enhance=RUN_ENHANCEMENT, variable_frame_rate=VARIABLE_FRAME_RATE, render_workers=RENDER_WORKERS,
+                      writer_backend=VIDEO_WRITER_BACKEND, transcription_workers=TRANSCRIPTION_WORKERS, encoding_profile=ENCODING_PROFILE,
+                      ass_subtitles=ASS_SUBTITLES, cache_segments=SEGMENT_CACHE):
+    """
+    Returns the (stage_name, stage_fn) list for one song: download -> separate -> transcribe -> enhance -> render.
+    Each stage_fn reads and fills a job dict whose 'input' is a file path or YouTube URL, and records its
+    stage metrics in the job's 'metrics' (a JobMetrics).
+    Without output_dir, each song's outputs go to 'output_karaoke' next to its audio file, as in single-song mode.
+    """
+    def download(job):
+        with job['metrics'].stage('download') as counters:
+            if is_youtube_url(job['input']):
+                job['input_file'], job['base_name'] = download_audio_from_youtube(job['input'], output_dir or os.getcwd())
+                counters['bytes'] = os.path.getsize(job['input_file'])
+            else:
+                if not os.path.exists(job['input']):
+                    raise FileNotFoundError(f"Input file not found at '{job['input']}'")
+                job['input_file'] = job['input']
+                job['base_name'] = os.path.splitext(os.path.basename(job['input']))[0]
+        job['output_dir'] = output_dir or os.path.join(os.path.dirname(job['input_file']) or ".", "output_karaoke")
+        os.makedirs(job['output_dir'], exist_ok=True)
+
+    def separate(job):
+        with job['metrics'].stage('separate', stage_cache, 'stems'):
+            job['vocal_path'], job['instrumental_path'], job['stems_key'] = separate_vocals_cached(
+                job['input_file'], job['output_dir'], stage_cache, DEMUCS_MODEL)
+        job['metrics'].audio_seconds = get_audio_duration(job['vocal_path'])
+
+    def transcribe(job):
+        transcription_json_path = os.path.join(job['output_dir'], f"{job['base_name']}{TRANSCRIPTION_SUFFIX}")
+        with job['metrics'].stage('transcribe', stage_cache, 'transcription') as counters:
+            # Chunked transcription loads its models in the worker processes
+            use_model = checkout_whisper_model and transcription_workers <= 1
+            with checkout_whisper_model(model_size) if use_model else contextlib.nullcontext() as model:
+                job['transcription_path'] = transcribe_cached(job['vocal_path'], transcription_json_path, job['stems_key'],
+                                                              stage_cache, model_size, model=model, workers=transcription_workers)
+            job['transcription_stats'] = dict(transcription_stats)
+            counters.update(job['transcription_stats'])
+
+    def enhance_stage(job):
+        job['audio_track'] = job['instrumental_path']
+        job['enhanced'] = False
+        if not enhance:
+            return
+        instr_base, instr_ext = os.path.splitext(job['instrumental_path'])
+        enhanced_path = f"{instr_base}{ENHANCED_SUFFIX}{instr_ext}"
+        try:
+            with job['metrics'].stage('enhance', stage_cache, 'enhanced') as counters:
+                if enhance_cached(job['instrumental_path'], enhanced_path, job['stems_key'], stage_cache) == enhanced_path:
+                    job['audio_track'] = enhanced_path
+                    job['enhanced'] = True
+                counters.update(enhancement_stats)
+        except Exception as e:
+            # As in single-song mode, a failed enhancement falls back to the original instrumental
+            print(f"Audio enhancement step failed for {job['base_name']}: {e}. Using original instrumental track.")
+
+    def render(job):
+        output_video_filename = f"{job['base_name']}_karaoke_{model_size}"
+        if job['enhanced']:
+            output_video_filename += ENHANCED_SUFFIX
+        job['output_video'] = os.path.join(job['output_dir'], f"{output_video_filename}.mp4")
+        with job['metrics'].stage('render') as counters:
+            if ass_subtitles:
+                job['output_video'] = create_karaoke_video_ass(job['audio_track'], job['transcription_path'], job['output_video'],
+                                                               mode=ass_subtitles, stage_cache=stage_cache, encoding_profile=encoding_profile)
+            else:
+                create_karaoke_video_from_json(job['audio_track'], job['transcription_path'], job['output_video'],
+                                               variable_frame_rate=variable_frame_rate, render_workers=render_workers,
+                                               writer_backend=writer_backend, profile_frames='frames' in job['metrics'].profile,
+                                               stage_cache=stage_cache, encoding_profile=encoding_profile, cache_segments=cache_segments)
+            counters.update(render_stats)
+        if not os.path.exists(job['output_video']):
+            raise RuntimeError(f"Output video was not created at {job['output_video']}")
+
+    return [('download', download), ('separate', separate), ('transcribe', transcribe),
+            ('enhance', enhance_stage), ('render', render)]
+
+def run_batch(inputs, output_dir=None, stage_cache=None, model_size=WHISPER_MODEL_SIZE, checkout_whisper_model=None,
+              enhance=RUN_ENHANCEMENT, variable_frame_rate=VARIABLE_FRAME_RATE, render_workers=RENDER_WORKERS,
+              writer_backend=VIDEO_WRITER_BACKEND, stage_limits=None, on_event=None, transcription_workers=TRANSCRIPTION_WORKERS,
+              profile=(), encoding_profile=ENCODING_PROFILE, ass_subtitles=ASS_SUBTITLES, cache_segments=SEGMENT_CACHE):
+    """
+    Processes many songs as a stage pipeline: song N+1 separates while song N transcribes or renders.
+    Returns one job dict per input with 'status' ('done' or 'failed'), outputs, 'error', 'stage_seconds'
+    and 'metrics' (the stage metrics report, also written to <base_name>_metrics.json in its output directory).
+    With profiling modes in 'profile' (see stage_metrics.PROFILE_MODES), each job also lists its 'profile_files'.
+    checkout_whisper_model(size) returns a context manager that yields a Whisper model for exclusive use
+    (e.g. WhisperModelPool.checkout); by default the batch loads its own models.
+    """
+    limits = dict(BATCH_STAGE_LIMITS, **(stage_limits or {}))
+    limits['render'] = 1 # The frame renderer keeps module-level state (timeline index, last frame), so renders never overlap
+
+    owned_models = {}
+    if checkout_whisper_model is None:
+        # Keep one Whisper model loaded for the whole batch instead of reloading it per song; songs transcribing
+        # at once (transcribe stage limit > 1) take turns, since word-timestamp alignment hooks into the model
+        model_lock = threading.Lock()
+        model_use_locks = {}
+        @contextlib.contextmanager
+        def checkout_whisper_model(size):
+            with model_lock:
+                if size not in owned_models:
+                    print(f"Loading Whisper model '{size}' for the batch...")
+                    owned_models[size] = load_whisper_model(size)
+                    model_use_locks[size] = threading.Lock()
+                model, use_lock = owned_models[size], model_use_locks[size]
+            with use_lock:
+                yield model
+
+    print(f"\n--- Batch: {len(inputs)} songs, stage limits {limits} ---")
+    stages = make_batch_stages(output_dir, stage_cache, model_size, checkout_whisper_model, enhance,
+                               variable_frame_rate, render_workers, writer_backend, transcription_workers, encoding_profile,
+                               ass_subtitles, cache_segments)
+    pipeline = StagePipeline(stages, limits, on_event=on_event)
+    start_time = time.time()
+    try:
+        jobs = pipeline.run({'input': song, 'metrics': JobMetrics(profile=profile)} for song in inputs)
+    finally:
+        owned_models.clear()
+        release_model_memory()
+
+    for job in jobs:
+        if 'output_dir' in job:
+            job['metrics_path'] = os.path.join(job['output_dir'], f"{job['base_name']}{METRICS_SUFFIX}")
+            if profile:
+                job['profile_files'] = job['metrics'].dump_profiles(os.path.join(job['output_dir'], f"{job['base_name']}{PROFILE_SUFFIX}"))
+            job['metrics'] = job['metrics'].save(job['metrics_path'])
+        else:
+            job['metrics'] = job['metrics'].to_dict() # Failed before its output directory existed
+
+    completed = sum(1 for job in jobs if job['status'] == 'done')
+    print(f"\n--- Batch finished in {time.time() - start_time:.2f} seconds: {completed}/{len(jobs)} songs completed ---")
+    for job in jobs:
+        if job['status'] == 'done':
+            print(f" - {job['input']}: {job['output_video']}")
+        else:
+            print(f" - {job['input']}: {job.get('error')}")
+    return jobs
+
 def main(args):
     """Main function to orchestrate the karaoke video creation process."""
     input_arg = args.input_file
+    if args.batch or os.path.isdir(input_arg):
+        run_batch(collect_batch_inputs(input_arg), stage_cache=StageCache() if args.cache or args.cache_segments else None,
+                  enhance=RUN_ENHANCEMENT, variable_frame_rate=args.vfr, render_workers=args.workers,
+                  writer_backend=args.writer, transcription_workers=args.transcribe_workers,
+                  profile=parse_profile_modes(args.profile), encoding_profile=args.encoding_profile,
+                  ass_subtitles=args.ass, cache_segments=args.cache_segments)
+        return
     base_name_override = None
+    metrics = JobMetrics(profile=parse_profile_modes(args.profile))
     if is_youtube_url(input_arg):
         try:
             download_dir = os.getcwd()
-            downloaded_audio_path, base_name_override = download_audio_from_youtube(input_arg, download_dir)
+            with metrics.stage('download') as counters:
+                downloaded_audio_path, base_name_override = download_audio_from_youtube(input_arg, download_dir)
+                counters['bytes'] = os.path.getsize(downloaded_audio_path)
             input_file = downloaded_audio_path
         except Exception as e:
             print(f"Error downloading audio from YouTube: {e}. Cannot continue.")
@@ -757,16 +2464,18 @@ def main(args):
 
     vocal_path = ""
     instrumental_path = ""
-    # Demucs creates: output_dir/model_name/track_name/stem.wav
-    final_stem_dir = os.path.join(output_dir, DEMUCS_MODEL, base_name)
-    expected_vocal_path = os.path.join(final_stem_dir, 'vocals.wav')
-    expected_instrumental_path = os.path.join(final_stem_dir, 'no_vocals.wav')
+    # Demucs creates: output_dir/model_name/track_name/stem.wav (named after the input file, not base_name)
+    expected_vocal_path, expected_instrumental_path = get_stem_paths(input_file, output_dir, DEMUCS_MODEL)
+    final_stem_dir = os.path.dirname(expected_vocal_path)
+    stage_cache = StageCache() if args.cache or args.cache_segments else None
+    stems_key = None
 
     # --- Step 1: Separate Vocals (Conditional) ---
     if RUN_SEPARATION:
         try:
             # Pass the main output dir, demucs function will handle the model subdir
-            vocal_path, instrumental_path = separate_vocals(input_file, output_dir, DEMUCS_MODEL)
+            with metrics.stage('separate', stage_cache, 'stems'):
+                vocal_path, instrumental_path, stems_key = separate_vocals_cached(input_file, output_dir, stage_cache, DEMUCS_MODEL)
         except Exception as e:
             print(f"Vocal separation failed: {e}. Cannot continue.")
             return # Stop execution if separation fails
@@ -781,6 +2490,7 @@ def main(args):
             print(f" - {expected_vocal_path}")
             print(f" - {expected_instrumental_path}")
             return # Stop if files are missing and separation is skipped
+    metrics.audio_seconds = get_audio_duration(vocal_path)
 
     # --- Step 2: Transcribe Vocals (Conditional) ---
     # Place transcription JSON directly in the main output directory
@@ -793,7 +2503,12 @@ def main(args):
                  print(f"Error: Vocal file path is invalid or file missing: {vocal_path}")
                  return
 
-            transcription_json_path_returned = transcribe_and_save(vocal_path, transcription_json_path, WHISPER_MODEL_SIZE)
+            if stage_cache and not stems_key:
+                stems_key = stems_files_cache_key(vocal_path, instrumental_path)
+            with metrics.stage('transcribe', stage_cache, 'transcription') as counters:
+                transcription_json_path_returned = transcribe_cached(vocal_path, transcription_json_path, stems_key, stage_cache, WHISPER_MODEL_SIZE,
+                                                                     workers=args.transcribe_workers)
+                counters.update(transcription_stats)
             # Verify the file was actually created
             if not os.path.exists(transcription_json_path_returned) or transcription_json_path_returned != transcription_json_path:
                  print(f"Error: Transcription JSON file missing after run: {transcription_json_path}")
@@ -825,7 +2540,11 @@ def main(args):
             enhanced_instrumental_path = os.path.join(instr_dir, f"{instr_base}{ENHANCED_SUFFIX}{instr_ext}")
 
             try:
-                returned_path = enhance_instrumental_chunked(instrumental_path, enhanced_instrumental_path)
+                if stage_cache and not stems_key:
+                    stems_key = stems_files_cache_key(vocal_path, instrumental_path)
+                with metrics.stage('enhance', stage_cache, 'enhanced') as counters:
+                    returned_path = enhance_cached(instrumental_path, enhanced_instrumental_path, stems_key, stage_cache)
+                    counters.update(enhancement_stats)
                 # Check if enhancement actually produced the output file and didn't just return the input path on error
                 if returned_path == enhanced_instrumental_path and os.path.exists(enhanced_instrumental_path):
                     final_instrumental_path = returned_path
@@ -856,13 +2575,47 @@ def main(args):
     output_video_path = os.path.join(output_dir, f"{output_video_filename}.mp4")
 
     try:
-        create_karaoke_video_from_json(final_instrumental_path,
-                                        transcription_json_path,
-                                        output_video_path)
+        if args.ass:
+            if args.preview or args.preview_only:
+                print("Skipping the preview: ASS rendering encodes the full video about as fast.")
+            with metrics.stage('render') as counters:
+                output_video_path = create_karaoke_video_ass(final_instrumental_path, transcription_json_path, output_video_path,
+                                                             mode=args.ass, stage_cache=stage_cache,
+                                                             encoding_profile=args.encoding_profile)
+                counters.update(render_stats)
+        elif args.preview or args.preview_only:
+            preview_path = os.path.join(output_dir, f"{output_video_filename}{PREVIEW_SUFFIX}.mp4")
+            with metrics.stage('preview') as counters:
+                full_render = create_karaoke_preview(final_instrumental_path, transcription_json_path, preview_path,
+                                                     None if args.preview_only else output_video_path,
+                                                     variable_frame_rate=args.vfr, render_workers=args.workers,
+                                                     writer_backend=args.writer, profile_frames='frames' in metrics.profile,
+                                                     stage_cache=stage_cache, encoding_profile=args.encoding_profile,
+                                                     cache_segments=args.cache_segments)
+                counters.update(preview_stats)
+            print(f"Preview saved to: {preview_path}")
+            if full_render:
+                # The full render continues from the preview's loaded state; this stage times the rest of it
+                with metrics.stage('render') as counters:
+                    full_render.result()
+                    counters.update(render_stats)
+        else:
+            with metrics.stage('render') as counters:
+                create_karaoke_video_from_json(final_instrumental_path,
+                                                transcription_json_path,
+                                                output_video_path,
+                                                variable_frame_rate=args.vfr,
+                                                render_workers=args.workers,
+                                                writer_backend=args.writer,
+                                                profile_frames='frames' in metrics.profile,
+                                                stage_cache=stage_cache,
+                                                encoding_profile=args.encoding_profile,
+                                                cache_segments=args.cache_segments)
+                counters.update(render_stats)
         print(f"\nKaraoke video creation process completed.")
         if os.path.exists(output_video_path):
              print(f"Output video saved to: {output_video_path}")
-        else:
+        elif args.ass or not args.preview_only:
              print(f"Warning: Output video file was not found at {output_video_path} after processing. Check logs for errors.")
     except Exception as e:
         print(f"Video creation failed: {e}")
@@ -870,14 +2623,38 @@ def main(args):
         # import traceback
         # traceback.print_exc()
 
+    metrics_path = os.path.join(output_dir, f"{base_name}{METRICS_SUFFIX}")
+    metrics.save(metrics_path)
+    print(f"Stage metrics saved to: {metrics_path}")
+    if metrics.profile:
+        profile_files = metrics.dump_profiles(os.path.join(output_dir, f"{base_name}{PROFILE_SUFFIX}"))
+        print(f"Stage profiles saved: {', '.join(profile_files) or 'none'}")
+
 
 if __name__ == "__main__":
     # --- Argument Parsing ---
     parser = argparse.ArgumentParser(description="Create a karaoke-style video from an audio file using Demucs and Whisper.")
-    parser.add_argument("input_file", help="Path to the input audio file (e.g., song.mp3, recording.wav)")
+    parser.add_argument("input_file", help="Path to the input audio file (e.g., song.mp3, recording.wav), or a directory / list file with --batch")
     # Add optional arguments for configuration overrides if desired in the future
     # parser.add_argument("-m", "--model", default=WHISPER_MODEL_SIZE, help="Whisper model size")
     # parser.add_argument("--no-enhance", action="store_false", dest="enhance", help="Disable instrumental enhancement")
+    parser.add_argument("--vfr", action="store_true", default=VARIABLE_FRAME_RATE, help="Write variable-frame-rate video, skipping duplicate frames")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="Render video segments in this many parallel processes")
+    parser.add_argument("--writer", choices=['ffmpeg', 'moviepy'], default=VIDEO_WRITER_BACKEND, help="Video writer backend")
+    parser.add_argument("--transcribe-workers", type=int, default=TRANSCRIPTION_WORKERS, help="Transcribe silence-split chunks in this many processes (CPU only, one Whisper model each)")
+    parser.add_argument("--cache", action="store_true", default=STAGE_CACHE_ENABLED, help="Reuse and store stage outputs in the stage cache (~/.cache/karaoke-automate, up to KARAOKE_CACHE_MAX_GB)")
+    parser.add_argument("--cache-segments", action="store_true", default=SEGMENT_CACHE,
+                        help="Store the video as cached 10-second segments, so re-rendering after transcript edits only redoes changed segments")
+    parser.add_argument("--batch", action="store_true", help="Treat input_file as a directory of songs or a list file (one path/URL per line) and process them as a pipeline")
+    parser.add_argument("--preview", action="store_true", help="Write a quick low-resolution preview first, then continue with the full-quality video")
+    parser.add_argument("--preview-only", action="store_true", help="Write only the low-resolution preview")
+    parser.add_argument("--profile", nargs="?", const="all", default=None, metavar="MODES",
+                        help=f"Profile the job: comma-separated {', '.join(PROFILE_MODES)} (default: all); profiles go to the output directory")
+    parser.add_argument("--encoding-profile", choices=['auto', 'none', *ENCODING_PROFILES], default=ENCODING_PROFILE or 'none',
+                        help="x264 encoding profile ('auto' picks one from the word density and duration, 'none' = plain preset)")
+    parser.add_argument("--ass", choices=['burn', 'soft'], default=ASS_SUBTITLES,
+                        help="Render the lyrics as an ASS karaoke script with ffmpeg/libass instead of the Python frame renderer: "
+                             "'burn' draws it into the video, 'soft' adds it as a subtitle track of an .mkv")
 
     # Check if any arguments were provided (other than the script name)
     if len(sys.argv) == 1:
@@ -886,6 +2663,8 @@ if __name__ == "__main__":
         sys.exit(1)
 
     args = parser.parse_args()
+    if args.encoding_profile == 'none':
+        args.encoding_profile = None
 
     # --- Run Main Logic ---
     start_time_script = time.time()
@@ -4,11 +4,15 @@ Python Bridge for Karaoke Automate Desktop App
 Handles IPC communication with Electron main process
 """
 
+import time
+BRIDGE_START_TIME = time.time() # Before any other imports, for the cold-start measurement
+
 import sys
 import json
 import os
 import threading
-import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
 # Get the absolute path to this script's directory
@@ -21,8 +25,15 @@ try:
     # Import the main karaoke processing functions from the local main.py
     from main import (
         separate_vocals, transcribe_and_save, enhance_instrumental_chunked,
-        create_karaoke_video_from_json, download_audio_from_youtube
+        create_karaoke_video_from_json, create_karaoke_preview, create_karaoke_video_ass, download_audio_from_youtube,
+        load_whisper_model, get_model_size_mb, release_model_memory,
+        unload_demucs_models, separate_vocals_cached, transcribe_cached,
+        enhance_cached, collect_batch_inputs, run_batch, warm_up, get_demucs_model, get_audio_duration,
+        DEMUCS_MODEL, METRICS_SUFFIX, PROFILE_SUFFIX, PREVIEW_SUFFIX, transcription_stats, enhancement_stats,
+        render_stats, preview_stats
     )
+    from stage_cache import StageCache
+    from stage_metrics import JobMetrics, parse_profile_modes
     MAIN_MODULE_AVAILABLE = True
     print("Successfully imported main module functions", file=sys.stderr)
 except ImportError as e:
@@ -31,15 +42,120 @@ except ImportError as e:
     print(f"Files in script directory: {list(script_dir.glob('*.py'))}", file=sys.stderr)
     MAIN_MODULE_AVAILABLE = False
 
+# RAM budget for resident Whisper models (MB); override with KARAOKE_WHISPER_POOL_MB
+WHISPER_POOL_BUDGET_MB = float(os.environ.get("KARAOKE_WHISPER_POOL_MB", "4096"))
+# Background warm-up at startup: KARAOKE_WARMUP=1 preloads the stage dependencies,
+# KARAOKE_WARMUP_WHISPER=<size> also loads that Whisper model into the pool
+WARMUP_ON_START = os.environ.get("KARAOKE_WARMUP", "") not in ("", "0")
+WARMUP_WHISPER_MODEL = os.environ.get("KARAOKE_WARMUP_WHISPER") or None
+
+class WhisperModelPool:
+    """
+    Keeps loaded Whisper models resident between jobs, keyed by model size.
+    Least recently used models are evicted when the total size exceeds the RAM budget.
+    Jobs transcribe through checkout(), which gives each of them the model exclusively.
+    """
+    def __init__(self, budget_mb=WHISPER_POOL_BUDGET_MB, loader=None, size_fn=None, release_fn=None):
+        self.budget_mb = budget_mb
+        self.loader = loader or load_whisper_model
+        self.size_fn = size_fn or get_model_size_mb
+        self.release_fn = release_fn or release_model_memory
+        self.models = OrderedDict() # model_size -> (model, size_mb), least recently used first
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.model_locks = {} # model_size -> lock held while a job transcribes with that model
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_size):
+        """Returns the model for 'model_size', loading it (and evicting others) on a miss."""
+        with self.lock:
+            if model_size in self.models:
+                self.hits += 1
+                self.models.move_to_end(model_size)
+                return self.models[model_size][0]
+
+        # Loads are serialized, but status queries stay answerable while a model loads
+        with self.load_lock:
+            with self.lock:
+                if model_size in self.models: # Loaded by another job while we waited
+                    self.hits += 1
+                    self.models.move_to_end(model_size)
+                    return self.models[model_size][0]
+                self.misses += 1
+            model = self.loader(model_size)
+            size_mb = self.size_fn(model)
+            with self.lock:
+                self.models[model_size] = (model, size_mb)
+                evicted = self._evict_over_budget(keep=model_size)
+            if evicted:
+                self.release_fn()
+            return model
+
+    @contextmanager
+    def checkout(self, model_size):
+        """
+        Yields the model for 'model_size' for exclusive use: word-timestamp transcription installs hooks on
+        the model's decoder, so concurrent jobs on one model size take turns instead of sharing it.
+        """
+        with self.lock:
+            model_lock = self.model_locks.setdefault(model_size, threading.Lock())
+        with model_lock:
+            yield self.get(model_size)
+
+    def _evict_over_budget(self, keep):
+        """Evicts least recently used models until within budget; 'keep' is never evicted."""
+        evicted = []
+        while self.total_mb() > self.budget_mb:
+            victim = next((size for size in self.models if size != keep), None)
+            if victim is None:
+                break # Only the requested model is left - keep it even if it alone exceeds the budget
+            del self.models[victim]
+            self.evictions += 1
+            evicted.append(victim)
+        return evicted
+
+    def unload(self, model_size=None):
+        """Unloads one model size, or every model if none is given. Returns the unloaded sizes."""
+        with self.lock:
+            sizes = [model_size] if model_size else list(self.models)
+            unloaded = [size for size in sizes if self.models.pop(size, None) is not None]
+        if unloaded:
+            self.release_fn()
+        return unloaded
+
+    def total_mb(self):
+        return sum(size_mb for _, size_mb in self.models.values())
+
+    def stats(self):
+        """Returns pool hit/miss statistics and the resident models."""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "budget_mb": self.budget_mb,
+                "resident_mb": round(self.total_mb(), 1),
+                "models": {size: round(size_mb, 1) for size, (_, size_mb) in self.models.items()}
+            }
+
 class PythonBridge:
     def __init__(self):
         self.running = True
         self.current_task = None
+        self.model_pool = WhisperModelPool() if MAIN_MODULE_AVAILABLE else None
+        self.stage_cache = StageCache() if MAIN_MODULE_AVAILABLE else None
+        self.output_lock = threading.Lock()
+        self.startup_seconds = None
+        self.warmup = {"state": "idle"}
         
     def send_message(self, message):
         """Send a JSON message to Electron via stdout"""
         try:
-            print(json.dumps(message), flush=True)
+            # Batch stages report from several threads; keep each JSON line whole
+            with self.output_lock:
+                print(json.dumps(message), flush=True)
         except Exception as e:
             print(f"Error sending message: {e}", file=sys.stderr)
     
@@ -54,14 +170,16 @@ class PythonBridge:
         }
         self.send_message(response)
     
-    def send_progress(self, request_id, progress, message=""):
-        """Send progress update for a long-running task"""
+    def send_progress(self, request_id, progress, message="", data=None):
+        """Send progress update for a long-running task (with optional data, e.g. an intermediate output)"""
         progress_msg = {
             "type": "progress",
             "id": request_id,
             "progress": progress,
             "message": message
         }
+        if data is not None:
+            progress_msg["data"] = data
         self.send_message(progress_msg)
     
     def send_log(self, level, message):
@@ -96,25 +214,35 @@ class PythonBridge:
             os.makedirs(output_dir, exist_ok=True)
             
             self.send_progress(request_id, 5, "Starting audio processing...")
+            # Opt-in profiling: true for every mode, or a list / comma-separated string of modes
+            metrics = JobMetrics(profile=parse_profile_modes(options.get("profile")))
             
             # Step 1: Download from YouTube if URL provided
             if youtube_url:
                 self.send_progress(request_id, 10, "Downloading audio from YouTube...")
                 try:
-                    download_result = download_audio_from_youtube(youtube_url, output_dir)
-                    # The function returns a tuple (audio_file, video_id), we need just the file path
-                    if isinstance(download_result, tuple):
-                        input_file, video_id = download_result
-                    else:
-                        input_file = download_result
+                    with metrics.stage("download") as counters:
+                        download_result = download_audio_from_youtube(youtube_url, output_dir)
+                        # The function returns a tuple (audio_file, video_id), we need just the file path
+                        if isinstance(download_result, tuple):
+                            input_file, video_id = download_result
+                        else:
+                            input_file = download_result
+                        counters["bytes"] = os.path.getsize(input_file)
                     self.send_progress(request_id, 20, f"Downloaded: {os.path.basename(input_file)}")
                 except Exception as e:
                     raise Exception(f"YouTube download failed: {str(e)}")
             
+            # Stage outputs are reused from the content-addressed cache unless disabled
+            stage_cache = self.stage_cache if options.get("use_cache", False) or options.get("cache_segments", False) else None
+            base_name = os.path.splitext(os.path.basename(input_file))[0]
+
             # Step 2: Separate vocals
             self.send_progress(request_id, 25, "Separating vocals from instrumental...")
             try:
-                vocal_path, instrumental_path = separate_vocals(input_file, output_dir)
+                with metrics.stage("separate", stage_cache, "stems"):
+                    vocal_path, instrumental_path, stems_key = separate_vocals_cached(input_file, output_dir, stage_cache)
+                metrics.audio_seconds = get_audio_duration(vocal_path)
                 self.send_progress(request_id, 45, "Vocal separation completed")
             except Exception as e:
                 raise Exception(f"Vocal separation failed: {str(e)}")
@@ -124,7 +252,9 @@ class PythonBridge:
                 self.send_progress(request_id, 50, "Enhancing instrumental track...")
                 try:
                     enhanced_path = os.path.join(output_dir, "instrumental_enhanced.wav")
-                    instrumental_path = enhance_instrumental_chunked(instrumental_path, enhanced_path)
+                    with metrics.stage("enhance", stage_cache, "enhanced") as counters:
+                        instrumental_path = enhance_cached(instrumental_path, enhanced_path, stems_key, stage_cache)
+                        counters.update(enhancement_stats)
                     self.send_progress(request_id, 60, "Instrumental enhancement completed")
                 except Exception as e:
                     self.send_log("warning", f"Instrumental enhancement failed: {str(e)}")
@@ -133,29 +263,86 @@ class PythonBridge:
             # Step 4: Transcribe vocals
             self.send_progress(request_id, 65, "Transcribing vocals...")
             try:
-                base_name = os.path.splitext(os.path.basename(input_file))[0]
                 transcription_path = os.path.join(output_dir, f"{base_name}_transcription.json")
-                transcribe_and_save(vocal_path, transcription_path, options.get("whisper_model", "medium"))
+                model_size = options.get("whisper_model", "medium")
+                transcription_workers = options.get("transcription_workers", 1)
+                with metrics.stage("transcribe", stage_cache, "transcription") as counters:
+                    # Chunked transcription loads one model per worker process instead of using the pool
+                    with self.model_pool.checkout(model_size) if transcription_workers <= 1 else nullcontext() as model:
+                        transcribe_cached(vocal_path, transcription_path, stems_key, stage_cache, model_size,
+                                          model=model, workers=transcription_workers)
+                    vad_stats = dict(transcription_stats)
+                    counters.update(vad_stats)
                 self.send_progress(request_id, 80, "Transcription completed")
             except Exception as e:
                 raise Exception(f"Transcription failed: {str(e)}")
             
-            # Step 5: Create karaoke video
-            self.send_progress(request_id, 85, "Creating karaoke video...")
-            try:
-                output_video = os.path.join(output_dir, f"{base_name}_karaoke.mp4")
-                create_karaoke_video_from_json(instrumental_path, transcription_path, output_video)
-                self.send_progress(request_id, 100, "Karaoke video created successfully!")
-            except Exception as e:
-                raise Exception(f"Video creation failed: {str(e)}")
+            # Step 5: Create karaoke video (optionally a quick preview first)
+            output_video = os.path.join(output_dir, f"{base_name}_karaoke.mp4")
+            preview_video = None
+            full_render = None
+            render_options = {
+                "variable_frame_rate": options.get("variable_frame_rate", False),
+                "render_workers": options.get("render_workers", 1),
+                "writer_backend": options.get("writer_backend", "ffmpeg"),
+                "profile_frames": "frames" in metrics.profile,
+                # "auto", an x264 profile name, or null for the plain preset
+                "encoding_profile": options.get("encoding_profile", "auto"),
+                "stage_cache": stage_cache,
+                # Store the video as cached segments, so only changed segments are rendered again after transcript edits
+                "cache_segments": options.get("cache_segments", False)
+            }
+            # "burn" or "soft": the lyrics become an ASS karaoke script rendered by ffmpeg/libass (no preview needed)
+            ass_subtitles = options.get("ass_subtitles")
+            preview_only = options.get("preview_only", False) and not ass_subtitles
+            if (options.get("preview", False) or preview_only) and not ass_subtitles:
+                self.send_progress(request_id, 82, "Creating preview...")
+                try:
+                    preview_video = os.path.join(output_dir, f"{base_name}_karaoke{PREVIEW_SUFFIX}.mp4")
+                    with metrics.stage("preview") as counters:
+                        full_render = create_karaoke_preview(instrumental_path, transcription_path, preview_video,
+                                                             None if preview_only else output_video, **render_options)
+                        counters.update(preview_stats)
+                    # The preview can be shown while the full-quality render continues
+                    self.send_progress(request_id, 100 if preview_only else 85, "Preview ready", data={"preview_video": preview_video})
+                except Exception as e:
+                    raise Exception(f"Preview creation failed: {str(e)}")
+            
+            if not preview_only:
+                self.send_progress(request_id, 85, "Creating karaoke video...")
+                try:
+                    with metrics.stage("render") as counters:
+                        if ass_subtitles:
+                            output_video = create_karaoke_video_ass(instrumental_path, transcription_path, output_video,
+                                                                    mode=ass_subtitles, stage_cache=stage_cache,
+                                                                    encoding_profile=render_options["encoding_profile"])
+                        elif full_render:
+                            full_render.result()
+                        else:
+                            create_karaoke_video_from_json(instrumental_path, transcription_path, output_video, **render_options)
+                        counters.update(render_stats)
+                    self.send_progress(request_id, 100, "Karaoke video created successfully!")
+                except Exception as e:
+                    raise Exception(f"Video creation failed: {str(e)}")
+            else:
+                output_video = None
+            
+            # Per-stage metrics are written next to the outputs and returned with them
+            metrics_path = os.path.join(output_dir, f"{base_name}{METRICS_SUFFIX}")
             
             # Return success response
             result = {
                 "output_video": output_video,
+                "preview_video": preview_video,
                 "vocal_track": vocal_path,
                 "instrumental_track": instrumental_path,
-                "transcription": transcription_path
+                "transcription": transcription_path,
+                "transcription_stats": vad_stats,
+                "metrics": metrics.save(metrics_path),
+                "metrics_path": metrics_path
             }
+            if metrics.profile:
+                result["profile_files"] = metrics.dump_profiles(os.path.join(output_dir, f"{base_name}{PROFILE_SUFFIX}"))
             
             self.send_response(request_id, True, result)
             
@@ -163,6 +350,111 @@ class PythonBridge:
             self.send_log("error", f"Audio processing failed: {str(e)}")
             self.send_response(request_id, False, error=str(e))
     
+    def process_batch_task(self, request_id, data):
+        """Process many songs as a stage pipeline (song N+1 separates while song N renders)"""
+        try:
+            if not MAIN_MODULE_AVAILABLE:
+                raise Exception("Main processing module not available")
+            
+            # Songs come as a list of paths/URLs, or as a directory / list file
+            inputs = data.get("inputs") or []
+            if data.get("input_path"):
+                inputs = inputs + collect_batch_inputs(data["input_path"])
+            if not inputs:
+                raise ValueError("Either inputs or input_path must be provided")
+            options = data.get("options", {})
+            
+            stages = ["download", "separate", "transcribe", "enhance", "render"]
+            total_steps = len(inputs) * len(stages)
+            finished_steps = [0]
+            progress_lock = threading.Lock()
+            
+            def on_event(job, stage, status):
+                if status == "started":
+                    return
+                if status == "failed":
+                    self.send_log("error", f"{job['input']}: {job['error']}")
+                with progress_lock:
+                    # A failed song skips its remaining stages, which count as finished
+                    finished_steps[0] += 1 if status == "done" else len(stages) - stages.index(stage)
+                    progress = int(100 * finished_steps[0] / total_steps)
+                self.send_progress(request_id, progress, f"{os.path.basename(job['input'])}: {stage} {status}")
+            
+            self.send_progress(request_id, 0, f"Starting batch of {len(inputs)} songs...")
+            jobs = run_batch(
+                inputs,
+                output_dir=data.get("output_dir"),
+                stage_cache=self.stage_cache if options.get("use_cache", False) or options.get("cache_segments", False) else None,
+                model_size=options.get("whisper_model", "medium"),
+                checkout_whisper_model=self.model_pool.checkout,
+                enhance=options.get("enhance_instrumental", False),
+                variable_frame_rate=options.get("variable_frame_rate", False),
+                render_workers=options.get("render_workers", 1),
+                writer_backend=options.get("writer_backend", "ffmpeg"),
+                stage_limits=options.get("stage_limits"),
+                on_event=on_event,
+                transcription_workers=options.get("transcription_workers", 1),
+                profile=parse_profile_modes(options.get("profile")),
+                encoding_profile=options.get("encoding_profile", "auto"),
+                ass_subtitles=options.get("ass_subtitles"),
+                cache_segments=options.get("cache_segments", False)
+            )
+            
+            songs = [{
+                "input": job["input"],
+                "status": job["status"],
+                "output_video": job.get("output_video"),
+                "transcription": job.get("transcription_path"),
+                "transcription_stats": job.get("transcription_stats"),
+                "error": job.get("error"),
+                "stage_seconds": job["stage_seconds"],
+                "metrics": job.get("metrics"),
+                "metrics_path": job.get("metrics_path"),
+                "profile_files": job.get("profile_files")
+            } for job in jobs]
+            self.send_response(request_id, True, {
+                "songs": songs,
+                "completed": sum(1 for song in songs if song["status"] == "done"),
+                "failed": sum(1 for song in songs if song["status"] == "failed")
+            })
+            
+        except Exception as e:
+            self.send_log("error", f"Batch processing failed: {str(e)}")
+            self.send_response(request_id, False, error=str(e))
+    
+    def warmup_task(self, request_id, data):
+        """Preload stage dependencies (and optionally models) so the next job starts warm"""
+        try:
+            if not MAIN_MODULE_AVAILABLE:
+                raise Exception("Main processing module not available")
+            
+            self.warmup = {"state": "running"}
+            start_time = time.time()
+            result = {"import_seconds": warm_up(data["stages"]) if data.get("stages") else warm_up()}
+            if data.get("whisper_model"):
+                self.model_pool.get(data["whisper_model"])
+                result["whisper_model"] = data["whisper_model"]
+            if data.get("demucs"):
+                get_demucs_model(DEMUCS_MODEL)
+                result["demucs_model"] = DEMUCS_MODEL
+            result["seconds"] = round(time.time() - start_time, 2)
+            self.warmup = dict(result, state="done")
+            self.send_log("info", f"Warm-up finished in {result['seconds']}s")
+            if request_id is not None:
+                self.send_response(request_id, True, result)
+            
+        except Exception as e:
+            self.warmup = {"state": "failed", "error": str(e)}
+            self.send_log("warning", f"Warm-up failed: {str(e)}")
+            if request_id is not None:
+                self.send_response(request_id, False, error=str(e))
+    
+    def start_warmup(self, request_id=None, data=None):
+        """Run warmup_task in a background thread; requests are served meanwhile"""
+        thread = threading.Thread(target=self.warmup_task, args=(request_id, data or {}), daemon=True)
+        thread.start()
+        return thread
+    
     def handle_request(self, request):
         """Handle incoming request from Electron"""
         try:
@@ -180,6 +472,18 @@ class PythonBridge:
                 thread.start()
                 self.current_task = thread
                 
+            elif request_type == "process_batch":
+                thread = threading.Thread(
+                    target=self.process_batch_task,
+                    args=(request_id, data),
+                    daemon=True
+                )
+                thread.start()
+                self.current_task = thread
+                
+            elif request_type == "warmup":
+                self.start_warmup(request_id, data)
+                
             elif request_type == "ping":
                 self.send_response(request_id, True, {"message": "pong"})
                 
@@ -188,9 +492,27 @@ class PythonBridge:
                     "main_module_available": MAIN_MODULE_AVAILABLE,
                     "current_task_running": self.current_task and self.current_task.is_alive(),
                     "python_version": sys.version,
-                    "working_directory": os.getcwd()
+                    "working_directory": os.getcwd(),
+                    "model_pool": self.model_pool.stats() if self.model_pool else None,
+                    "stage_cache": self.stage_cache.stats() if self.stage_cache else None,
+                    "startup_seconds": self.startup_seconds,
+                    "warmup": self.warmup,
+                    "loaded_dependencies": [name for name in ("torch", "whisper", "demucs", "noisereduce", "moviepy", "yt_dlp")
+                                            if name in sys.modules]
                 }
                 self.send_response(request_id, True, status)
+
+            elif request_type == "unload_models":
+                if not self.model_pool:
+                    raise Exception("Main processing module not available")
+                unloaded = self.model_pool.unload(data.get("model_size"))
+                # Without a specific Whisper size, the warm Demucs models are released as well
+                unloaded_demucs = [] if data.get("model_size") else unload_demucs_models()
+                self.send_response(request_id, True, {
+                    "unloaded": unloaded,
+                    "unloaded_demucs": unloaded_demucs,
+                    "model_pool": self.model_pool.stats()
+                })
                 
             elif request_type == "stop":
                 self.running = False
@@ -206,7 +528,10 @@ class PythonBridge:
     
     def run(self):
         """Main loop - listen for messages from Electron"""
-        self.send_log("info", "Python bridge started")
+        self.startup_seconds = round(time.time() - BRIDGE_START_TIME, 3)
+        self.send_log("info", f"Python bridge started in {self.startup_seconds}s")
+        if WARMUP_ON_START and MAIN_MODULE_AVAILABLE:
+            self.start_warmup(data={"whisper_model": WARMUP_WHISPER_MODEL})
         
         try:
             while self.running:
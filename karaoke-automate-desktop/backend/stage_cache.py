@@ -0,0 +1,156 @@
+"""
+Content-addressed stage cache for Karaoke Automate
+Reuses stems, transcriptions and enhanced audio across runs, keyed by input content and stage parameters
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+# Cache location and size cap; override with KARAOKE_CACHE_DIR / KARAOKE_CACHE_MAX_GB
+STAGE_CACHE_DIR = os.environ.get("KARAOKE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "karaoke-automate"))
+STAGE_CACHE_MAX_GB = float(os.environ.get("KARAOKE_CACHE_MAX_GB", "5"))
+
+_digest_memo = {} # (path, size, mtime_ns) -> sha256 hex digest
+_digest_lock = threading.Lock()
+
+def file_digest(path, block_size=1024 * 1024):
+    """Returns the SHA-256 of a file's bytes (memoized while the file's size and mtime are unchanged)."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        if memo_key in _digest_memo:
+            return _digest_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    hex_digest = digest.hexdigest()
+    with _digest_lock:
+        _digest_memo[memo_key] = hex_digest
+    return hex_digest
+
+def cache_key(stage, *inputs, **params):
+    """Builds a cache key from a stage name, upstream digests/keys and the stage parameters."""
+    payload = json.dumps({"stage": stage, "inputs": inputs, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """
+    Stores stage outputs under <cache_dir>/<stage>/<key>/ and restores them by copying into place.
+    Entries are evicted least-recently-used first once the cache exceeds max_bytes. Access times live
+    on the entry directories themselves, so several processes can share one cache directory.
+    """
+    def __init__(self, cache_dir=STAGE_CACHE_DIR, max_gb=STAGE_CACHE_MAX_GB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def _entry_dir(self, stage, key):
+        return os.path.join(self.cache_dir, stage, key)
+
+    def _count(self, counter, stage):
+        with self.lock:
+            counter[stage] = counter.get(stage, 0) + 1
+
+    def restore(self, stage, key, outputs):
+        """Copies a cached entry to 'outputs' (name -> destination path). Returns True on a hit."""
+        entry_dir = self._entry_dir(stage, key)
+        cached_files = {name: os.path.join(entry_dir, name) for name in outputs}
+        if not all(os.path.isfile(path) for path in cached_files.values()):
+            self._count(self.misses, stage)
+            return False
+
+        try:
+            for name, dest_path in outputs.items():
+                os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+                shutil.copyfile(cached_files[name], dest_path)
+            os.utime(entry_dir) # Mark as recently used
+        except OSError as e:
+            # Evicted by another process mid-copy - treat as a miss
+            print(f"Warning: Could not restore cached {stage} entry: {e}")
+            self._count(self.misses, stage)
+            return False
+        self._count(self.hits, stage)
+        print(f"Stage cache hit: {stage} ({key[:12]})")
+        return True
+
+    def contains(self, stage, key):
+        """Returns True if an entry exists (without restoring it or counting a hit or miss)."""
+        return os.path.isdir(self._entry_dir(stage, key))
+
+    def store(self, stage, key, outputs, evict=True):
+        """
+        Copies 'outputs' (name -> source path) into the cache as one entry, then enforces the size cap
+        (callers storing many entries pass evict=False and call evict() once afterwards).
+        """
+        entry_dir = self._entry_dir(stage, key)
+        if os.path.isdir(entry_dir):
+            return
+        # Build the entry in a temporary directory and rename it, so readers never see partial entries
+        temp_dir = os.path.join(self.cache_dir, stage, f".tmp-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(temp_dir)
+            for name, source_path in outputs.items():
+                shutil.copyfile(source_path, os.path.join(temp_dir, name))
+            os.replace(temp_dir, entry_dir)
+        except OSError as e:
+            print(f"Warning: Could not store {stage} output in the stage cache: {e}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+        if evict:
+            self.evict()
+
+    def _entries(self):
+        """Returns [(last_access, size_bytes, entry_dir)] for every complete cache entry."""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for stage in os.listdir(self.cache_dir):
+            stage_dir = os.path.join(self.cache_dir, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for key in os.listdir(stage_dir):
+                entry_dir = os.path.join(stage_dir, key)
+                if key.startswith(".tmp-") or not os.path.isdir(entry_dir):
+                    continue
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                    entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+                except OSError:
+                    continue # Removed concurrently
+        return entries
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits within max_bytes."""
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_bytes -= size
+            with self.lock:
+                self.evictions += 1
+
+    def stats(self):
+        """Returns hit/miss counts per stage and the on-disk size of the cache."""
+        entries = self._entries()
+        with self.lock:
+            return {
+                "cache_dir": self.cache_dir,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "size_mb": round(sum(size for _, size, _ in entries) / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1)
+            }
@@ -0,0 +1,275 @@
+"""
+Per-stage metrics for Karaoke Automate
+Records wall time, CPU time, peak memory, real-time factor and stage counters for every stage of a job,
+plus opt-in cProfile/tracemalloc profiles and per-frame render timing histograms
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+RSS_SAMPLE_SECONDS = 0.05 # How often a stage's resident memory is sampled (Linux)
+PROFILE_MODES = ('cpu', 'memory', 'frames') # cProfile per stage, tracemalloc per stage, per-frame render timings
+PROFILE_TOP_ENTRIES = 40 # Functions / allocation sites listed in the text profile summaries
+FRAME_TIMING_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500) # Upper edges of the frame timing histogram buckets
+
+# Only one cProfile profiler can be active at a time on newer Pythons, so concurrent stages (batch mode)
+# skip CPU profiling while another stage holds it
+_cpu_profile_lock = threading.Lock()
+# tracemalloc is process-wide: started by the first memory-profiled stage and stopped after the last one
+_memory_profile_lock = threading.Lock()
+_memory_profiled_stages = 0
+_memory_tracing_owned = False
+
+def _current_rss_bytes():
+    """Returns this process's resident set size from /proc (Linux), or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _process_peak_rss_bytes():
+    """Returns the process's lifetime peak RSS from getrusage (None on Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # macOS reports bytes, Linux kilobytes
+
+def parse_profile_modes(value):
+    """
+    Returns the profiling modes selected by a CLI/bridge value: True or 'all' selects every mode, a
+    comma-separated string or a list selects some of PROFILE_MODES, and None/False/'' selects none.
+    """
+    if not value:
+        return frozenset()
+    if value is True or value == 'all':
+        return frozenset(PROFILE_MODES)
+    modes = value.split(',') if isinstance(value, str) else list(value)
+    modes = frozenset(mode.strip() for mode in modes if mode.strip())
+    unknown = modes - set(PROFILE_MODES)
+    if unknown:
+        raise ValueError(f"Unknown profiling mode(s): {', '.join(sorted(unknown))} (expected {', '.join(PROFILE_MODES)} or 'all')")
+    return modes
+
+def summarize_frame_timings(timings):
+    """Returns percentiles and a histogram (in ms) of per-frame render durations given in seconds."""
+    if not len(timings):
+        return {'frames': 0}
+    timings_ms = np.asarray(timings, dtype=np.float64) * 1000
+    counts = np.bincount(np.searchsorted(FRAME_TIMING_BUCKETS_MS, timings_ms, side='right'), minlength=len(FRAME_TIMING_BUCKETS_MS) + 1)
+    labels = [f"<{FRAME_TIMING_BUCKETS_MS[0]}"]
+    labels += [f"{low}-{high}" for low, high in zip(FRAME_TIMING_BUCKETS_MS, FRAME_TIMING_BUCKETS_MS[1:])]
+    labels.append(f"{FRAME_TIMING_BUCKETS_MS[-1]}+")
+    p50, p90, p99 = np.percentile(timings_ms, [50, 90, 99])
+    return {
+        'frames': len(timings_ms),
+        'mean_ms': round(float(timings_ms.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p90_ms': round(float(p90), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(timings_ms.max()), 3),
+        'histogram_ms': dict(zip(labels, counts.tolist()))
+    }
+
+def _start_memory_profiling():
+    global _memory_profiled_stages, _memory_tracing_owned
+    with _memory_profile_lock:
+        if _memory_profiled_stages == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory_tracing_owned = True
+        _memory_profiled_stages += 1
+        tracemalloc.reset_peak()
+
+def _stop_memory_profiling():
+    """Returns (traced peak bytes, top allocation sites as text) for the stage that is ending."""
+    global _memory_profiled_stages, _memory_tracing_owned
+    with _memory_profile_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        top_stats = tracemalloc.take_snapshot().statistics('lineno')[:PROFILE_TOP_ENTRIES]
+        _memory_profiled_stages -= 1
+        if _memory_profiled_stages == 0 and _memory_tracing_owned:
+            tracemalloc.stop()
+            _memory_tracing_owned = False
+    lines = [f"Traced peak: {peak / (1024 * 1024):.1f} MB", f"Top {len(top_stats)} allocation sites still held at the end of the stage:"]
+    lines += [str(stat) for stat in top_stats]
+    return peak, "\n".join(lines) + "\n"
+
+def _child_cpu_seconds():
+    """CPU time of finished child processes (ffmpeg, worker pools); Windows does not report it."""
+    if os.name == 'nt':
+        return None
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class _PeakRssSampler:
+    """Samples the process RSS on a background thread and keeps the maximum seen while running."""
+
+    def __init__(self):
+        self.peak = _current_rss_bytes()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, _current_rss_bytes() or 0)
+
+    def stop(self):
+        """Stops sampling and returns the peak RSS in bytes (None if sampling is unavailable)."""
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss_bytes() or 0)
+        return self.peak
+
+
+class JobMetrics:
+    """
+    Collects metrics for the stages of one job (one song).
+
+    Each 'with metrics.stage(name) as counters:' block records wall time, CPU time of this process and of
+    child processes that finished during the stage (e.g. the ffmpeg encoder and worker pools), and peak
+    RSS. On Linux the peak is sampled during the stage; elsewhere it is the process's peak so far.
+    Stage code adds its own counters to the yielded dict; a 'frames' counter also yields frames_per_second.
+    Real-time factors (processing seconds per second of audio) are filled in once audio_seconds is known.
+
+    With 'cpu' in profile, each stage also runs under cProfile; with 'memory', under tracemalloc (adding
+    its traced peak to the record). dump_profiles() writes them out. The 'frames' mode is read by the
+    caller, which asks the renderer for per-frame timings. Without a profile nothing extra runs.
+
+    CPU time, RSS and traced memory are process-wide, so stages of other songs running at the same
+    time (batch mode) are included in them.
+    """
+
+    def __init__(self, audio_seconds=None, profile=()):
+        self.audio_seconds = audio_seconds
+        self.profile = frozenset(profile)
+        self.stages = {}
+        self.profiles = {} # stage name -> {'cpu': cProfile.Profile, 'memory': text summary}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, stage_cache=None, cache_stage=None):
+        """
+        Measures the enclosed block as stage 'name'. With a stage_cache, records whether the block
+        restored 'cache_stage' (default: name) from the cache as the 'cache_hit' counter.
+        """
+        cache_stage = cache_stage or name
+        counters = {}
+        hits_before = stage_cache.hits.get(cache_stage, 0) if stage_cache else None
+        sampler = _PeakRssSampler()
+        profiler = None
+        if 'cpu' in self.profile and _cpu_profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        profile_memory = 'memory' in self.profile
+        if profile_memory:
+            _start_memory_profiling()
+        child_cpu_before = _child_cpu_seconds()
+        cpu_before = time.process_time()
+        start_time = time.time()
+        failed = False
+        if profiler:
+            profiler.enable()
+        try:
+            yield counters
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+                _cpu_profile_lock.release()
+            wall_seconds = time.time() - start_time
+            cpu_seconds = time.process_time() - cpu_before
+            child_cpu_after = _child_cpu_seconds()
+            peak_rss = sampler.stop()
+            if peak_rss is None:
+                peak_rss = _process_peak_rss_bytes()
+            if stage_cache:
+                counters['cache_hit'] = stage_cache.hits.get(cache_stage, 0) > hits_before
+            if 'frames' in counters and wall_seconds > 0:
+                counters['frames_per_second'] = round(counters['frames'] / wall_seconds, 1)
+            record = {
+                'wall_seconds': round(wall_seconds, 3),
+                'cpu_seconds': round(cpu_seconds, 3),
+                'child_cpu_seconds': round(child_cpu_after - child_cpu_before, 3) if child_cpu_before is not None else None,
+                'peak_rss_mb': round(peak_rss / (1024 * 1024), 1) if peak_rss is not None else None,
+                'counters': counters
+            }
+            if failed:
+                record['failed'] = True
+            stage_profiles = {}
+            if profiler:
+                stage_profiles['cpu'] = profiler
+            elif 'cpu' in self.profile:
+                record['cpu_profile_skipped'] = True # Another stage was being CPU-profiled at the same time
+            if profile_memory:
+                traced_peak, stage_profiles['memory'] = _stop_memory_profiling()
+                record['traced_peak_mb'] = round(traced_peak / (1024 * 1024), 1)
+            with self.lock:
+                self.stages[name] = record
+                if stage_profiles:
+                    self.profiles[name] = stage_profiles
+
+    def to_dict(self):
+        """Returns the metrics report: per-stage records plus job totals and real-time factors."""
+        with self.lock:
+            stages = {name: dict(record) for name, record in self.stages.items()}
+        total_wall = sum(record['wall_seconds'] for record in stages.values())
+        audio_seconds = self.audio_seconds
+        for record in stages.values():
+            record['real_time_factor'] = round(record['wall_seconds'] / audio_seconds, 3) if audio_seconds else None
+        return {
+            'audio_seconds': round(audio_seconds, 2) if audio_seconds else None,
+            'wall_seconds': round(total_wall, 3),
+            'cpu_seconds': round(sum(record['cpu_seconds'] for record in stages.values()), 3),
+            'real_time_factor': round(total_wall / audio_seconds, 3) if audio_seconds else None,
+            'stages': stages
+        }
+
+    def save(self, path):
+        """Writes the metrics report as JSON and returns it."""
+        report = self.to_dict()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def dump_profiles(self, path_prefix):
+        """
+        Writes the collected profiles as <path_prefix>_<stage>.prof (cProfile data, for pstats/snakeviz),
+        <path_prefix>_<stage>_cpu.txt (top functions by cumulative time) and <path_prefix>_<stage>_memory.txt.
+        Returns the written paths.
+        """
+        with self.lock:
+            profiles = {name: dict(stage_profiles) for name, stage_profiles in self.profiles.items()}
+        written = []
+        for name, stage_profiles in profiles.items():
+            if 'cpu' in stage_profiles:
+                profiler = stage_profiles['cpu']
+                profiler.dump_stats(f"{path_prefix}_{name}.prof")
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP_ENTRIES)
+                with open(f"{path_prefix}_{name}_cpu.txt", 'w', encoding='utf-8') as f:
+                    f.write(summary.getvalue())
+                written += [f"{path_prefix}_{name}.prof", f"{path_prefix}_{name}_cpu.txt"]
+            if 'memory' in stage_profiles:
+                with open(f"{path_prefix}_{name}_memory.txt", 'w', encoding='utf-8') as f:
+                    f.write(stage_profiles['memory'])
+                written.append(f"{path_prefix}_{name}_memory.txt")
+        return written
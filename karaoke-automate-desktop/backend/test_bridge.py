@@ -89,6 +89,1371 @@ def test_message_handling():
         print(f"✗ Message handling test failed: {e}")
         return False
 
+def test_model_pool():
+    """Test Whisper model pool hits, misses, LRU eviction and exclusive checkouts"""
+    print("\nTesting model pool...")
+    
+    try:
+        from python_bridge import WhisperModelPool
+        loaded = []
+        sizes = {"tiny": 100, "base": 200, "small": 500}
+        pool = WhisperModelPool(
+            budget_mb=750,
+            loader=lambda size: loaded.append(size) or f"model-{size}",
+            size_fn=lambda model: sizes[model.split("-")[1]],
+            release_fn=lambda: None
+        )
+        
+        pool.get("tiny")
+        pool.get("base")
+        pool.get("tiny")  # Hit - tiny becomes most recently used
+        pool.get("small")  # 800 MB > budget, evicts base (least recently used)
+        stats = pool.stats()
+        
+        if loaded != ["tiny", "base", "small"] or stats["hits"] != 1 or stats["misses"] != 3:
+            print(f"✗ Unexpected loads/stats: {loaded} {stats}")
+            return False
+        if set(stats["models"]) != {"tiny", "small"} or stats["evictions"] != 1:
+            print(f"✗ Expected base to be evicted: {stats}")
+            return False
+        print("✓ Least recently used model evicted over budget")
+        
+        if pool.unload() != ["tiny", "small"] or pool.stats()["models"]:
+            print("✗ unload did not empty the pool")
+            return False
+        print("✓ Models unloaded")
+        
+        # Two jobs on one model size take turns with the shared model; another size runs alongside
+        import threading
+        import time
+        active, overlaps = {}, []
+        lock = threading.Lock()
+        def job(size):
+            with pool.checkout(size) as model:
+                with lock:
+                    active[model] = active.get(model, 0) + 1
+                    overlaps.append(dict(active))
+                time.sleep(0.2)  # Transcribing
+                with lock:
+                    active[model] -= 1
+        threads = [threading.Thread(target=job, args=(size,)) for size in ("tiny", "tiny", "base")]
+        start_time = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if any(counts.get("model-tiny", 0) > 1 for counts in overlaps) or time.time() - start_time > 0.6:
+            print(f"✗ Concurrent jobs shared a model: {overlaps}")
+            return False
+        print("✓ Concurrent jobs check out a model exclusively")
+        return True
+    except Exception as e:
+        print(f"✗ Model pool test failed: {e}")
+        return False
+
+def test_stage_cache():
+    """Test stage cache store/restore and size-capped eviction"""
+    print("\nTesting stage cache...")
+    
+    try:
+        import tempfile
+        from stage_cache import StageCache, cache_key
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, "vocals.wav")
+            with open(source, "wb") as f:
+                f.write(b"x" * 1024)
+            cache = StageCache(os.path.join(temp_dir, "cache"), max_gb=1.5 / (1024 * 1024))  # ~1.5 KB
+            key_a = cache_key("stems", "digest-a", model="htdemucs")
+            key_b = cache_key("stems", "digest-b", model="htdemucs")
+            
+            restored = os.path.join(temp_dir, "out", "vocals.wav")
+            if cache.restore("stems", key_a, {"vocals.wav": restored}):
+                print("✗ Empty cache reported a hit")
+                return False
+            cache.store("stems", key_a, {"vocals.wav": source})
+            if not cache.restore("stems", key_a, {"vocals.wav": restored}) or os.path.getsize(restored) != 1024:
+                print("✗ Stored entry was not restored")
+                return False
+            print("✓ Entry stored and restored")
+            
+            cache.store("stems", key_b, {"vocals.wav": source})  # 2 KB > cap, evicts the older entry
+            stats = cache.stats()
+            if stats["entries"] != 1 or stats["evictions"] != 1 or stats["hits"] != {"stems": 1}:
+                print(f"✗ Unexpected cache stats: {stats}")
+                return False
+            print("✓ Oldest entry evicted over the size cap")
+        return True
+    except Exception as e:
+        print(f"✗ Stage cache test failed: {e}")
+        return False
+
+def test_stage_pipeline():
+    """Test that batch songs overlap across stages and failures stay per song"""
+    print("\nTesting batch stage pipeline...")
+    
+    try:
+        import threading
+        import time
+        from batch_pipeline import StagePipeline
+        active = {}
+        overlaps = []
+        lock = threading.Lock()
+        
+        def make_stage(name):
+            def stage(job):
+                if job["input"] == "bad" and name == "separate":
+                    raise RuntimeError("corrupt audio")
+                with lock:
+                    active[job["input"]] = name
+                    if len(set(active.values())) > 1:
+                        overlaps.append(dict(active))
+                time.sleep(0.05)
+                with lock:
+                    del active[job["input"]]
+                job.setdefault("done", []).append(name)
+            return stage
+        
+        names = ["separate", "transcribe", "render"]
+        pipeline = StagePipeline([(name, make_stage(name)) for name in names])
+        jobs = pipeline.run({"input": song} for song in ["a", "bad", "b", "c"])
+        
+        if [job["status"] for job in jobs] != ["done", "failed", "done", "done"]:
+            print(f"✗ Unexpected job statuses: {[job['status'] for job in jobs]}")
+            return False
+        if jobs[0]["done"] != names or "separate failed" not in jobs[1]["error"]:
+            print(f"✗ Unexpected job results: {jobs}")
+            return False
+        if not overlaps:
+            print("✗ Songs never occupied different stages at the same time")
+            return False
+        print("✓ Songs pipelined across stages, failed song isolated")
+        return True
+    except Exception as e:
+        print(f"✗ Stage pipeline test failed: {e}")
+        return False
+
+def test_cold_start():
+    """Measure bridge cold start and check heavy dependencies are not imported eagerly"""
+    print("\nTesting bridge cold start...")
+    
+    try:
+        import json
+        import subprocess
+        import time
+        bridge_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_bridge.py")
+        
+        start_time = time.time()
+        process = subprocess.Popen([sys.executable, bridge_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True)
+        process.stdin.write(json.dumps({"type": "ping", "id": "ping"}) + "\n")
+        process.stdin.write(json.dumps({"type": "get_status", "id": "status"}) + "\n")
+        process.stdin.flush()
+        
+        pong_seconds = None
+        status = None
+        for line in process.stdout:
+            if not line.startswith("{"):
+                continue  # Plain prints from the processing module
+            message = json.loads(line)
+            if message.get("id") == "ping":
+                pong_seconds = time.time() - start_time
+            elif message.get("id") == "status":
+                status = message["data"]
+                break
+        process.stdin.write(json.dumps({"type": "stop", "id": "stop"}) + "\n")
+        process.stdin.flush()
+        process.wait(timeout=30)
+        
+        if pong_seconds is None or status is None:
+            print("✗ Bridge did not answer ping/get_status")
+            return False
+        print(f"✓ Bridge answered ping {pong_seconds:.2f}s after launch (ready after {status['startup_seconds']}s)")
+        if status["main_module_available"] and status["loaded_dependencies"]:
+            print(f"✗ Heavy dependencies imported at startup: {status['loaded_dependencies']}")
+            return False
+        print("✓ No heavy dependencies imported at startup")
+        return True
+    except Exception as e:
+        print(f"✗ Cold start test failed: {e}")
+        return False
+
+def test_demucs_in_process():
+    """Test in-process Demucs separation writes its stems where the pipeline expects them"""
+    print("\nTesting in-process Demucs separation...")
+    
+    model_name = "toy-separator"
+    try:
+        import tempfile
+        import numpy as np
+        import soundfile as sf
+        import torch
+        import main
+        from benchmark_suite import make_synthetic_audio
+        from stage_cache import StageCache
+        
+        class ToySeparator(torch.nn.Module):
+            """Splits the mix into fixed fractions, so the expected stems are known exactly."""
+            samplerate, audio_channels, segment = 44100, 2, 1.0
+            sources = ["drums", "vocals", "other"]
+            def valid_length(self, length):
+                return length
+            def forward(self, mix):
+                return torch.stack([0.2 * mix, 0.5 * mix, 0.3 * mix], dim=1)
+        main._demucs_models[model_name] = ToySeparator().eval()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = make_synthetic_audio(os.path.join(temp_dir, "My Song.wav"), 3)
+            output_dir = os.path.join(temp_dir, "output_karaoke")
+            expected_paths = (os.path.join(output_dir, model_name, "My Song", "vocals.wav"),
+                              os.path.join(output_dir, model_name, "My Song", "no_vocals.wav"))
+            if main.get_stem_paths(input_path, output_dir, model_name) != expected_paths:
+                print(f"✗ Unexpected stem layout: {main.get_stem_paths(input_path, output_dir, model_name)}")
+                return False
+            if main.separate_vocals_in_process(input_path, output_dir, model_name) != expected_paths:
+                print("✗ In-process separation returned other paths than the CLI layout")
+                return False
+            mix, _ = sf.read(input_path, always_2d=True)
+            for stem_path in expected_paths:
+                info = sf.info(stem_path)
+                stem, _ = sf.read(stem_path, always_2d=True)
+                if (info.samplerate, info.channels, info.subtype) != (44100, 2, "PCM_16") or stem.shape != mix.shape:
+                    print(f"✗ Unexpected stem format: {info.samplerate} Hz, {info.channels} channels, {info.subtype}, {stem.shape}")
+                    return False
+                if np.abs(stem - 0.5 * mix).max() > 4 / 32768: # 16-bit quantization of normalized, summed stems
+                    print(f"✗ {os.path.basename(stem_path)} differs from the expected stem by {np.abs(stem - 0.5 * mix).max():.5f}")
+                    return False
+            print("✓ Stems written as 16-bit WAV in the Demucs CLI layout (output_dir/model/track/stem.wav)")
+            
+            # Restored from the stage cache into another output directory, the stems land in the same layout
+            cache = StageCache(os.path.join(temp_dir, "cache"))
+            stored = main.separate_vocals_cached(input_path, output_dir, cache, model_name)
+            other_dir = os.path.join(temp_dir, "other_output")
+            restored = main.separate_vocals_cached(input_path, other_dir, cache, model_name)
+            if stored[:2] != expected_paths or restored[:2] != main.get_stem_paths(input_path, other_dir, model_name) or stored[2] != restored[2]:
+                print(f"✗ Cached stems restored to unexpected paths: {restored}")
+                return False
+            if cache.stats()["hits"].get("stems") != 1 or not all(os.path.getsize(path) for path in restored[:2]):
+                print(f"✗ Stems not restored from the cache: {cache.stats()}")
+                return False
+            print("✓ Cached stems restored into the same layout")
+        return True
+    except Exception as e:
+        print(f"✗ In-process Demucs test failed: {e}")
+        return False
+    finally:
+        import main
+        main._demucs_models.pop(model_name, None)
+
+def test_overlap_add():
+    """Test that enhancement windows crossfade with weights summing to 1 and rebuild an unprocessed signal exactly"""
+    print("\nTesting overlap-add of enhancement windows...")
+    
+    try:
+        import numpy as np
+        import main
+        rng = np.random.RandomState(0)
+        # (samples, chunk, overlap): regular, shorter than one window, not a multiple of the chunk,
+        # no overlap, maximal overlap and a last chunk shorter than the overlap
+        cases = [(1000, 300, 50), (120, 300, 50), (999, 100, 10), (1000, 300, 0), (1000, 250, 125), (1010, 200, 60), (1, 300, 50)]
+        for num_frames, chunk_frames, overlap_frames in cases:
+            windows = main.split_into_windows(num_frames, chunk_frames, overlap_frames)
+            total = np.zeros(num_frames)
+            for window_idx, (start, end) in enumerate(windows):
+                total[start:end] += main.get_window_weights(windows, window_idx)
+            if not np.allclose(total, 1, atol=1e-6):
+                print(f"✗ Weights for {(num_frames, chunk_frames, overlap_frames)} sum to {total.min()}-{total.max()}")
+                return False
+            # Identity processing, streamed window by window as enhance_instrumental_chunked writes it
+            for signal in (rng.randn(num_frames).astype(np.float32), rng.randn(num_frames, 2).astype(np.float32)):
+                written, carry = [], None
+                for window_idx, (start, end) in enumerate(windows):
+                    final, carry = main.overlap_add_window(windows, window_idx, signal[start:end], carry)
+                    written.append(final)
+                rebuilt = np.concatenate(written)
+                if carry is not None or rebuilt.shape != signal.shape or np.abs(rebuilt - signal).max() > 1e-5:
+                    print(f"✗ Identity-processed signal not rebuilt for {(num_frames, chunk_frames, overlap_frames)}")
+                    return False
+        print(f"✓ Crossfade weights sum to 1 and identity processing rebuilds the signal ({len(cases)} window layouts, mono and stereo)")
+        return True
+    except Exception as e:
+        print(f"✗ Overlap-add test failed: {e}")
+        return False
+
+def test_streamed_enhancement():
+    """Test that enhancement streamed into the output file matches overlap-adding all windows in memory"""
+    print("\nTesting streamed enhancement output...")
+    
+    try:
+        import tempfile
+        import numpy as np
+        import soundfile as sf
+        import main
+        from benchmark_suite import make_synthetic_audio
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = make_synthetic_audio(os.path.join(temp_dir, "instrumental.wav"), 4.3, seed=2)
+            output_path = os.path.join(temp_dir, "enhanced.wav")
+            if main.enhance_instrumental_chunked(input_path, output_path, chunk_seconds=1, overlap_seconds=0.25, workers=1) != output_path:
+                print("✗ Enhancement failed")
+                return False
+            info, output_subtype = sf.info(input_path), sf.info(output_path).subtype
+            streamed, _ = sf.read(output_path, always_2d=True)
+            # Worker processes with a bounded number of windows ahead of the writer give the same file
+            parallel_path = os.path.join(temp_dir, "enhanced_parallel.wav")
+            if main.enhance_instrumental_chunked(input_path, parallel_path, chunk_seconds=1, overlap_seconds=0.25, workers=2) != parallel_path \
+                    or not np.array_equal(sf.read(parallel_path, always_2d=True)[0], streamed):
+                print("✗ Parallel enhancement differs from the single-process result")
+                return False
+            
+            # Reference: every window processed and overlap-added into one in-memory buffer
+            windows = main.split_into_windows(info.frames, info.samplerate, info.samplerate // 4)
+            expected = np.zeros((info.frames, info.channels))
+            for window_idx, (start, end) in enumerate(windows):
+                reduced = np.stack([main._reduce_noise_window(input_path, start, end, channel, info.samplerate) for channel in range(info.channels)], axis=1)
+                expected[start:end] += main.get_window_weights(windows, window_idx)[:, None] * reduced
+        if streamed.shape != expected.shape or output_subtype != info.subtype:
+            print(f"✗ Streamed output has shape {streamed.shape} ({output_subtype}), expected {expected.shape} ({info.subtype})")
+            return False
+        error = np.abs(streamed - expected).max()
+        if error > 2 / 32768: # 16-bit quantization of the written file
+            print(f"✗ Streamed samples differ from the in-memory result by {error:.6f}")
+            return False
+        print(f"✓ Streamed output matches the in-memory result ({len(windows)} windows, {streamed.shape[0]} frames, max difference {error * 32768:.2f} LSB)")
+        return True
+    except Exception as e:
+        print(f"✗ Streamed enhancement test failed: {e}")
+        return False
+
+def test_voice_activity():
+    """Test voiced-region detection and the timestamp remap back to the original timeline"""
+    print("\nTesting voice activity index...")
+    
+    try:
+        import numpy as np
+        from voice_activity import detect_voiced_regions, VoicedAudio
+        rate = 16000
+        samples = (np.random.RandomState(0).randn(rate * 60) * 0.001).astype(np.float32)  # Separation bleed
+        for start, end in [(5, 15), (15.4, 20), (40, 50)]:  # 0.4s pause inside the first region
+            samples[int(start * rate):int(end * rate)] += 0.2 * np.sin(np.arange(int((end - start) * rate)) * 0.1)
+        
+        regions = [(round(start / rate, 1), round(end / rate, 1)) for start, end in detect_voiced_regions(samples, rate)]
+        if regions != [(4.7, 20.3), (39.7, 50.3)]:
+            print(f"✗ Unexpected voiced regions: {regions}")
+            return False
+        print("✓ Voiced regions found, short pause kept, silence skipped")
+        
+        voiced = VoicedAudio(samples, rate, detect_voiced_regions(samples, rate), gap_seconds=0.5)
+        # Joined signal: region 1 is 0-15.6s, a 0.5s gap, then region 2 starts at 16.1s
+        mapped = [voiced.to_original(t) for t in (1.0, 15.8, 17.1)]
+        if any(abs(got - want) > 0.05 for got, want in zip(mapped, [5.7, 20.3, 40.7])) or abs(voiced.stats()["skipped_percent"] - 56) > 1:
+            print(f"✗ Unexpected remap/stats: {mapped} {voiced.stats()}")
+            return False
+        print("✓ Timestamps remapped to the original timeline")
+        
+        from voice_activity import split_regions_into_chunks
+        regions = [(0, 10), (20, 25), (30, 60), (70, 75), (80, 100)]
+        chunks = split_regions_into_chunks(regions, 3)
+        covering = split_regions_into_chunks(regions, 3, total_samples=120)
+        if chunks != [[(0, 10), (20, 25)], [(30, 60)], [(70, 75), (80, 100)]] or covering != [[(0, 27)], [(27, 65)], [(65, 120)]]:
+            print(f"✗ Unexpected chunks: {chunks} {covering}")
+            return False
+        print("✓ Regions grouped into balanced chunks split at silences")
+        return True
+    except Exception as e:
+        print(f"✗ Voice activity test failed: {e}")
+        return False
+
+def test_chunked_transcription_merge():
+    """Test that per-chunk transcriptions are merged in order on the original timeline"""
+    print("\nTesting chunked transcription merge...")
+    
+    try:
+        import numpy as np
+        from voice_activity import VoicedAudio
+        from main import merge_chunk_segments
+        rate = 1000
+        samples = np.zeros(30 * rate, dtype=np.float32)
+        # Chunk 1 joins 1-5s and 8-12s (0.5s gap), chunk 2 holds 20-25s
+        chunks = [VoicedAudio(samples, rate, [(1 * rate, 5 * rate), (8 * rate, 12 * rate)]),
+                  VoicedAudio(samples, rate, [(20 * rate, 25 * rate)])]
+        
+        def segment(text, words):
+            return {'text': text, 'start': words[0][1], 'end': words[-1][2],
+                    'words': [{'word': word, 'start': start, 'end': end} for word, start, end in words]}
+        chunk_segments = [
+            [segment("hello world", [("hello", 0.5, 1.5), ("world", 2.0, 3.5)]),
+             segment("second line", [("second", 5.0, 6.0), ("line", 6.5, 8.0)]),
+             segment("second line", [("second", 8.6, 8.8), ("line", 8.8, 9.0)])], # Past the chunk's 8.5s of audio
+            [segment("last words", [("last", 1.0, 2.0), ("words", 2.5, 4.0)])]
+        ]
+        merged = merge_chunk_segments(chunk_segments, chunks)
+        
+        texts = [seg['text'] for seg in merged]
+        if texts != ["hello world", "second line", "last words"]:
+            print(f"✗ Unexpected merged segments: {texts}")
+            return False
+        print("✓ Segments merged in chunk order without duplicates at the chunk edge")
+        
+        timings = [(word['start'], word['end']) for seg in merged for word in seg['words']]
+        expected = [(1.5, 2.5), (3.0, 4.5), (8.5, 9.5), (10.0, 11.5), (21.0, 22.0), (22.5, 24.0)]
+        spans = [(seg['start'], seg['end']) for seg in merged]
+        if (any(abs(a - b) > 1e-6 for got, want in zip(timings, expected) for a, b in zip(got, want)) or len(timings) != len(expected)
+                or any(abs(a - b) > 1e-6 for got, want in zip(spans, [(1.5, 4.5), (8.5, 11.5), (21.0, 24.0)]) for a, b in zip(got, want))):
+            print(f"✗ Unexpected merged timings: {spans} {timings}")
+            return False
+        print("✓ Chunk-local times moved back to song time")
+        return True
+    except Exception as e:
+        print(f"✗ Chunked transcription merge test failed: {e}")
+        return False
+
+def test_quantized_whisper():
+    """Test int8 model names and dynamic quantization of Whisper's linear layers"""
+    print("\nTesting int8 Whisper quantization...")
+    
+    try:
+        import torch
+        from whisper.model import Whisper, ModelDimensions
+        from main import parse_whisper_model_name, quantize_whisper_model, get_model_size_mb
+        if parse_whisper_model_name("medium-int8") != ("medium", True) or parse_whisper_model_name("medium") != ("medium", False):
+            print("✗ Unexpected model name parsing")
+            return False
+        print("✓ '-int8' model names parsed")
+        
+        torch.manual_seed(0)
+        dims = ModelDimensions(n_mels=80, n_audio_ctx=150, n_audio_state=64, n_audio_head=4, n_audio_layer=2,
+                               n_vocab=51865, n_text_ctx=32, n_text_state=64, n_text_head=4, n_text_layer=2)
+        model = Whisper(dims).eval()
+        mel = torch.randn(1, 80, 300)
+        with torch.no_grad():
+            float_features = model.encoder(mel)
+        float_mb = get_model_size_mb(model)
+        quantized = quantize_whisper_model(model)
+        with torch.no_grad():
+            int8_features = quantized.encoder(mel)
+        float_linears = [m for m in quantized.modules() if isinstance(m, torch.nn.Linear)]
+        error = (int8_features - float_features).norm() / float_features.norm()
+        if float_linears or error > 0.1:
+            print(f"✗ Unexpected quantized model: {len(float_linears)} float Linear layers left (relative error {error:.3f})")
+            return False
+        if get_model_size_mb(quantized) >= float_mb:
+            print("✗ Quantized model is not smaller")
+            return False
+        print(f"✓ Linear layers quantized to int8 (relative error {error:.3f}, {float_mb:.1f} -> {get_model_size_mb(quantized):.1f} MB)")
+        return True
+    except Exception as e:
+        print(f"✗ Quantization test failed: {e}")
+        return False
+
+def test_transcript_store():
+    """Test the binary transcript format round trip and JSON/binary loading"""
+    print("\nTesting binary transcript format...")
+    
+    deduplicate = None
+    try:
+        import json
+        import pickle
+        import tempfile
+        import time
+        from transcript_store import Transcript, load_transcript, save_binary_transcript, is_transcript_edited
+        sentences = [
+            {"words": [{"text": "la", "start": 1.0, "end": 1.25}, {"text": "la", "start": 1.25, "end": 1.5}], "start_time": 1.0, "end_time": 1.5},
+            {"words": [{"text": "café", "start": 2.0, "end": 2.75}], "start_time": 2.0, "end_time": 2.75}
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_path = os.path.join(temp_dir, "song_transcription.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(sentences, f)
+            binary_path = save_binary_transcript(json_path)
+            
+            transcript = load_transcript(json_path)
+            if transcript.path != os.path.abspath(binary_path) or transcript.strings != ["la", "café"]:
+                print(f"✗ Binary copy not used or strings not interned: {transcript.path} {transcript.strings}")
+                return False
+            exported = transcript.to_sentences()
+            if [s["full_text"] for s in exported] != ["la la", "café"] or exported[0]["words"][1] != sentences[0]["words"][1]:
+                print(f"✗ Unexpected JSON export: {exported}")
+                return False
+            if transcript.sentence_texts(0) != ("la", "la") or pickle.loads(pickle.dumps(transcript)).path != transcript.path:
+                print("✗ Unexpected sentence texts or pickling")
+                return False
+            print("✓ Binary transcript memory-mapped, exported back to JSON and pickled by path")
+            
+            os.utime(json_path, (time.time() + 10, time.time() + 10))  # Copied or synced, content unchanged
+            if load_transcript(json_path).path is None:
+                print("✗ Binary copy not used for a touched but unchanged JSON")
+                return False
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(sentences[:1], f)  # Hand-edited
+            if load_transcript(json_path).path is not None:
+                print("✗ Stale binary transcript was used")
+                return False
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(sentences, f)
+            print("✓ Edited JSON takes precedence over a stale binary copy; a touched one does not")
+            
+            # Times are stored exactly as in the JSON, so frames match the original renderer's
+            import main
+            import numpy as np
+            from benchmark_suite import make_synthetic_transcript, render_reference_frame, _install_transcript, _uninstall_transcript
+            deduplicate, main.DEDUPLICATE_FRAMES = main.DEDUPLICATE_FRAMES, False
+            for seed in (1, 2, 3):
+                song = make_synthetic_transcript(60, seed=seed)
+                song_path = os.path.join(temp_dir, f"song{seed}.ktr")
+                Transcript.from_sentences(song).save(song_path)
+                with Transcript.load(song_path) as mapped:
+                    exported = mapped.to_sentences()
+                    if [(s["start_time"], s["end_time"], s["words"]) for s in exported] != [(s["start_time"], s["end_time"], s["words"]) for s in song]:
+                        print(f"✗ Seed {seed}: stored times differ from the JSON")
+                        return False
+                    _install_transcript(mapped)
+                    for frame_idx in (256, 301, 690, 774, 838, 855, 1278, 1317, 1329):
+                        t = frame_idx / main.FPS
+                        if not np.array_equal(main.make_karaoke_frame_sentence(t), render_reference_frame(song, t)):
+                            print(f"✗ Seed {seed}, frame {frame_idx} differs from the original renderer")
+                            return False
+                    _uninstall_transcript()
+                    buffer = mapped._buffer
+                if not buffer.closed or mapped.word_start is not None:
+                    print("✗ Transcript memory map not closed")
+                    return False
+                Transcript.from_sentences(song[:1]).save(song_path)  # Replacing the file needs the map closed on Windows
+            print("✓ Stored times are exact; frames match the original renderer and the map closes")
+            
+            with open(binary_path, "r+b") as f:
+                f.seek(4)
+                f.write((1).to_bytes(2, "little"))  # An older format version
+            if load_transcript(json_path).path is not None:
+                print("✗ Outdated binary transcript format was used")
+                return False
+            os.utime(json_path, (os.path.getmtime(binary_path) + 60,) * 2)
+            if is_transcript_edited(json_path):
+                print("✗ JSON newer than an outdated binary copy counted as edited")
+                return False
+            with open(binary_path, "wb") as f:
+                f.write(b"KTR")  # Truncated
+            if is_transcript_edited(json_path):
+                print("✗ JSON next to a corrupt binary copy counted as edited")
+                return False
+            print("✓ Outdated binary format falls back to the JSON and does not mark it edited")
+            del transcript
+        return True
+    except Exception as e:
+        print(f"✗ Transcript store test failed: {e}")
+        return False
+    finally:
+        if deduplicate is not None:
+            main.DEDUPLICATE_FRAMES = deduplicate
+            _uninstall_transcript()
+
+def test_stage_metrics():
+    """Test per-stage metrics: timings, cache hits, frame rates, failures and real-time factors"""
+    print("\nTesting stage metrics...")
+    
+    try:
+        import json
+        import tempfile
+        import time
+        from stage_cache import StageCache
+        from stage_metrics import JobMetrics
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = StageCache(os.path.join(temp_dir, "cache"))
+            source_path = os.path.join(temp_dir, "stem.wav")
+            with open(source_path, "wb") as f:
+                f.write(b"audio")
+            cache.store("stems", "key", {"vocals.wav": source_path})
+            
+            metrics = JobMetrics()
+            with metrics.stage("separate", cache, "stems"):
+                cache.restore("stems", "key", {"vocals.wav": os.path.join(temp_dir, "restored.wav")})
+            with metrics.stage("render") as counters:
+                time.sleep(0.05)
+                counters["frames"] = 10
+            try:
+                with metrics.stage("enhance"):
+                    raise RuntimeError("noise reduction failed")
+            except RuntimeError:
+                pass
+            metrics.audio_seconds = 2.0
+            report = metrics.save(os.path.join(temp_dir, "song_metrics.json"))
+            with open(os.path.join(temp_dir, "song_metrics.json"), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        
+        stages = report["stages"]
+        if list(stages) != ["separate", "render", "enhance"] or saved != report:
+            print(f"✗ Unexpected stages or metrics file: {list(stages)}")
+            return False
+        render = stages["render"]
+        if not stages["separate"]["counters"]["cache_hit"] or not 0 < render["counters"]["frames_per_second"] <= 200:
+            print(f"✗ Unexpected counters: {stages['separate']['counters']} {render['counters']}")
+            return False
+        if not stages["enhance"].get("failed") or render["real_time_factor"] != round(render["wall_seconds"] / 2.0, 3):
+            print(f"✗ Unexpected failure flag or real-time factor: {stages}")
+            return False
+        if any(key not in render for key in ("cpu_seconds", "child_cpu_seconds", "peak_rss_mb")):
+            print(f"✗ Missing resource metrics: {render}")
+            return False
+        print(f"✓ Stage metrics recorded (render {render['wall_seconds']}s, peak RSS {render['peak_rss_mb']} MB, RTF {render['real_time_factor']})")
+        return True
+    except Exception as e:
+        print(f"✗ Stage metrics test failed: {e}")
+        return False
+
+def test_stage_profiling():
+    """Test opt-in stage profiles (cProfile, tracemalloc) and frame timing histograms"""
+    print("\nTesting stage profiling...")
+    
+    try:
+        import pstats
+        import tempfile
+        import tracemalloc
+        import main
+        from stage_metrics import JobMetrics, parse_profile_modes, summarize_frame_timings
+        if parse_profile_modes(None) or parse_profile_modes(True) != {"cpu", "memory", "frames"} or parse_profile_modes("cpu, frames") != {"cpu", "frames"}:
+            print("✗ Unexpected profiling modes")
+            return False
+        try:
+            parse_profile_modes("gpu")
+            print("✗ Unknown profiling mode was accepted")
+            return False
+        except ValueError:
+            pass
+        
+        # Off: the render loops call the frame function itself, and stages collect no profiles
+        if main.get_frame_function() is not main.make_karaoke_frame_sentence:
+            print("✗ Frame function is wrapped while profiling is off")
+            return False
+        unprofiled = JobMetrics()
+        with unprofiled.stage("render"):
+            pass
+        if unprofiled.profiles or "traced_peak_mb" in unprofiled.stages["render"]:
+            print("✗ Profiles collected while profiling is off")
+            return False
+        
+        metrics = JobMetrics(profile=parse_profile_modes("cpu,memory"))
+        with metrics.stage("transcribe"):
+            data = [bytearray(1024) for _ in range(1000)]
+            sum(len(chunk) for chunk in data)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            written = metrics.dump_profiles(os.path.join(temp_dir, "song_profile"))
+            names = sorted(os.path.basename(path) for path in written)
+            stats = pstats.Stats(os.path.join(temp_dir, "song_profile_transcribe.prof"))
+        if names != ["song_profile_transcribe.prof", "song_profile_transcribe_cpu.txt", "song_profile_transcribe_memory.txt"] or not stats.total_calls:
+            print(f"✗ Unexpected profile files: {names}")
+            return False
+        if metrics.stages["transcribe"]["traced_peak_mb"] < 0.9 or tracemalloc.is_tracing():
+            print(f"✗ Unexpected traced peak or tracing left on: {metrics.stages['transcribe']}")
+            return False
+        
+        timing = summarize_frame_timings([0.0005] * 90 + [0.004] * 9 + [0.3])
+        if timing["frames"] != 100 or timing["p50_ms"] != 0.5 or timing["max_ms"] != 300.0:
+            print(f"✗ Unexpected frame timing summary: {timing}")
+            return False
+        if timing["histogram_ms"]["<1"] != 90 or timing["histogram_ms"]["2-5"] != 9 or timing["histogram_ms"]["200-500"] != 1:
+            print(f"✗ Unexpected frame timing histogram: {timing['histogram_ms']}")
+            return False
+        print(f"✓ Stage profiles written ({len(written)} files) and frame timings summarized (p99 {timing['p99_ms']} ms)")
+        return True
+    except Exception as e:
+        print(f"✗ Stage profiling test failed: {e}")
+        return False
+
+def test_line_sprites():
+    """Test that the line sprite renderer draws exactly the pixels of the original per-word draw.text renderer"""
+    print("\nTesting line sprite rendering...")
+    
+    settings = None
+    try:
+        import main
+        import numpy as np
+        from benchmark_suite import make_synthetic_transcript, render_reference_frame, _install_transcript, _uninstall_transcript
+        from transcript_store import as_transcript
+        settings = (main.PROGRESSIVE_HIGHLIGHT, main.DEDUPLICATE_FRAMES, main.INCREMENTAL_FRAME_UPDATES)
+        main.DEDUPLICATE_FRAMES, main.INCREMENTAL_FRAME_UPDATES = False, False
+        sentences = make_synthetic_transcript(30, words_per_second=3, seed=4)
+        words = [word for sentence in sentences for word in sentence["words"]]
+        # Before the first word, word starts and ends, mid-word, between sentences and after the last word
+        times = [0.0, words[0]["start"], sentences[-1]["end_time"], sentences[-1]["end_time"] + 1]
+        for word in words[::3]:
+            times += [word["start"], (word["start"] + word["end"]) / 2, word["start"] + 0.3 * (word["end"] - word["start"]), word["end"]]
+        for sentence in sentences[::3]:
+            times.append(sentence["end_time"] + 0.25)
+        for progressive in (True, False):
+            main.PROGRESSIVE_HIGHLIGHT = progressive
+            _install_transcript(as_transcript(sentences))
+            for t in times:
+                frame, expected = main.make_karaoke_frame_sentence(t), render_reference_frame(sentences, t)
+                if not np.array_equal(frame, expected):
+                    print(f"✗ Frame at {t:.3f}s (progressive={progressive}) differs in {int((frame != expected).any(axis=2).sum())} pixels")
+                    return False
+        print(f"✓ {len(times)} frames per highlight mode match the per-word renderer pixel for pixel ({len(main.line_sprite_cache)} sprites cached)")
+        return True
+    except Exception as e:
+        print(f"✗ Line sprite test failed: {e}")
+        return False
+    finally:
+        if settings is not None:
+            main.PROGRESSIVE_HIGHLIGHT, main.DEDUPLICATE_FRAMES, main.INCREMENTAL_FRAME_UPDATES = settings
+            _uninstall_transcript()
+
+def test_timeline_index():
+    """Test the visible sentence window and per-word highlight widths computed from the timeline index"""
+    print("\nTesting timeline index...")
+    
+    progressive = None
+    try:
+        import random
+        import main
+        font = main.load_font()
+        progressive = main.PROGRESSIVE_HIGHLIGHT
+        empty_index = main.build_timeline_index([], font)
+        if empty_index["lines"] or main.get_visible_window(empty_index, 0.0) != (0, 0) or main.get_visible_window(empty_index, 5.0) != (0, 0):
+            print("✗ Unexpected window for an empty transcript")
+            return False
+        
+        # Sentence i sings "la la" from i to i + 1 seconds
+        sentences = [{"words": [{"text": "la", "start": i, "end": i + 0.5}, {"text": "la", "start": i + 0.5, "end": i + 1.0}],
+                      "start_time": i, "end_time": i + 1.0} for i in range(20)]
+        index = main.build_timeline_index(sentences, font)
+        page = main.MAX_SENTENCES_ON_SCREEN
+        expected_windows = {
+            -1.0: (0, page), 0.0: (0, page), 0.999: (0, page),
+            1.0: (1, 1 + page), # Exactly at a sentence end the next sentence comes first
+            12.5: (12, 20), 19.0: (19, 20), 19.999: (19, 20),
+            20.0: (20 - page, 20), 100.0: (20 - page, 20) # After the last sentence, the last page stays
+        }
+        for t, expected in expected_windows.items():
+            if main.get_visible_window(index, t) != expected:
+                print(f"✗ Window at {t}s is {main.get_visible_window(index, t)}, expected {expected}")
+                return False
+        short_index = main.build_timeline_index(sentences[:3], font)
+        if main.get_visible_window(short_index, 0.0) != (0, 3) or main.get_visible_window(short_index, 50.0) != (0, 3):
+            print("✗ Fewer sentences than a page are not all shown")
+            return False
+        
+        # Out-of-order sentence end times: the window starts at the first unfinished sentence, as a linear scan finds it
+        rng = random.Random(3)
+        shuffled = [{"words": s["words"], "start_time": s["start_time"], "end_time": s["end_time"] + rng.uniform(-3, 3)} for s in sentences]
+        shuffled_index = main.build_timeline_index(shuffled, font)
+        for t in [x / 4 for x in range(-4, 100)]:
+            first = next((i for i, s in enumerate(shuffled) if t < s["end_time"]), max(0, len(shuffled) - page))
+            if main.get_visible_window(shuffled_index, t) != (first, min(len(shuffled), first + page)):
+                print(f"✗ Window at {t}s differs from a linear scan")
+                return False
+        print("✓ Visible window correct before, at and after sentence boundaries, when paging and for unordered sentences")
+        
+        # Highlight widths: sentence 0 has words [0, 0.5] and [0.5, 1.0]
+        for enabled in (True, False):
+            main.PROGRESSIVE_HIGHLIGHT = enabled
+            main.line_sprite_cache.clear()
+            line = main.build_timeline_index(sentences, font)["lines"][0]
+            sprite = main.get_line_sprite(line["texts"], font, line["line_x"])
+            width = sprite["words"][0][2]
+            expected_widths = {
+                0.0: (), # At the word start nothing is highlighted yet
+                0.25: ((0, int(width * 0.5)),) if enabled else (),
+                0.5: ((0, width),), # At the word end it is complete and the next word has not started
+                0.75: ((0, width), (1, int(width * 0.5))) if enabled else ((0, width),),
+                1.0: ((0, width), (1, width)),
+                5.0: ((0, width), (1, width))
+            }
+            for t, expected in expected_widths.items():
+                if main.get_line_highlight_widths(line, sprite, t) != expected:
+                    print(f"✗ Highlight widths at {t}s (progressive={enabled}): {main.get_line_highlight_widths(line, sprite, t)}, expected {expected}")
+                    return False
+        main.PROGRESSIVE_HIGHLIGHT = progressive
+        main.line_sprite_cache.clear()
+        
+        # Unordered word times fall back to checking every word
+        unordered = [{"words": [{"text": "la", "start": 1.0, "end": 2.0}, {"text": "la", "start": 0.0, "end": 0.5}], "start_time": 0.0, "end_time": 2.0}]
+        line = main.build_timeline_index(unordered, font)["lines"][0]
+        sprite = main.get_line_sprite(line["texts"], font, line["line_x"])
+        if line["ordered"] or main.get_line_highlight_widths(line, sprite, 0.75) != ((1, sprite["words"][1][2]),):
+            print(f"✗ Unordered words highlighted incorrectly: {main.get_line_highlight_widths(line, sprite, 0.75)}")
+            return False
+        print("✓ Highlight widths correct at word starts, mid-word, word ends and for unordered words")
+        return True
+    except Exception as e:
+        print(f"✗ Timeline index test failed: {e}")
+        return False
+    finally:
+        if progressive is not None:
+            main.PROGRESSIVE_HIGHLIGHT = progressive
+            main.line_sprite_cache.clear()
+
+def test_frame_dedupe_vfr():
+    """Test that reused frames are identical to rendered ones and that variable-frame-rate video keeps its duration and sync"""
+    print("\nTesting frame deduplication and variable frame rate...")
+    
+    deduplicate = None
+    try:
+        import subprocess
+        import tempfile
+        import main
+        import numpy as np
+        from benchmark_suite import make_synthetic_transcript, write_song, _install_transcript, _uninstall_transcript
+        from transcript_store import as_transcript
+        deduplicate = main.DEDUPLICATE_FRAMES
+        transcript = as_transcript(make_synthetic_transcript(15, words_per_second=2, seed=6))
+        times = [i / main.FPS for i in range(15 * main.FPS)]
+        main.DEDUPLICATE_FRAMES = False
+        _install_transcript(transcript)
+        expected = [main.make_karaoke_frame_sentence(t).copy() for t in times]
+        main.DEDUPLICATE_FRAMES = True
+        _install_transcript(transcript)
+        previous, reused = None, 0
+        for t, expected_frame in zip(times, expected):
+            frame = main.make_karaoke_frame_sentence(t)
+            if not np.array_equal(frame, expected_frame):
+                print(f"✗ Frame at {t:.3f}s differs with deduplication")
+                return False
+            reused += frame is previous
+            previous = frame
+        if not reused or reused != main.frame_render_stats["reused"]:
+            print(f"✗ Unexpected reuse count: {reused} vs {main.frame_render_stats}")
+            return False
+        print(f"✓ {reused} of {len(times)} frames reused as the same array, all identical to full renders")
+        _uninstall_transcript()
+        
+        ffmpeg = main.get_ffmpeg_binary()
+        def decode(path):
+            # Resampled to the nominal frame rate, so dropped frames reappear at their original times
+            result = subprocess.run([ffmpeg, "-v", "error", "-i", path, "-map", "0:v:0", "-vf", "fps=24,scale=320:180",
+                                     "-f", "rawvideo", "-pix_fmt", "gray", "-"], capture_output=True, check=True)
+            return np.frombuffer(result.stdout, dtype=np.uint8).reshape(-1, 180, 320).astype(np.int16)
+        def count_packets(path):
+            result = subprocess.run([ffmpeg, "-v", "error", "-i", path, "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+                                    capture_output=True, text=True, check=True)
+            return sum(1 for line in result.stdout.splitlines() if line.startswith("0,"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Ends on a static stretch, so the last frames are duplicates
+            audio_path, json_path = write_song(temp_dir, "song", 12, 2, 5)
+            outputs = {}
+            for name, vfr, workers in (("cfr", False, 1), ("vfr", True, 1), ("vfr_segments", True, 2)):
+                outputs[name] = os.path.join(temp_dir, f"{name}.mp4")
+                main.create_karaoke_video_from_json(audio_path, json_path, outputs[name], variable_frame_rate=vfr, render_workers=workers)
+            reference = decode(outputs["cfr"])
+            if len(reference) != 12 * main.FPS:
+                print(f"✗ Constant-frame-rate video has {len(reference)} frames")
+                return False
+            for name in ("vfr", "vfr_segments"):
+                frames = decode(outputs[name])
+                if len(frames) != len(reference):
+                    print(f"✗ {name}: {len(frames)} frames at {main.FPS} fps, expected {len(reference)} (duration changed)")
+                    return False
+                # Neighbouring frames differ by about 1 level on average while the highlight moves, so this catches any shift
+                difference = np.abs(frames - reference).mean(axis=(1, 2)).max()
+                if difference > 0.1:
+                    print(f"✗ {name}: frames out of sync with the constant-frame-rate video (mean difference {difference:.3f})")
+                    return False
+                if count_packets(outputs[name]) >= len(reference):
+                    print(f"✗ {name}: no frames dropped")
+                    return False
+            print(f"✓ Variable-frame-rate video ({count_packets(outputs['vfr'])} of {len(reference)} frames encoded) keeps its duration and sync, also when segmented")
+        return True
+    except Exception as e:
+        print(f"✗ Frame dedupe/VFR test failed: {e}")
+        return False
+    finally:
+        if deduplicate is not None:
+            main.DEDUPLICATE_FRAMES = deduplicate
+            _uninstall_transcript()
+
+def test_segmented_render():
+    """Test splitting into GOP-aligned segments, rendering them in worker processes and joining them"""
+    print("\nTesting segmented rendering...")
+    
+    try:
+        import re
+        import subprocess
+        import tempfile
+        import main
+        import numpy as np
+        from benchmark_suite import write_song
+        gop = main.SEGMENT_GOP_FRAMES
+        for total_frames in (0, 1, gop - 1, gop, gop + 1, 2 * gop + 48, 25 * gop + 7):
+            for num_segments in (1, 2, 3, 4, 7):
+                segments = main.split_into_segments(total_frames, num_segments)
+                covered = [frame for start, end in segments for frame in range(start, end)]
+                if covered != list(range(total_frames)) or len(segments) > num_segments:
+                    print(f"✗ Segments {segments} do not cover {total_frames} frames exactly once")
+                    return False
+                if any(start % gop or start >= end for start, end in segments):
+                    print(f"✗ Segment boundaries off the GOP grid: {segments}")
+                    return False
+        if main.split_into_segments(2 * gop + 48, 2) != [(0, 2 * gop), (2 * gop, 2 * gop + 48)] or main.split_into_segments(100, 3, gop_frames=24) != [(0, 48), (48, 96), (96, 100)]:
+            print(f"✗ Unexpected split: {main.split_into_segments(2 * gop + 48, 2)}")
+            return False
+        print("✓ Segments cover every frame exactly once with boundaries on the GOP grid")
+        
+        ffmpeg = main.get_ffmpeg_binary()
+        def decode(path):
+            result = subprocess.run([ffmpeg, "-v", "error", "-i", path, "-map", "0:v:0", "-vf", "scale=320:180", "-f", "rawvideo", "-pix_fmt", "gray", "-"],
+                                    capture_output=True, check=True)
+            return np.frombuffer(result.stdout, dtype=np.uint8).reshape(-1, 180, 320).astype(np.int16)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path, json_path = write_song(temp_dir, "song", 12, 3, 8)
+            segmented_path, single_path = os.path.join(temp_dir, "segmented.mp4"), os.path.join(temp_dir, "single.mp4")
+            main._load_render_state(json_path)
+            try:
+                main.reset_frame_state()
+                main.render_video_segments_parallel(12, segmented_path, 2, ["-pix_fmt", "yuv420p"])
+                segment_stats = dict(main.frame_render_stats)
+                main.reset_frame_state()
+                main.write_frames_ffmpeg_pipe(single_path, 0, 12 * main.FPS, 1, ["-pix_fmt", "yuv420p"])
+            finally:
+                main._clear_render_state()
+            segmented, single = decode(segmented_path), decode(single_path)
+            if len(segmented) != 12 * main.FPS or segment_stats["rendered"] + segment_stats["reused"] != 12 * main.FPS:
+                print(f"✗ Joined video has {len(segmented)} frames ({segment_stats}), expected {12 * main.FPS}")
+                return False
+            difference = np.abs(segmented - single).mean(axis=(1, 2)).max()
+            if difference > 0.1:
+                print(f"✗ Joined segments differ from a single-pass render (mean difference {difference:.3f})")
+                return False
+            result = subprocess.run([ffmpeg, "-skip_frame", "nokey", "-i", segmented_path, "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+                                    capture_output=True, text=True)
+            keyframe_times = [float(t) for t in re.findall(r"pts_time:([\d.]+)", result.stderr)]
+            if not {0.0, gop / main.FPS} <= set(keyframe_times):
+                print(f"✗ Segment boundaries are not keyframes: {keyframe_times}")
+                return False
+        print(f"✓ {len(segmented)} frames rendered in 2 worker processes and joined, matching a single-pass render")
+        return True
+    except Exception as e:
+        print(f"✗ Segmented render test failed: {e}")
+        return False
+
+def test_ffmpeg_pipe_writer():
+    """Test the NumPy yuv420p conversion against ffmpeg, writer error propagation and buffer reuse"""
+    print("\nTesting ffmpeg pipe writer...")
+    
+    try:
+        import subprocess
+        import tempfile
+        import main
+        import numpy as np
+        from benchmark_suite import make_synthetic_transcript, _install_transcript, _uninstall_transcript
+        from ffmpeg_pipe import FFmpegPipeWriter, rgb_to_yuv420p
+        from transcript_store import as_transcript
+        ffmpeg = main.get_ffmpeg_binary()
+        def swscale(frame, flags=None):
+            height, width = frame.shape[:2]
+            command = [ffmpeg, "-v", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-i", "-"]
+            command += (["-sws_flags", flags] if flags else []) + ["-f", "rawvideo", "-pix_fmt", "yuv420p", "-"]
+            return np.frombuffer(subprocess.run(command, input=frame.tobytes(), capture_output=True, check=True).stdout, dtype=np.uint8).astype(int)
+        
+        rng = np.random.RandomState(0)
+        _install_transcript(as_transcript(make_synthetic_transcript(20, seed=1)))
+        try:
+            frames = {"random": rng.randint(0, 256, (64, 96, 3), dtype=np.uint8), "karaoke": np.array(main.make_karaoke_frame_sentence(7.3))}
+        finally:
+            _uninstall_transcript()
+        for name, frame in frames.items():
+            height, width = frame.shape[:2]
+            converted = rgb_to_yuv420p(frame, np.empty(height * width * 3 // 2, dtype=np.uint8)).astype(int)
+            # Same matrix and 2x2 chroma averaging as swscale's area filter; luma also matches its default filter
+            area_error = np.abs(converted - swscale(frame, "area+accurate_rnd")).max()
+            default_error = np.abs(converted - swscale(frame))
+            if area_error > 1 or default_error[:height * width].max() > 1:
+                print(f"✗ {name}: conversion differs from swscale by {area_error} (area), luma by {default_error[:height * width].max()} (default)")
+                return False
+            if name == "karaoke" and default_error[height * width:].mean() > 0.01:
+                print(f"✗ Karaoke frame chroma differs from swscale's default by {default_error[height * width:].mean():.3f} on average")
+                return False
+        print("✓ yuv420p conversion within 1 of ffmpeg's swscale")
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, "out.mp4")
+            # An ffmpeg that fails to start surfaces as IOError with its stderr, from write_frame() or close()
+            try:
+                with FFmpegPipeWriter(output_path, (64, 48), 24, ffmpeg_binary=ffmpeg, ffmpeg_params=["-no-such-option"]) as writer:
+                    for _ in range(200):
+                        writer.write_frame(np.zeros((48, 64, 3), dtype=np.uint8))
+                print("✗ Failing ffmpeg not reported")
+                return False
+            except IOError as e:
+                if "no-such-option" not in str(e):
+                    print(f"✗ ffmpeg error output missing: {e}")
+                    return False
+            print("✓ ffmpeg failure raised as IOError with ffmpeg's error output")
+            
+            # Repeated frame objects reuse their converted buffer; the pool never runs dry (that would block forever)
+            colors = [np.full((48, 64, 3), value, dtype=np.uint8) for value in (0, 128, 255)]
+            sequence = [colors[0]] * 30 + [colors[1]] * 3 + [colors[2]] + [colors[0]] * 20
+            with FFmpegPipeWriter(output_path, (64, 48), 24, ffmpeg_binary=ffmpeg, pixel_format="yuv420p", queue_size=2) as writer:
+                for frame in sequence:
+                    writer.write_frame(frame)
+            # Only the latest frame still holds its buffer
+            if sum(writer._buffer_refs) != 1 or writer._free_buffers.qsize() != len(writer._buffers) - 1:
+                print(f"✗ Buffers not released: refs {writer._buffer_refs}, {writer._free_buffers.qsize()} free")
+                return False
+            result = subprocess.run([ffmpeg, "-v", "error", "-i", output_path, "-f", "rawvideo", "-pix_fmt", "gray", "-"], capture_output=True, check=True)
+            decoded = np.frombuffer(result.stdout, dtype=np.uint8).reshape(-1, 48, 64).mean(axis=(1, 2))
+            expected = [frame[0, 0, 0] for frame in sequence] # Gray output is full range again
+            if len(decoded) != len(sequence) or np.abs(decoded - expected).max() > 2:
+                print(f"✗ Decoded {len(decoded)} frames, expected {len(sequence)} in the written order")
+                return False
+            print(f"✓ {len(sequence)} frames written through {len(writer._buffers)} reused yuv420p buffers")
+        return True
+    except Exception as e:
+        print(f"✗ ffmpeg pipe writer test failed: {e}")
+        return False
+
+def test_incremental_frames():
+    """Test that dirty-rectangle frame updates give the same pixels as full redraws"""
+    print("\nTesting incremental frame updates...")
+    
+    incremental, deduplicate = None, None
+    try:
+        import main
+        from benchmark_suite import make_synthetic_transcript
+        from transcript_store import as_transcript
+        from collections import deque
+        import numpy as np
+        incremental, deduplicate = main.INCREMENTAL_FRAME_UPDATES, main.DEDUPLICATE_FRAMES
+        transcript = as_transcript(make_synthetic_transcript(20, words_per_second=4, seed=2))
+        main.DEDUPLICATE_FRAMES = False
+        frames = {}
+        for enabled in (True, False):
+            main.INCREMENTAL_FRAME_UPDATES = enabled
+            main._global_sentences_for_frame = transcript
+            main.reset_frame_state()
+            # Consecutive frames, then a jump back in time
+            times = [i / main.FPS for i in range(20 * main.FPS)] + [3.0, 2.5]
+            frames[enabled] = []
+            held = deque() # Frames still referenced, as in the pipe writer's queue
+            for t in times:
+                frame = main.make_karaoke_frame_sentence(t)
+                if frame.flags.writeable:
+                    print("✗ Returned frame is writable")
+                    return False
+                frames[enabled].append(frame.copy())
+                held.append((frame, frames[enabled][-1]))
+                if len(held) == main.FRAME_CANVAS_COUNT:
+                    oldest, contents = held.popleft()
+                    if not np.array_equal(oldest, contents):
+                        print(f"✗ A frame changed before {main.FRAME_CANVAS_COUNT} more frames were rendered")
+                        return False
+            if enabled:
+                redrawn, rendered = main.frame_render_stats["redrawn"], main.frame_render_stats["rendered"]
+                if not redrawn < rendered // 4:
+                    print(f"✗ Too many full redraws: {redrawn} of {rendered} frames")
+                    return False
+        mismatches = sum(not (a == b).all() for a, b in zip(frames[True], frames[False]))
+        if mismatches:
+            print(f"✗ {mismatches} incrementally updated frames differ from full redraws")
+            return False
+        print(f"✓ {len(frames[True])} read-only incremental frames match full redraws and stay valid for {main.FRAME_CANVAS_COUNT} frames (full redraws: {redrawn} of {rendered})")
+        return True
+    except Exception as e:
+        print(f"✗ Incremental frame test failed: {e}")
+        return False
+    finally:
+        if incremental is not None:
+            main.INCREMENTAL_FRAME_UPDATES, main.DEDUPLICATE_FRAMES = incremental, deduplicate
+            main._global_sentences_for_frame = []
+            main.reset_frame_state()
+
+def test_preview_render():
+    """Test the low-resolution preview and the full render continuing from its loaded state"""
+    print("\nTesting preview rendering...")
+    
+    try:
+        import tempfile
+        import main
+        from benchmark_suite import write_song
+        if main.get_preview_size(0.5) != (640, 360) or main.get_preview_size(0.33) != (422, 236):
+            print(f"✗ Unexpected preview sizes: {main.get_preview_size(0.5)} {main.get_preview_size(0.33)}")
+            return False
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path, json_path = write_song(temp_dir, "song", 4, 3, 0)
+            preview_path = os.path.join(temp_dir, "song_preview.mp4")
+            full_path = os.path.join(temp_dir, "song_karaoke.mp4")
+            full_render = main.create_karaoke_preview(audio_path, json_path, preview_path, full_path)
+            preview = dict(main.preview_stats)
+            if full_render.result() != full_path or not os.path.getsize(preview_path) or not os.path.getsize(full_path):
+                print("✗ Preview or full video missing")
+                return False
+        if preview["frames"] != int(preview["video_seconds"] * main.PREVIEW_FPS) or main.render_stats["frames"] != int(main.render_stats["video_seconds"] * main.FPS):
+            print(f"✗ Unexpected frame counts: {preview} {main.render_stats}")
+            return False
+        if main._render_lock.locked() or main._global_sentences_for_frame:
+            print("✗ Render state not released after the full render")
+            return False
+        
+        # Preview frames are drawn at the preview size with a scaled layout, and the full-size layout comes back after
+        from benchmark_suite import make_synthetic_transcript, _install_transcript, _uninstall_transcript
+        from transcript_store import as_transcript
+        _install_transcript(as_transcript(make_synthetic_transcript(20, seed=1)))
+        try:
+            full_index, full_font = main.get_timeline_index(), main.font
+            with main.scaled_render_layout(0.5) as size:
+                frame = main.make_karaoke_frame_sentence(7.3)
+                preview_font_size, preview_spacing = main.font.size, main.WORD_SPACING
+            full_frame = main.make_karaoke_frame_sentence(7.3)
+            restored = main.get_timeline_index() is full_index and main.font is full_font
+        finally:
+            _uninstall_transcript()
+        if size != (640, 360) or frame.shape != (360, 640, 3) or full_frame.shape != (720, 1280, 3) or not restored:
+            print(f"✗ Unexpected preview frame {frame.shape} or full-size layout not restored")
+            return False
+        if preview_font_size != round(full_font.size * 0.5) or preview_spacing != round(main.WORD_SPACING * 0.5):
+            print(f"✗ Preview font size {preview_font_size} / word spacing {preview_spacing} not scaled")
+            return False
+        # The text covers about a quarter of the area it covers at full size
+        coverage = (frame > 0).any(axis=2).sum() / (full_frame > 0).any(axis=2).sum()
+        if not 0.15 < coverage < 0.4:
+            print(f"✗ Preview text covers {coverage:.2f} of the full-size text area")
+            return False
+        print(f"✓ Preview ({preview['frames']} frames at {preview['size']}) and full video ({main.render_stats['frames']} frames) rendered")
+        return True
+    except Exception as e:
+        print(f"✗ Preview render test failed: {e}")
+        return False
+
+def test_segment_cache_keys():
+    """Test that a transcript edit only changes the cache keys of the video segments showing it"""
+    print("\nTesting segment cache keys...")
+    
+    try:
+        import main
+        from benchmark_suite import make_synthetic_transcript
+        sentences = make_synthetic_transcript(120, words_per_second=3, seed=5)
+        font = main.load_font()
+        config = main.get_render_config(["-pix_fmt", "yuv420p"], "ffmpeg")
+        total_frames = 120 * main.FPS
+        segments = [(start, min(start + main.SEGMENT_GOP_FRAMES, total_frames)) for start in range(0, total_frames, main.SEGMENT_GOP_FRAMES)]
+        def keys_for(sentences, config=config):
+            index = main.build_timeline_index(sentences, font)
+            return [main.segment_cache_key(index, start, end, config) for start, end in segments]
+        
+        original = keys_for(sentences)
+        middle = len(sentences) // 2
+        sentences[middle]["words"][0]["text"] = "corrected"
+        edited = keys_for(sentences)
+        changed = [i for i, (a, b) in enumerate(zip(original, edited)) if a != b]
+        # The sentence is on screen while up to MAX_SENTENCES_ON_SCREEN sentences are sung, so its
+        # segments form one contiguous run covering a fraction of the song
+        if not changed or changed != list(range(changed[0], changed[-1] + 1)) or len(changed) > len(segments) // 2 \
+                or len(set(original)) != len(original):
+            print(f"✗ Unexpected changed segments after a one-word edit: {changed} of {len(segments)}")
+            return False
+        if keys_for(sentences, main.get_render_config(["-pix_fmt", "yuv420p"], "moviepy")) == edited:
+            print("✗ Render config not part of segment keys")
+            return False
+        
+        # Re-running keeps a hand-edited transcription instead of transcribing or restoring it from the cache,
+        # unless it was transcribed from other stems; touching the file is not an edit
+        import json
+        import tempfile
+        import time
+        from transcript_store import save_binary_transcript
+        transcribed = []
+        transcribe_and_save = main.transcribe_and_save
+        main.transcribe_and_save = lambda vocal_path, json_path, *args, **kwargs: transcribed.append(kwargs["source_key"]) or json_path
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                json_path = os.path.join(temp_dir, "song_transcription.json")
+                vocal_path = os.path.join(temp_dir, "missing_vocals.wav")
+                with open(json_path, "w", encoding="utf-8") as f:
+                    json.dump(sentences, f)
+                save_binary_transcript(json_path, sentences, main.transcription_cache_key("stems-a"))
+                touched_time = time.time() + 5
+                os.utime(json_path, (touched_time, touched_time))
+                main.transcribe_cached(vocal_path, json_path, "stems-a")
+                if transcribed != [main.transcription_cache_key("stems-a")] or main.transcription_stats.get("edited"):
+                    print(f"✗ Touched transcription treated as edited: {transcribed}")
+                    return False
+                with open(json_path, "w", encoding="utf-8") as f:
+                    json.dump(sentences[1:], f)
+                if main.transcribe_cached(vocal_path, json_path, "stems-a") != json_path or not main.transcription_stats.get("edited") \
+                        or len(transcribed) != 1:
+                    print("✗ Hand-edited transcription was not kept")
+                    return False
+                main.transcribe_cached(vocal_path, json_path, "stems-b")
+                if transcribed[1:] != [main.transcription_cache_key("stems-b")]:
+                    print("✗ Edited transcription of other stems was kept")
+                    return False
+        finally:
+            main.transcribe_and_save = transcribe_and_save
+        print(f"✓ One-word edit changes {len(changed)} of {len(segments)} segment keys")
+        return True
+    except Exception as e:
+        print(f"✗ Segment cache key test failed: {e}")
+        return False
+
+def test_cached_audio_mux():
+    """Test that renders mux a separately encoded AAC track, reused from the stage cache at other settings"""
+    print("\nTesting cached audio encode and mux...")
+    
+    try:
+        import subprocess
+        import tempfile
+        import main
+        from benchmark_suite import write_song
+        from stage_cache import StageCache
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path, json_path = write_song(temp_dir, "song", 3, 3, 0)
+            cache = StageCache(os.path.join(temp_dir, "cache"))
+            video_path = os.path.join(temp_dir, "song_karaoke.mp4")
+            main.create_karaoke_video_from_json(audio_path, json_path, video_path, stage_cache=cache)
+            first = dict(main.render_stats)
+            # Other video settings: the video is encoded again, the audio encode is reused
+            main.create_karaoke_video_from_json(audio_path, json_path, video_path, variable_frame_rate=True, stage_cache=cache)
+            second = dict(main.render_stats)
+            if first["audio_cached"] or not second["audio_cached"]:
+                print(f"✗ Unexpected audio cache use: {first} {second}")
+                return False
+            # Default renders stay single-pass; segments are cached only on request, then reused by later renders
+            if "segments" in first or "segments" in second or os.path.isdir(os.path.join(cache.cache_dir, "segment")):
+                print(f"✗ Default render stored cached segments: {first} {second}")
+                return False
+            evictions = []
+            evict = cache.evict
+            cache.evict = lambda: evictions.append(evict())
+            main.create_karaoke_video_from_json(audio_path, json_path, video_path, stage_cache=cache, cache_segments=True)
+            stored = dict(main.render_stats)
+            main.create_karaoke_video_from_json(audio_path, json_path, video_path, stage_cache=cache)
+            reused = dict(main.render_stats)
+            if stored.get("segments_cached") != 0 or len(evictions) != 1 or reused.get("segments_cached") != stored["segments"]:
+                print(f"✗ Unexpected segment caching: {stored} {reused}, {len(evictions)} evictions")
+                return False
+            probe = subprocess.run([main.get_ffmpeg_binary(), "-i", video_path], capture_output=True, text=True, errors='ignore').stderr
+            if "Video: h264" not in probe or "Audio: aac" not in probe:
+                print(f"✗ Muxed video is missing a stream:\n{probe}")
+                return False
+            leftovers = [name for name in os.listdir(temp_dir) if name.startswith(".")]
+            if leftovers:
+                print(f"✗ Temporary render files left behind: {leftovers}")
+                return False
+        print("✓ AAC encoded once and stream-copied; segments cached only on request, then reused")
+        return True
+    except Exception as e:
+        print(f"✗ Cached audio mux test failed: {e}")
+        return False
+
+def test_encoding_profiles():
+    """Test the x264 encoding profiles and their selection from word density and duration"""
+    print("\nTesting encoding profiles...")
+    
+    try:
+        import tempfile
+        import main
+        from benchmark_suite import write_song
+        from stage_cache import StageCache
+        if main.select_encoding_profile(4.0, 180) != "small-share" or main.select_encoding_profile(0.5, 180) != "fast-archive":
+            print("✗ Unexpected profile for dense/sparse lyrics")
+            return False
+        if main.select_encoding_profile(4.0, main.ENCODING_SHARE_MAX_SECONDS + 1) != "fast-archive":
+            print("✗ Long videos should not get the slow small-share encode")
+            return False
+        if main.get_encoding_settings(None) != (main.VIDEO_OUTPUT_PRESET, [], None):
+            print(f"✗ No profile should keep today's settings: {main.get_encoding_settings(None)}")
+            return False
+        preset, params, keyint_frames = main.get_encoding_settings("small-share")
+        if preset != "slow" or "-crf" not in params or keyint_frames != 30 * main.FPS:
+            print(f"✗ Unexpected small-share settings: {preset} {params} {keyint_frames}")
+            return False
+        try:
+            main.resolve_encoding_profile("tiny-files", 60)
+            print("✗ Unknown profile name accepted")
+            return False
+        except ValueError:
+            pass
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path, json_path = write_song(temp_dir, "song", 3, 3, 0)
+            video_path = os.path.join(temp_dir, "song_karaoke.mp4")
+            main.create_karaoke_video_from_json(audio_path, json_path, video_path)
+            auto_profile = main.render_stats["encoding_profile"]
+            main.create_karaoke_video_from_json(audio_path, json_path, video_path, encoding_profile="fast-archive")
+            if auto_profile not in main.ENCODING_PROFILES or main.render_stats["encoding_profile"] != "fast-archive" or not os.path.getsize(video_path):
+                print(f"✗ Unexpected render profiles: {auto_profile} {main.render_stats}")
+                return False
+            # The profile's keyframe interval holds for single-pass and parallel renders; only cached segments use their own
+            cache = StageCache(os.path.join(temp_dir, "cache"))
+            keyints = []
+            for options in ({"stage_cache": cache}, {"render_workers": 2}, {"stage_cache": cache, "cache_segments": True}):
+                main.create_karaoke_video_from_json(audio_path, json_path, video_path, encoding_profile="small-share", **options)
+                keyints.append(main.render_stats["keyint_frames"])
+            if keyints != [30 * main.FPS, 30 * main.FPS, main.SEGMENT_GOP_FRAMES]:
+                print(f"✗ Unexpected keyframe intervals (single-pass, parallel, cached segments): {keyints}")
+                return False
+        print(f"✓ Profiles selected and applied (auto chose {auto_profile} for the test song)")
+        return True
+    except Exception as e:
+        print(f"✗ Encoding profile test failed: {e}")
+        return False
+
+def test_ass_subtitles():
+    """Test the ASS karaoke script and the libass burned-in and soft-subtitle renders"""
+    print("\nTesting ASS subtitle rendering...")
+    
+    try:
+        import subprocess
+        import tempfile
+        import main
+        from benchmark_suite import write_song
+        if main._ass_escape("a{b}\\n") != "a\\{b\\}\\\u2060n" or main._ass_time(372345) != "1:02:03.45":
+            print("✗ Unexpected ASS escaping or timestamps")
+            return False
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path, json_path = write_song(temp_dir, "song", 8, 3, 0)
+            video_path = os.path.join(temp_dir, "song_karaoke.mp4")
+            if main.create_karaoke_video_ass(audio_path, json_path, video_path) != video_path:
+                print("✗ Burned-in render changed the output path")
+                return False
+            with open(os.path.join(temp_dir, "song_karaoke.ass"), encoding='utf-8') as f:
+                script = f.read()
+            expected = ["PlayResX: %d" % main.VIDEO_SIZE[0], "Style: Karaoke,", main._ass_color(main.TEXT_COLOR_HIGHLIGHT), "Dialogue:", "\\k"]
+            missing = [text for text in expected if text not in script]
+            if missing or main.render_stats["writer"] != "ass-burn" or main.render_stats["frames_rendered"]:
+                print(f"✗ Unexpected ASS script or render stats: {missing} {main.render_stats}")
+                return False
+            probe = subprocess.run([main.get_ffmpeg_binary(), "-i", video_path], capture_output=True, text=True, errors='ignore').stderr
+            if "Video: h264" not in probe or "Audio: aac" not in probe:
+                print(f"✗ Burned-in video is missing a stream:\n{probe}")
+                return False
+            soft_path = main.create_karaoke_video_ass(audio_path, json_path, video_path, mode="soft")
+            probe = subprocess.run([main.get_ffmpeg_binary(), "-i", soft_path], capture_output=True, text=True, errors='ignore').stderr
+            if not soft_path.endswith(".mkv") or "Subtitle: ass" not in probe or "Audio: aac" not in probe:
+                print(f"✗ Soft-subtitle video is missing a stream:\n{probe}")
+                return False
+        print("✓ ASS karaoke script burned in with libass and muxed as a subtitle track")
+        return True
+    except Exception as e:
+        print(f"✗ ASS subtitle test failed: {e}")
+        return False
+
+def test_benchmark_suite():
+    """Test synthetic songs and the baseline comparison of the benchmark suite"""
+    print("\nTesting benchmark suite helpers...")
+    
+    try:
+        from benchmark_suite import make_synthetic_transcript, compare_results
+        sentences = make_synthetic_transcript(60, words_per_second=3, seed=1)
+        words = [word for sentence in sentences for word in sentence["words"]]
+        if sentences != make_synthetic_transcript(60, words_per_second=3, seed=1) or not 90 <= len(words) <= 180:
+            print(f"✗ Synthetic transcript not deterministic or wrong density: {len(words)} words")
+            return False
+        if any(a["end"] > b["start"] for a, b in zip(words, words[1:])) or words[-1]["end"] > 59:
+            print("✗ Synthetic words overlap or run past the song")
+            return False
+        print(f"✓ Deterministic synthetic transcript ({len(sentences)} sentences, {len(words)} words)")
+        
+        golden = {"song": {"seed": 1}, "font": "DejaVuSans.ttf:18", "times": [0.0, 1.0], "digests": ["a", "b"]}
+        baseline = {"benchmarks": {"frames": {"frames_per_second": 100.0}, "load": {"json_ms": 10.0}}, "golden_frames": golden}
+        results = {"benchmarks": {"frames": {"frames_per_second": 80.0}, "load": {"json_ms": 10.5}},
+                   "golden_frames": dict(golden, digests=["a", "c"])}
+        comparisons, mismatches = compare_results(results, baseline, tolerance=0.1)
+        regressions = [c["metric"] for c in comparisons if c["regression"]]
+        if regressions != ["frames.frames_per_second"] or mismatches != [1.0]:
+            print(f"✗ Unexpected comparison: {comparisons} {mismatches}")
+            return False
+        print("✓ Regressions and changed golden frames detected")
+        return True
+    except Exception as e:
+        print(f"✗ Benchmark suite test failed: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("Python Bridge Test Suite")
@@ -97,7 +1462,32 @@ def main():
     tests = [
         test_imports,
         test_bridge_creation,
-        test_message_handling
+        test_message_handling,
+        test_model_pool,
+        test_stage_cache,
+        test_stage_pipeline,
+        test_cold_start,
+        test_demucs_in_process,
+        test_overlap_add,
+        test_streamed_enhancement,
+        test_voice_activity,
+        test_chunked_transcription_merge,
+        test_quantized_whisper,
+        test_transcript_store,
+        test_stage_metrics,
+        test_stage_profiling,
+        test_line_sprites,
+        test_timeline_index,
+        test_frame_dedupe_vfr,
+        test_segmented_render,
+        test_ffmpeg_pipe_writer,
+        test_incremental_frames,
+        test_preview_render,
+        test_segment_cache_keys,
+        test_cached_audio_mux,
+        test_encoding_profiles,
+        test_ass_subtitles,
+        test_benchmark_suite
     ]
     
     passed = 0
@@ -0,0 +1,283 @@
+"""
+Compact transcript format for Karaoke Automate
+Stores word timings column-wise in a binary file that is memory-mapped for rendering; JSON stays the import/export format
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import uuid
+
+import numpy as np
+
+TRANSCRIPT_BINARY_EXTENSION = ".ktr"
+TRANSCRIPT_MAGIC = b"KTRN"
+TRANSCRIPT_VERSION = 3
+
+# magic, version, flags, num_sentences, num_words, num_strings, string_bytes, SHA-256 of the JSON it was
+# written for, and the key of the audio and settings it was transcribed from (zero bytes if unknown)
+_HEADER = struct.Struct("<4sHHIIII32s32s")
+# (name, dtype, length) of each column in file order, after the header; the 8-byte time columns come first
+# so every column stays aligned, strings last
+_COLUMNS = (
+    ("sentence_start", "<f8", lambda s, w, n: s),
+    ("sentence_end", "<f8", lambda s, w, n: s),
+    ("word_start", "<f8", lambda s, w, n: w),
+    ("word_end", "<f8", lambda s, w, n: w),
+    ("sentence_offsets", "<u4", lambda s, w, n: s + 1), # Word index where each sentence starts (plus the end)
+    ("word_text", "<u4", lambda s, w, n: w), # Index into the string table
+    ("string_offsets", "<u4", lambda s, w, n: n + 1) # Byte offsets into the UTF-8 string data
+)
+
+def binary_transcript_path(json_path):
+    """Returns where the binary copy of a transcription JSON file lives (same name, .ktr extension)."""
+    return os.path.splitext(json_path)[0] + TRANSCRIPT_BINARY_EXTENSION
+
+def json_digest(json_path):
+    """Returns the SHA-256 hex digest of a transcription JSON file's bytes."""
+    with open(json_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def read_transcript_header(path):
+    """
+    Returns (json_digest, source_key) from a binary transcript's header, each None if not recorded.
+    Raises ValueError if the file is not a current-version transcript.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise ValueError(f"Not a transcript file (too short): {path}")
+    magic, version, *_, digest, source_key = _HEADER.unpack(header)
+    if magic != TRANSCRIPT_MAGIC or version != TRANSCRIPT_VERSION:
+        raise ValueError(f"Not a version {TRANSCRIPT_VERSION} transcript file: {path}")
+    return tuple(value.hex() if any(value) else None for value in (digest, source_key))
+
+
+class Transcript:
+    """
+    Read-only, array-backed transcription: sentences are ranges of a flat word table.
+
+    Word and sentence times are float64 columns (the exact JSON values, so frames match rendering from JSON),
+    word texts are indices into a table of unique strings (interned, so equal words share one str object),
+    and sentence i covers words sentence_offsets[i]:sentence_offsets[i + 1]. Loaded from the binary format,
+    the columns are views into a read-only memory map that close() (or leaving a 'with' block) releases;
+    pickling a file-backed transcript only sends its path.
+    """
+
+    def __init__(self, sentence_offsets, sentence_start, sentence_end, word_start, word_end, word_text, strings, path=None, buffer=None):
+        self.sentence_offsets = sentence_offsets
+        self.sentence_start = sentence_start
+        self.sentence_end = sentence_end
+        self.word_start = word_start
+        self.word_end = word_end
+        self.word_text = word_text
+        self.strings = strings
+        self.path = path
+        self._buffer = buffer
+
+    @classmethod
+    def from_sentences(cls, sentences):
+        """Builds a transcript from the JSON structure: [{'words': [{'text', 'start', 'end'}], 'start_time', 'end_time'}]."""
+        string_ids = {}
+        sentence_offsets = [0]
+        sentence_start, sentence_end = [], []
+        word_start, word_end, word_text = [], [], []
+        for sentence in sentences:
+            words = sentence.get('words') or []
+            for word_info in words:
+                word_start.append(word_info['start'])
+                word_end.append(word_info['end'])
+                word_text.append(string_ids.setdefault(word_info['text'], len(string_ids)))
+            sentence_offsets.append(len(word_text))
+            sentence_start.append(sentence.get('start_time', words[0]['start'] if words else 0.0))
+            sentence_end.append(sentence.get('end_time', words[-1]['end'] if words else 0.0))
+        return cls(np.array(sentence_offsets, dtype=np.uint32),
+                   np.array(sentence_start, dtype=np.float64), np.array(sentence_end, dtype=np.float64),
+                   np.array(word_start, dtype=np.float64), np.array(word_end, dtype=np.float64),
+                   np.array(word_text, dtype=np.uint32), [sys.intern(text) for text in string_ids])
+
+    @classmethod
+    def from_json(cls, json_path):
+        """Parses a transcription JSON file."""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            sentences = json.load(f)
+        if not isinstance(sentences, list):
+            raise ValueError("Transcription JSON root must be a list of sentence objects.")
+        return cls.from_sentences(sentences)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-maps a binary transcript file. Raises ValueError if the file is not a valid transcript."""
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(buffer) < _HEADER.size:
+                raise ValueError(f"Not a transcript file (too short): {path}")
+            magic, version, _, num_sentences, num_words, num_strings, string_bytes, _, _ = _HEADER.unpack_from(buffer, 0)
+            if magic != TRANSCRIPT_MAGIC or version != TRANSCRIPT_VERSION:
+                raise ValueError(f"Not a version {TRANSCRIPT_VERSION} transcript file: {path}")
+
+            columns = {}
+            offset = _HEADER.size
+            for name, dtype, length in _COLUMNS:
+                count = length(num_sentences, num_words, num_strings)
+                column_bytes = count * np.dtype(dtype).itemsize
+                if offset + column_bytes > len(buffer):
+                    raise ValueError(f"Truncated transcript file: {path}")
+                columns[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+                offset += column_bytes
+            if offset + string_bytes != len(buffer):
+                raise ValueError(f"Transcript file size does not match its header: {path}")
+
+            # The string table holds only unique words, so it is decoded once up front
+            string_data = buffer[offset:offset + string_bytes]
+            string_offsets = columns.pop('string_offsets').tolist()
+            strings = [sys.intern(string_data[start:end].decode('utf-8')) for start, end in zip(string_offsets, string_offsets[1:])]
+        except ValueError:
+            columns = None
+            buffer.close()
+            raise
+        return cls(strings=strings, path=os.path.abspath(path), buffer=buffer, **columns)
+
+    def save(self, path, json_digest=None, source_key=None):
+        """
+        Writes the binary format (atomically, via a temporary file in the same directory). json_digest and
+        source_key (SHA-256 hex digests) record the JSON file and the transcription source it corresponds to.
+        """
+        encoded = [text.encode('utf-8') for text in self.strings]
+        string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        string_offsets[1:] = np.cumsum([len(data) for data in encoded])
+        string_data = b"".join(encoded)
+
+        temp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(_HEADER.pack(TRANSCRIPT_MAGIC, TRANSCRIPT_VERSION, 0, len(self), self.num_words,
+                                     len(self.strings), len(string_data), bytes.fromhex(json_digest or ""),
+                                     bytes.fromhex(source_key or "")))
+                for name, dtype, _ in _COLUMNS:
+                    column = string_offsets if name == 'string_offsets' else getattr(self, name)
+                    f.write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+                f.write(string_data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path
+
+    def close(self):
+        """
+        Releases the memory map of a file-backed transcript (an open mapping keeps the file from being replaced
+        on Windows). The transcript cannot be used afterwards; in-memory transcripts are unaffected.
+        """
+        if self._buffer is None:
+            return
+        # Drop the column views first; the map can only be closed once nothing exports its buffer
+        self.sentence_offsets = self.sentence_start = self.sentence_end = None
+        self.word_start = self.word_end = self.word_text = None
+        buffer, self._buffer = self._buffer, None
+        try:
+            buffer.close()
+        except BufferError:
+            pass # A caller still holds a column view; the map is released when that view is freed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self.sentence_start)
+
+    @property
+    def num_words(self):
+        return len(self.word_start)
+
+    def word_range(self, sentence_idx):
+        """Returns the (start, end) word indices of a sentence."""
+        return int(self.sentence_offsets[sentence_idx]), int(self.sentence_offsets[sentence_idx + 1])
+
+    def sentence_texts(self, sentence_idx):
+        """Returns the word texts of a sentence as a tuple of (interned) strings."""
+        start, end = self.word_range(sentence_idx)
+        strings = self.strings
+        return tuple(strings[text_id] for text_id in self.word_text[start:end].tolist())
+
+    def to_sentences(self):
+        """Returns the JSON structure (with the exact stored times)."""
+        sentences = []
+        for sentence_idx in range(len(self)):
+            start, end = self.word_range(sentence_idx)
+            words = [{'text': text, 'start': word_start, 'end': word_end}
+                     for text, word_start, word_end in zip(self.sentence_texts(sentence_idx),
+                                                           self.word_start[start:end].tolist(),
+                                                           self.word_end[start:end].tolist())]
+            sentences.append({
+                'words': words,
+                'start_time': float(self.sentence_start[sentence_idx]),
+                'end_time': float(self.sentence_end[sentence_idx]),
+                'full_text': " ".join(word['text'] for word in words)
+            })
+        return sentences
+
+    def __reduce__(self):
+        # Worker processes re-map a file-backed transcript instead of receiving a copy of its columns
+        if self.path:
+            return (Transcript.load, (self.path,))
+        return (Transcript, (self.sentence_offsets, self.sentence_start, self.sentence_end,
+                             self.word_start, self.word_end, self.word_text, self.strings))
+
+
+def as_transcript(sentences):
+    """Returns 'sentences' as a Transcript, converting the JSON structure (a list of sentence dicts) if needed."""
+    if isinstance(sentences, Transcript):
+        return sentences
+    return Transcript.from_sentences(sentences or [])
+
+def load_transcript(path):
+    """
+    Loads a transcript for rendering. Binary files are memory-mapped; for a JSON file, its binary copy is
+    mapped instead when it was written for exactly this JSON content (so hand-edited JSON always wins).
+    """
+    if path.endswith(TRANSCRIPT_BINARY_EXTENSION):
+        return Transcript.load(path)
+    binary_path = binary_transcript_path(path)
+    try:
+        if read_transcript_header(binary_path)[0] == json_digest(path):
+            return Transcript.load(binary_path)
+    except (OSError, ValueError):
+        pass # No usable binary copy - parse the JSON
+    return Transcript.from_json(path)
+
+def is_transcript_edited(json_path):
+    """
+    Returns True when a transcription JSON's content differs from the JSON its binary copy was written for,
+    i.e. it was edited by hand (copying, syncing or touching the file is not an edit). A missing, outdated
+    or corrupt binary copy records nothing to compare against, so the JSON counts as not edited.
+    """
+    try:
+        recorded_digest = read_transcript_header(binary_transcript_path(json_path))[0]
+        return recorded_digest is not None and json_digest(json_path) != recorded_digest
+    except (OSError, ValueError):
+        return False
+
+def transcript_source_key(json_path):
+    """Returns the source key recorded in a transcription JSON's binary copy, or None."""
+    try:
+        return read_transcript_header(binary_transcript_path(json_path))[1]
+    except (OSError, ValueError):
+        return None
+
+def save_binary_transcript(json_path, sentences=None, source_key=None):
+    """
+    Writes the binary copy of a transcription JSON file (from 'sentences' if given, else by parsing the file),
+    recording the JSON's digest and the source_key it was transcribed from.
+    """
+    transcript = Transcript.from_sentences(sentences) if sentences is not None else Transcript.from_json(json_path)
+    return transcript.save(binary_transcript_path(json_path), json_digest(json_path), source_key)
@@ -1,4 +1,4 @@
-const { app, BrowserWindow, ipcMain, dialog } = require("electron");
+const { app, BrowserWindow, ipcMain, dialog, shell } = require("electron");
 const { spawn } = require("child_process");
 const path = require("path");
 const fs = require("fs");
@@ -220,6 +220,12 @@ ipcMain.handle("select-output-directory", async () => {
     return result;
 });
 
+ipcMain.handle("open-path", async (event, filePath) => {
+    // Opens a created file (e.g. the preview video) in the system's default application
+    const error = await shell.openPath(filePath);
+    return { success: !error, error: error || undefined };
+});
+
 ipcMain.handle("get-backend-status", async () => {
     return {
         connected: pythonProcess !== null,
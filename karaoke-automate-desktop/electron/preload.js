@@ -6,6 +6,7 @@ contextBridge.exposeInMainWorld("electronAPI", {
     // File operations
     selectFile: () => ipcRenderer.invoke("select-file"),
     selectOutputDirectory: () => ipcRenderer.invoke("select-output-directory"),
+    openPath: (filePath) => ipcRenderer.invoke("open-path", filePath),
     
     // Python backend communication
     processAudio: (data) => ipcRenderer.invoke("process-audio", data),
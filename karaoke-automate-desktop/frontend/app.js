@@ -38,7 +38,11 @@ class KaraokeApp {
         
         // Options
         this.enhanceInstrumental = document.getElementById('enhanceInstrumental');
+        this.previewFirst = document.getElementById('previewFirst');
+        this.useCache = document.getElementById('useCache');
         this.whisperModel = document.getElementById('whisperModel');
+        this.encodingProfile = document.getElementById('encodingProfile');
+        this.assSubtitles = document.getElementById('assSubtitles');
         
         // Process button
         this.processBtn = document.getElementById('processBtn');
@@ -181,7 +185,11 @@ class KaraokeApp {
             this.outputDropZone,
             this.selectOutputBtn,
             this.enhanceInstrumental,
+            this.previewFirst,
+            this.useCache,
             this.whisperModel,
+            this.encodingProfile,
+            this.assSubtitles,
             this.processBtn
         ];
         
@@ -322,6 +330,10 @@ class KaraokeApp {
         switch (data.type) {
             case 'progress':
                 this.updateProgress(data.progress, data.message);
+                if (data.data && data.data.preview_video) {
+                    console.log('info', `Preview ready: ${data.data.preview_video}`);
+                    this.showPreviewReady(data.data.preview_video);
+                }
                 break;
             case 'log':
                 console.log(data.level, data.message);
@@ -391,6 +403,13 @@ class KaraokeApp {
         
         this.processBtn.disabled = !canProcess;
         
+        // Options cannot change while a job is running
+        [this.enhanceInstrumental, this.previewFirst, this.useCache, this.whisperModel, this.encodingProfile, this.assSubtitles].forEach((control) => {
+            if (control) {
+                control.disabled = this.isProcessing;
+            }
+        });
+        
         // Update button text and ARIA attributes
         if (canProcess) {
             this.processBtn.textContent = 'Create Karaoke Video';
@@ -439,7 +458,11 @@ class KaraokeApp {
                 output_dir: this.selectedOutputDir,
                 options: {
                     enhance_instrumental: this.enhanceInstrumental.checked,
-                    whisper_model: this.whisperModel.value
+                    preview: this.previewFirst.checked,
+                    use_cache: this.useCache.checked,
+                    whisper_model: this.whisperModel.value,
+                    encoding_profile: this.encodingProfile.value,
+                    ass_subtitles: this.assSubtitles.value || null
                 }
             };
             
@@ -526,6 +549,62 @@ class KaraokeApp {
         }, 1000);
     }
     
+    showPreviewReady(previewPath) {
+        // The preview can be watched while the full-quality video is still rendering
+        const previewDiv = document.createElement('div');
+        previewDiv.style.cssText = `
+            position: fixed;
+            top: 20px;
+            right: 20px;
+            background: var(--info-color);
+            color: white;
+            padding: 15px 20px;
+            border-radius: 8px;
+            box-shadow: var(--shadow);
+            z-index: 1000;
+            max-width: 300px;
+            font-weight: 600;
+        `;
+        previewDiv.innerHTML = `
+            <div>🎬 Preview ready</div>
+            <div style="font-size: 12px; margin-top: 5px; opacity: 0.9;">
+                Check the lyrics and timing while the full video renders.
+            </div>
+        `;
+        const openButton = document.createElement('button');
+        openButton.className = 'btn btn-secondary';
+        openButton.style.marginTop = '10px';
+        openButton.textContent = 'Open Preview';
+        openButton.addEventListener('click', async () => {
+            try {
+                const result = await window.electronAPI.openPath(previewPath);
+                if (!result.success) {
+                    throw new Error(result.error);
+                }
+            } catch (error) {
+                console.log('error', `Failed to open preview: ${error.message}`);
+            }
+            if (previewDiv.parentNode) {
+                previewDiv.parentNode.removeChild(previewDiv);
+            }
+        });
+        previewDiv.appendChild(openButton);
+        
+        // Add ARIA attributes for accessibility
+        previewDiv.setAttribute('role', 'alert');
+        previewDiv.setAttribute('aria-live', 'assertive');
+        
+        document.body.appendChild(previewDiv);
+        this.announceToScreenReader('Preview ready. Use the Open Preview button to watch it.');
+        
+        // Remove after 60 seconds
+        setTimeout(() => {
+            if (previewDiv.parentNode) {
+                previewDiv.parentNode.removeChild(previewDiv);
+            }
+        }, 60000);
+    }
+    
     showCompletionMessage(result) {
         // Create a temporary success message
         const successDiv = document.createElement('div');